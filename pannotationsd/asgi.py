@@ -3,14 +3,74 @@ ASGI config for pannotationsd.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The handler sends streaming responses without blocking the event loop:
+async iterators, like those of `spatiotemporal.asynchronous`, are awaited,
+and the chunks of synchronous iterators, like streamed viewset lists
+reading from a server-side cursor, are produced in the request's thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pannotationsd.settings")
 
+
+class ASGIHandler(asgi.ASGIHandler):
+    """Streams responses without iterating them in the event loop."""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": headers,
+            }
+        )
+        async for part in self.parts(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+    @staticmethod
+    async def parts(response):
+        if hasattr(response, "__aiter__"):
+            async for part in response:
+                yield part
+            return
+        iterator = iter(response)
+        done = object()
+        while (
+            part := await sync_to_async(next, thread_sensitive=True)(iterator, done)
+        ) is not done:
+            yield part
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIHandler()
+
+
 application = get_asgi_application()
@@ -0,0 +1,201 @@
+"""Request metrics.
+
+This module contains optional instrumentation, enabled by
+`PANNOTATIONSD_METRICS`. A middleware records the latency, database
+queries and time, render time and response size of each request by
+view, as well as the time spent updating trajectories.
+
+Metrics are kept in memory per process and exposed in the Prometheus text
+format by `metrics_view`. With `PANNOTATIONSD_SERVER_TIMING`, the timings
+of a request are also returned in its `Server-Timing` header.
+
+https://prometheus.io/docs/instrumenting/exposition_formats/
+https://www.w3.org/TR/server-timing/
+"""
+
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from spatiotemporal import trajectories
+
+# Upper bounds of the request latency histogram, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestMetrics:
+    """The metrics of a single request."""
+
+    queries: int = 0
+    query_seconds: float = 0.0
+    render_start: Optional[float] = None
+    render_seconds: float = 0.0
+    trajectory_updates: int = 0
+    trajectory_seconds: float = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time a database query, as a database execute wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+
+@dataclass
+class ViewMetrics:
+    """The accumulated metrics of the requests to a view."""
+
+    requests: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+    queries: int = 0
+    query_seconds: float = 0.0
+    render_seconds: float = 0.0
+    response_bytes: int = 0
+    trajectory_updates: int = 0
+    trajectory_seconds: float = 0.0
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "request_metrics", default=None
+)
+_views: dict[tuple[str, str], ViewMetrics] = {}
+_lock = threading.Lock()
+
+
+def record_trajectory_update(sender, duration: float, **kwargs):
+    """Add the time of a trajectory update to the current request."""
+    current = _current.get()
+    if current is not None:
+        current.trajectory_updates += 1
+        current.trajectory_seconds += duration
+
+
+class MetricsMiddleware:
+    """Records the metrics of every request, see `metrics`."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, "PANNOTATIONSD_SERVER_TIMING", False)
+        trajectories.trajectory_updated.connect(
+            record_trajectory_update, dispatch_uid="pannotationsd.metrics"
+        )
+
+    def __call__(self, request):
+        current = RequestMetrics()
+        token = _current.set(current)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(current))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        size = 0 if response.streaming else len(response.content)
+        with _lock:
+            metrics = _views.setdefault((view, request.method), ViewMetrics())
+            metrics.requests += 1
+            metrics.errors += response.status_code >= 500
+            metrics.seconds += seconds
+            for index, bound in enumerate(BUCKETS):
+                metrics.buckets[index] += seconds <= bound
+            metrics.queries += current.queries
+            metrics.query_seconds += current.query_seconds
+            metrics.render_seconds += current.render_seconds
+            metrics.response_bytes += size
+            metrics.trajectory_updates += current.trajectory_updates
+            metrics.trajectory_seconds += current.trajectory_seconds
+
+        if self.server_timing:
+            queries = f'desc="{current.queries} queries"'
+            response["Server-Timing"] = ", ".join(
+                [
+                    f"total;dur={seconds * 1000:.1f}",
+                    f"db;dur={current.query_seconds * 1000:.1f};{queries}",
+                    f"render;dur={current.render_seconds * 1000:.1f}",
+                    f"trajectory;dur={current.trajectory_seconds * 1000:.1f}",
+                ]
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """Time rendering, e.g. of DRF responses, which happens after this."""
+        current = _current.get()
+        if current is not None:
+            current.render_start = time.perf_counter()
+            response.add_post_render_callback(self._rendered)
+        return response
+
+    @staticmethod
+    def _rendered(response):
+        current = _current.get()
+        if current is not None and current.render_start is not None:
+            current.render_seconds += time.perf_counter() - current.render_start
+
+
+def _labels(view: str, method: str) -> str:
+    view = view.replace("\\", "\\\\").replace('"', '\\"')
+    return f'view="{view}",method="{method}"'
+
+
+def exposition() -> str:
+    """The metrics in the Prometheus text format."""
+    with _lock:
+        views = {
+            key: replace(value, buckets=list(value.buckets))
+            for key, value in _views.items()
+        }
+
+    counters = {
+        "requests": ("requests_total", "Requests handled."),
+        "errors": ("request_errors_total", "Requests failing with a server error."),
+        "queries": ("db_queries_total", "Database queries executed."),
+        "query_seconds": ("db_seconds_total", "Time spent in database queries."),
+        "render_seconds": ("render_seconds_total", "Time spent rendering responses."),
+        "response_bytes": ("response_bytes_total", "Size of non-streamed responses."),
+        "trajectory_updates": ("trajectory_updates_total", "Trajectory updates."),
+        "trajectory_seconds": (
+            "trajectory_seconds_total",
+            "Time spent updating trajectories.",
+        ),
+    }
+    lines = []
+    for attribute, (name, description) in counters.items():
+        lines.append(f"# HELP pannotationsd_{name} {description}")
+        lines.append(f"# TYPE pannotationsd_{name} counter")
+        for (view, method), metrics in sorted(views.items()):
+            value = getattr(metrics, attribute)
+            lines.append(f"pannotationsd_{name}{{{_labels(view, method)}}} {value}")
+
+    name = "pannotationsd_request_duration_seconds"
+    lines.append(f"# HELP {name} Latency of requests until their response.")
+    lines.append(f"# TYPE {name} histogram")
+    for (view, method), metrics in sorted(views.items()):
+        labels = _labels(view, method)
+        for bound, count in zip(BUCKETS, metrics.buckets):
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {metrics.requests}')
+        lines.append(f"{name}_sum{{{labels}}} {metrics.seconds}")
+        lines.append(f"{name}_count{{{labels}}} {metrics.requests}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Expose the metrics of this process to Prometheus."""
+    return HttpResponse(exposition(), content_type="text/plain; version=0.0.4")
@@ -51,6 +51,23 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Record request metrics, exposed to Prometheus at `/metrics`.
+PANNOTATIONSD_METRICS = environ.get("PANNOTATIONSD_METRICS", "0") in {
+    "1",
+    "yes",
+    "true",
+    "True",
+}
+# Return the timings of each request in a `Server-Timing` header.
+PANNOTATIONSD_SERVER_TIMING = environ.get("PANNOTATIONSD_SERVER_TIMING", "0") in {
+    "1",
+    "yes",
+    "true",
+    "True",
+}
+if PANNOTATIONSD_METRICS:
+    MIDDLEWARE.insert(0, "pannotationsd.metrics.MetricsMiddleware")
+
 ROOT_URLCONF = "pannotationsd.urls"
 
 TEMPLATES = [
@@ -143,11 +160,77 @@ if environ.get("PANNOTATIONSD_GEOS_LIBRARY_PATH"):
 if environ.get("PANNOTATIONSD_GDAL_LIBRARY_PATH"):
     GDAL_LIBRARY_PATH = environ["PANNOTATIONSD_GDAL_LIBRARY_PATH"]
 
+# Caches responses and vector tiles. The local memory cache is private to each
+# process, so that writes only invalidate the cache of the process handling
+# them. Deployments with several processes should share a Redis cache.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+if environ.get("PANNOTATIONSD_REDIS_URI"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": environ["PANNOTATIONSD_REDIS_URI"],
+    }
+
+# How `SpatialThing.trajectory` is kept current: "signal" maintains it from
+# Django signals, "trigger" from database triggers. Triggers also cover writes
+# that bypass Django. They are installed or removed when running `migrate`.
+SPATIOTEMPORAL_TRAJECTORY_BACKEND = environ.get(
+    "PANNOTATIONSD_TRAJECTORY_BACKEND", "signal"
+)
+
+# The simplified trajectories stored for `?simplify=<level>`, level 1 first.
+# A level has a Douglas-Peucker `tolerance` or a budget of `vertices`. Run
+# `migrate` and `rebuild_trajectories` after changing them. Single writes of
+# extents refresh levels once committed, and `refresh_levels` catches up on
+# levels left stale, e.g. by failed refreshes.
+SPATIOTEMPORAL_TRAJECTORY_LEVELS = [{"vertices": 1000}, {"vertices": 100}]
+
+# The maximum number of vertices of the trajectory segments that space-time
+# queries on spatial things look up. Run `migrate` and `rebuild_trajectories`
+# after changing it.
+SPATIOTEMPORAL_TRAJECTORY_SEGMENT_VERTICES = 64
+
+# Partitioning of extents and measurements by ranges of `interval` timestamps,
+# each hashed into `modulus` partitions by thing or coverage. An interval of 0
+# disables partitioning. Tables are only converted by `partitions --convert`,
+# in a transaction, and the `partitions` command also maintains partitions.
+SPATIOTEMPORAL_PARTITIONING = {
+    "interval": int(environ.get("PANNOTATIONSD_PARTITION_INTERVAL", "0")),
+    "modulus": int(environ.get("PANNOTATIONSD_PARTITION_MODULUS", "0")),
+}
+
+# Where the `proximity` management command stores the pairs found by proximity
+# jobs, and the number of consecutive timestamps each of its queries searches.
+SPATIOTEMPORAL_PROXIMITY_ROOT = Path(
+    environ.get("PANNOTATIONSD_PROXIMITY_ROOT") or BASE_DIR / "proximity"
+)
+SPATIOTEMPORAL_PROXIMITY_BUCKET_SIZE = 1000
+
+# The "xmin,ymin,xmax,ymax" bounds of vector tile 0/0/0. Defaults to the bounds
+# of Web Mercator. Tiles are cached by the default cache.
+if environ.get("PANNOTATIONSD_TILE_BOUNDS"):
+    SPATIOTEMPORAL_TILE_BOUNDS = tuple(
+        float(bound) for bound in environ["PANNOTATIONSD_TILE_BOUNDS"].split(",")
+    )
+
 # Django REST Framework settings
 # https://www.django-rest-framework.org/api-guide/settings/
 REST_FRAMEWORK = {
     # Only enable JSON renderer by default.
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "spatiotemporal.renderers.ORJSONRenderer",
+    ],
+    # Parse JSON with orjson, and keep DRF's default form and multipart parsers.
+    "DEFAULT_PARSER_CLASSES": [
+        "spatiotemporal.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
+    # Paginate lists by key, so that deep pages are as fast as the first.
+    "DEFAULT_PAGINATION_CLASS": "spatiotemporal.pagination.KeysetPagination",
+    "PAGE_SIZE": 100,
 }
@@ -3,10 +3,16 @@
 The `urlpatterns` list routes URLs to views. For more information please see:
     https://docs.djangoproject.com/en/4.0/topics/http/urls/
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from pannotationsd.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("spatiotemporal.urls")),
 ]
+
+if settings.PANNOTATIONSD_METRICS:
+    urlpatterns.append(path("metrics", metrics_view, name="metrics"))
@@ -12,6 +12,7 @@ from spatiotemporal.models import (
     Coverage,
     Extent,
     Measurement,
+    ProximityJob,
     SpatialThing,
     TimeUnit,
     Universe,
@@ -23,3 +24,4 @@ admin.site.register(SpatialThing)
 admin.site.register(Extent)
 admin.site.register(Coverage)
 admin.site.register(Measurement)
+admin.site.register(ProximityJob)
@@ -10,7 +10,9 @@ https://docs.djangoproject.com/en/4.0/ref/applications/
 
 
 from django.apps import AppConfig
-from django.db.models.signals import post_delete, post_save
+from django.contrib.gis.db.models import GeometryField
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class SpatioTemporalConfig(AppConfig):
@@ -19,7 +21,23 @@ class SpatioTemporalConfig(AppConfig):
     name = "spatiotemporal"
 
     def ready(self):
-        from spatiotemporal import signals
-
-        post_save.connect(signals.update_trajectory)
-        post_delete.connect(signals.update_trajectory)
+        from spatiotemporal import signals, trajectories
+        from spatiotemporal.db.lookups import NDBBOverlaps
+
+        GeometryField.register_lookup(NDBBOverlaps)
+
+        if trajectories.backend() not in {"signal", "trigger"}:
+            raise ImproperlyConfigured(
+                "SPATIOTEMPORAL_TRAJECTORY_BACKEND must be 'signal' or 'trigger'."
+            )
+        post_save.connect(signals.invalidate_responses)
+        post_delete.connect(signals.invalidate_responses)
+        post_save.connect(signals.refresh_levels)
+        post_delete.connect(signals.refresh_levels)
+        trajectories.trajectories_changed.connect(signals.invalidate_trajectories)
+        if trajectories.backend() == "signal":
+            post_save.connect(signals.update_trajectory)
+            post_delete.connect(signals.update_trajectory)
+        post_save.connect(signals.invalidate_tiles)
+        post_delete.connect(signals.invalidate_tiles)
+        post_migrate.connect(signals.sync_trajectory_triggers, sender=self)
@@ -0,0 +1,226 @@
+"""Columnar export.
+
+This module contains the export of measurements as Apache Arrow IPC
+streams or Parquet files, for loading them into data frames. Each record
+batch holds the `id`, `timestamp` and WKB `geometry` of measurements, and
+a column per key of their flattened `properties`, e.g. `a.b` for
+`{"a": {"b": 1}}`. Measurements stored as a box have its envelope as
+their geometry.
+
+Measurements are read from a server-side cursor and written batch by
+batch, so memory use depends on the batch size only. Exporting requires
+the `pyarrow` package, installations left without it respond with an
+error instead.
+
+https://arrow.apache.org/docs/python/
+"""
+
+import io
+from itertools import islice
+from typing import Any, Iterator, Optional
+
+import orjson
+from django.db.models import QuerySet, TextField
+from django.db.models.functions import Cast
+
+from spatiotemporal.db.functions import AsBinary, StoredShape
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# The formats measurements are exported as.
+FORMATS = ("arrow", "parquet")
+
+# Arrow types of JSON Schema types. Other columns have inferred types.
+TYPES = {
+    "integer": "int64",
+    "number": "float64",
+    "boolean": "bool_",
+    "string": "string",
+}
+
+
+def available() -> bool:
+    return pyarrow is not None
+
+
+def flatten(document: Any, prefix: str = "") -> dict[str, Any]:
+    """Flatten nested objects into keys joined by dots."""
+    if not isinstance(document, dict):
+        return {prefix[:-1]: document} if prefix else {}
+    flat = {}
+    for key, value in document.items():
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def schema_types(schema: Optional[dict], prefix: str = "") -> dict[str, str]:
+    """The flattened keys of the `properties` of a JSON Schema with their types."""
+    types = {}
+    for key, value in ((schema or {}).get("properties") or {}).items():
+        if not isinstance(value, dict):
+            continue
+        if value.get("type") == "object" and value.get("properties"):
+            types.update(schema_types(value, f"{prefix}{key}."))
+        else:
+            types[f"{prefix}{key}"] = value.get("type")
+    return types
+
+
+class _Chunks(io.RawIOBase):
+    """A writable file collecting what is written until it is taken."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class MeasurementExport:
+    """Exports measurements by `timestamp` and `id`.
+
+    The property columns are the `properties` keys, else the keys of the
+    coverage's JSON Schema, else the keys found in the first batch. Their
+    types come from the JSON Schema if given, else from the first batch.
+    Values that do not fit the type of their column are exported as null,
+    or as JSON in text columns.
+    """
+
+    batch_size = 65536
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        properties: Optional[list[str]] = None,
+        schema: Optional[dict] = None,
+        batch_size: Optional[int] = None,
+    ):
+        if pyarrow is None:
+            raise ImportError("Exporting measurements requires pyarrow.")
+        self.queryset = queryset
+        self.properties = properties
+        self.types = schema_types(schema)
+        self.batch_size = batch_size or self.batch_size
+
+    def rows(self) -> Iterator[tuple]:
+        return (
+            self.queryset.order_by("timestamp", "id")
+            .annotate(
+                wkb=AsBinary(StoredShape()),
+                document=Cast("properties", output_field=TextField()),
+            )
+            .values_list("id", "timestamp", "wkb", "document")
+            .iterator(chunk_size=self.batch_size)
+        )
+
+    def batches(self) -> Iterator["pyarrow.RecordBatch"]:
+        rows = self.rows()
+        schema = None
+        while chunk := list(islice(rows, self.batch_size)):
+            ids, timestamps, geometries, documents = zip(*chunk)
+            flat = [flatten(orjson.loads(document)) for document in documents]
+            if schema is None:
+                schema = self.schema(flat)
+            columns = [
+                pyarrow.array(ids, pyarrow.int64()),
+                pyarrow.array(timestamps, pyarrow.int32()),
+                pyarrow.array([bytes(wkb) for wkb in geometries], pyarrow.binary()),
+                *(
+                    self.array([document.get(field.name) for document in flat], field)
+                    for field in list(schema)[3:]
+                ),
+            ]
+            yield pyarrow.RecordBatch.from_arrays(columns, schema=schema)
+        if schema is None:
+            schema = self.schema([])
+            empty = [pyarrow.array([], field.type) for field in schema]
+            yield pyarrow.RecordBatch.from_arrays(empty, schema=schema)
+
+    def schema(self, documents: list[dict]) -> "pyarrow.Schema":
+        keys = self.properties
+        if keys is None:
+            keys = list(self.types) or sorted(set().union(*documents))
+        fields = [
+            pyarrow.field("id", pyarrow.int64()),
+            pyarrow.field("timestamp", pyarrow.int32()),
+            pyarrow.field("geometry", pyarrow.binary()),
+        ]
+        for key in keys:
+            if self.types.get(key) in TYPES:
+                arrow_type = getattr(pyarrow, TYPES[self.types[key]])()
+            else:
+                values = [document.get(key) for document in documents]
+                arrow_type = self.array(values).type
+                if pyarrow.types.is_null(arrow_type):
+                    arrow_type = pyarrow.string()
+            fields.append(pyarrow.field(key, arrow_type))
+        return pyarrow.schema(fields)
+
+    @staticmethod
+    def array(values: list, field=None) -> "pyarrow.Array":
+        """An array of the values, as JSON text if they have mixed types."""
+        arrow_type = field.type if field is not None else None
+        errors = (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError)
+        try:
+            return pyarrow.array(values, arrow_type)
+        except errors:
+            pass
+        if arrow_type is None or pyarrow.types.is_string(arrow_type):
+            return pyarrow.array(
+                [
+                    value
+                    if value is None or isinstance(value, str)
+                    else orjson.dumps(value).decode()
+                    for value in values
+                ],
+                pyarrow.string(),
+            )
+        fitting = []
+        for value in values:
+            try:
+                pyarrow.scalar(value, arrow_type)
+            except errors:
+                value = None
+            fitting.append(value)
+        return pyarrow.array(fitting, arrow_type)
+
+    def stream(self, format: str = "arrow") -> Iterator[bytes]:
+        """The bytes of the export as "arrow" (IPC stream) or "parquet".
+
+        Raises `ValueError` on other formats, before anything is read.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format {format!r}.")
+        return self._stream(format)
+
+    def _stream(self, format: str) -> Iterator[bytes]:
+        sink = _Chunks()
+        writer = None
+        for batch in self.batches():
+            if writer is None:
+                if format == "parquet":
+                    writer = pyarrow.parquet.ParquetWriter(sink, batch.schema)
+                else:
+                    writer = pyarrow.ipc.new_stream(sink, batch.schema)
+            writer.write_table(pyarrow.Table.from_batches([batch]))
+            yield sink.take()
+        writer.close()
+        yield sink.take()
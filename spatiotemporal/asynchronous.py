@@ -0,0 +1,202 @@
+"""Async views.
+
+This module contains read-only views of the spatiotemporal models for
+ASGI servers. Every viewset streaming its lists has an async
+counterpart under `async/` with the same filters: a list paginated by
+key, a detail view and a stream of all objects as NDJSON or, with
+`?format=geojsonseq`, GeoJSON text sequences.
+
+Django 4.0 has no async ORM, so every query runs in a worker thread for
+its duration only. Streams read chunks in key order with a query each,
+rather than from a server-side cursor, so that a slow client holds
+neither a thread nor a transaction while it reads. The number of open
+requests is then bound by the event loop rather than by threads.
+
+https://docs.djangoproject.com/en/4.0/topics/async/
+"""
+
+from typing import Any, AsyncIterator, Callable, Optional
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.db import close_old_connections
+from django.db.models import F, QuerySet, Value
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from spatiotemporal.db.functions import Row
+from spatiotemporal.pagination import KeysetPagination
+from spatiotemporal.renderers import (
+    GeoJSONSeqRenderer,
+    NDJSONRenderer,
+    ORJSONRenderer,
+)
+
+
+async def query(function: Callable, *args) -> Any:
+    """Run blocking database code in a worker thread."""
+
+    def run():
+        close_old_connections()
+        return function(*args)
+
+    return await sync_to_async(run, thread_sensitive=False)()
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """A streaming response of an async iterator of bytes.
+
+    Sent as it is produced by the handler of `pannotationsd.asgi`. Under
+    WSGI, it is iterated one part at a time with `async_to_sync`.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], *args, **kwargs):
+        super().__init__((), *args, **kwargs)
+        self.async_content = content
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.async_content.__aiter__()
+
+    def __iter__(self):
+        iterator = self.__aiter__()
+
+        async def next_part():
+            return await iterator.__anext__()
+
+        while True:
+            try:
+                yield async_to_sync(next_part)()
+            except StopAsyncIteration:
+                return
+
+
+class AsyncResource:
+    """The async views of the model of a viewset, with its filters.
+
+    Each request is handled with an instance of the viewset for its
+    queryset and serializer, so that sparse fieldsets and expanded
+    relations read the same columns as the sync views. Lists are paginated
+    by `KeysetPagination` on the viewset's `keyset`, and streams are read
+    in chunks of its `stream_chunk_size`. Objects are serialized in the
+    worker thread querying them, as serializing may query related objects.
+    """
+
+    def __init__(self, viewset):
+        self.viewset = viewset
+        self.keyset = getattr(viewset, "keyset", KeysetPagination.keyset)
+        self.chunk_size = getattr(viewset, "stream_chunk_size", 2000)
+
+    def view(self, request: Request, action: str):
+        """An instance of the viewset handling a request."""
+        return self.viewset(
+            request=request, args=(), kwargs={}, format_kwarg=None, action=action
+        )
+
+    @staticmethod
+    def queryset(view) -> QuerySet:
+        return view.filter_queryset(view.get_queryset())
+
+    async def list(self, request):
+        request = Request(request)
+        view = self.view(request, "list")
+        paginator = KeysetPagination()
+        try:
+            queryset = self.queryset(view)
+            serializer = view.get_serializer()
+        except APIException as error:
+            return self.error(error)
+
+        def representations() -> list:
+            page = paginator.paginate_queryset(queryset, request, view)
+            return [serializer.to_representation(obj) for obj in page]
+
+        try:
+            results = await query(representations)
+        except APIException as error:
+            return self.error(error)
+        data = {"next": paginator.next, "previous": paginator.previous}
+        return self.response({**data, "results": results})
+
+    async def detail(self, request, pk: int):
+        request = Request(request)
+        view = self.view(request, "retrieve")
+        try:
+            queryset = self.queryset(view)
+            serializer = view.get_serializer()
+        except APIException as error:
+            return self.error(error)
+
+        def representation() -> Optional[dict]:
+            obj = queryset.filter(pk=pk).first()
+            return None if obj is None else serializer.to_representation(obj)
+
+        data = await query(representation)
+        if data is None:
+            return self.response({"detail": "Not found."}, status=404)
+        return self.response(data)
+
+    async def stream(self, request):
+        request = Request(request)
+        view = self.view(request, "list")
+        if request.query_params.get("format") == GeoJSONSeqRenderer.format:
+            renderer = GeoJSONSeqRenderer()
+        else:
+            renderer = NDJSONRenderer()
+        try:
+            queryset = self.queryset(view).order_by(*self.keyset)
+            serializer = view.get_serializer()
+        except APIException as error:
+            return self.error(error)
+
+        geometry_field = self.viewset.geometry_field
+        as_features = isinstance(renderer, GeoJSONSeqRenderer) and geometry_field
+        if as_features:
+            # E.g. objects stored as a box are streamed as its envelope.
+            queryset = queryset.annotate(geojson=AsGeoJSON(view.get_geometry()))
+
+        def render(key: Optional[list]) -> tuple[bytes, int, Optional[list]]:
+            chunk = self.chunk(queryset, key)
+            part = b"".join(
+                renderer.record(
+                    serializer.to_representation(obj),
+                    geometry_field,
+                    (obj.geojson or "null").encode() if as_features else None,
+                )
+                for obj in chunk
+            )
+            if chunk:
+                key = [getattr(chunk[-1], field) for field in self.keyset]
+            return part, len(chunk), key
+
+        async def records():
+            key = None
+            while True:
+                part, size, key = await query(render, key)
+                yield part
+                if size < self.chunk_size:
+                    return
+
+        return AsyncStreamingHttpResponse(records(), content_type=renderer.media_type)
+
+    def chunk(self, queryset: QuerySet, key: Optional[list]) -> list:
+        """The objects after a key, like a page of `KeysetPagination`."""
+        if key is not None:
+            queryset = queryset.alias(
+                keyset=Row(*(F(field) for field in self.keyset))
+            ).filter(keyset__gt=Row(*(Value(value) for value in key)))
+        return list(queryset[: self.chunk_size])
+
+    @staticmethod
+    def response(data, status: int = 200) -> HttpResponse:
+        return HttpResponse(
+            ORJSONRenderer().render(data),
+            content_type=ORJSONRenderer.media_type,
+            status=status,
+        )
+
+    def error(self, error: APIException) -> HttpResponse:
+        detail = error.detail
+        if not isinstance(detail, (dict, list)):
+            detail = {"detail": detail}
+        return self.response(detail, status=error.status_code)
@@ -0,0 +1,85 @@
+"""Stored bounding boxes.
+
+This module contains the maintenance of the `box_xmin` to `box_zmax`
+columns of extents and measurements, which store the 3D bounding box of
+their geometry. A row trigger computes them whenever a row is written,
+whichever way, so that trajectory vertices and box filters read six numbers
+rather than detoasting the geometry.
+
+Box filters compare `StoredBox`, the n-D box of these columns, with `&&&`.
+It is indexed by an expression index on each table.
+
+Rows may also store just a box, without a geometry, e.g. the axis-aligned
+rectangles of labeled images. The trigger then keeps the given box, and
+`StoredShape` stands in for the geometry with the envelope of the box.
+"""
+
+TABLES = ["spatiotemporal_extent", "spatiotemporal_measurement"]
+
+FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_store_box()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        box box3d;
+    BEGIN
+        IF NEW.geometry IS NOT NULL THEN
+            box := Box3D(NEW.geometry);
+            NEW.box_xmin := ST_XMin(box);
+            NEW.box_ymin := ST_YMin(box);
+            NEW.box_zmin := ST_ZMin(box);
+            NEW.box_xmax := ST_XMax(box);
+            NEW.box_ymax := ST_YMax(box);
+            NEW.box_zmax := ST_ZMax(box);
+        END IF;
+        RETURN NEW;
+    END;
+    $$
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS {table}_box ON {table}"
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER {table}_box
+    BEFORE INSERT OR UPDATE ON {table}
+    FOR EACH ROW
+    EXECUTE FUNCTION spatiotemporal_store_box()
+"""
+
+# Fills the columns of rows written before the triggers were installed.
+FILL = """
+    UPDATE {table}
+    SET box_xmin = ST_XMin(b.box),
+        box_ymin = ST_YMin(b.box),
+        box_zmin = ST_ZMin(b.box),
+        box_xmax = ST_XMax(b.box),
+        box_ymax = ST_YMax(b.box),
+        box_zmax = ST_ZMax(b.box)
+    FROM (SELECT id, Box3D(geometry) AS box FROM {table}) AS b
+    WHERE {table}.id = b.id AND {table}.box_xmin IS NULL
+"""
+
+
+def install_triggers(connection):
+    """Install the function and triggers storing the boxes."""
+    with connection.cursor() as cursor:
+        cursor.execute(FUNCTION)
+        for table in TABLES:
+            cursor.execute(DROP_TRIGGER.format(table=table))
+            cursor.execute(CREATE_TRIGGER.format(table=table))
+
+
+def uninstall_triggers(connection):
+    """Remove the triggers and function storing the boxes."""
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(DROP_TRIGGER.format(table=table))
+        cursor.execute("DROP FUNCTION IF EXISTS spatiotemporal_store_box()")
+
+
+def fill(connection):
+    """Store the boxes of rows written before the triggers were installed."""
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(FILL.format(table=table))
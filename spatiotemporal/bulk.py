@@ -0,0 +1,369 @@
+"""Bulk ingestion.
+
+This module contains loaders that insert many extents or measurements at
+once. Rows are validated in Python, streamed into a temporary staging table
+with `COPY` in chunks, and moved into the model's table with a single
+`INSERT ... SELECT`. Rows that fail are reported by their index in the input
+instead of aborting the whole batch.
+
+https://www.postgresql.org/docs/current/sql-copy.html
+"""
+
+import csv
+import io
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import islice
+from math import isfinite
+from typing import Any, Iterable, Iterator, Optional
+
+import orjson
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+from spatiotemporal import schemas, tiles, trajectories
+from spatiotemporal.models import BOX_FIELDS, Coverage, Extent, Measurement
+
+
+@dataclass
+class BulkResult:
+    """The outcome of a bulk load.
+
+    `conflicts` counts the valid rows skipped as they conflicted with rows
+    written concurrently, which are also reported in `errors`.
+    """
+
+    created: int = 0
+    conflicts: int = 0
+    errors: list[dict[str, Any]] = field(default_factory=list)
+
+    def reject(self, index: int, errors: dict[str, list[str]]):
+        self.errors.append({"index": index, "errors": errors})
+
+
+def rows(data) -> Iterable:
+    """The rows of a request body.
+
+    Accepts a feature collection, a single object or any iterable of objects.
+    """
+    if isinstance(data, dict):
+        if data.get("type") == "FeatureCollection":
+            return data.get("features") or []
+        return [data]
+    return data
+
+
+def has_nul(value) -> bool:
+    """Whether a JSON value contains a NUL character in a string or key."""
+    if isinstance(value, str):
+        return "\x00" in value
+    if isinstance(value, dict):
+        return any(has_nul(key) or has_nul(item) for key, item in value.items())
+    if isinstance(value, list):
+        return any(has_nul(item) for item in value)
+    return False
+
+
+class BulkLoader:
+    """Loads rows of `model` into the database with `COPY`.
+
+    Each row references its `parent` by primary key and holds a
+    `timestamp`, a 3D `geometry` or, instead of one, a `box` as
+    `[xmin, ymin, zmin, xmax, ymax, zmax]`, and a JSON `document`. GeoJSON
+    features are accepted as rows, with the other fields as their properties.
+    """
+
+    model: type[models.Model]
+    parent: str
+    document: str
+    document_default: Optional[Any] = None
+    chunk_size = 10000
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+        self.connection = connections[using]
+        # The integer columns, whose values must fit before being copied.
+        opts = self.model._meta
+        self.ranges = {
+            name: self.connection.ops.integer_field_range(field.get_internal_type())
+            for name, field in [
+                (self.parent, opts.get_field(self.parent).target_field),
+                ("timestamp", opts.get_field("timestamp")),
+            ]
+        }
+
+    def load(self, data: Iterable) -> BulkResult:
+        """Validate and insert the rows, returning how many were created."""
+        result = BulkResult()
+        with self.atomic(), self.connection.cursor() as cursor:
+            cursor.execute(self.sql("CREATE_STAGING"))
+            cleaned = self.clean_rows(data, result)
+            while chunk := list(islice(cleaned, self.chunk_size)):
+                chunk = self.validate_chunk(chunk, result)
+                cursor.copy_expert(self.sql("COPY"), self.csv(chunk))
+
+            cursor.execute(self.sql("REJECT_ORPHANS"))
+            for (index,) in cursor.fetchall():
+                result.reject(index, {self.parent: ["Object does not exist."]})
+            cursor.execute(self.sql("REJECT_DUPLICATES"))
+            for (index,) in cursor.fetchall():
+                result.reject(index, {"timestamp": ["Must be unique."]})
+
+            cursor.execute(self.sql("INSERT"))
+            parents = set()
+            for index, parent in cursor.fetchall():
+                if parent is None:
+                    result.reject(index, {"timestamp": ["Must be unique."]})
+                    result.conflicts += 1
+                else:
+                    parents.add(parent)
+                    result.created += 1
+            self.created(parents)
+            cursor.execute(self.sql("FOOTPRINT"))
+            for universe, *extent in cursor.fetchall():
+                tiles.invalidate([tuple(extent)], universe, using=self.using)
+            cursor.execute(self.sql("DROP_STAGING"))
+
+        result.errors.sort(key=lambda error: error["index"])
+        return result
+
+    def atomic(self):
+        return transaction.atomic(using=self.using)
+
+    def created(self, parents: set[int]):
+        """Hook called with the parents of created rows, before committing."""
+
+    def validate_chunk(self, chunk: list[list], result: BulkResult) -> list[list]:
+        """Hook validating a chunk of cleaned rows, returning the valid rows."""
+        return chunk
+
+    def clean_rows(self, data: Iterable, result: BulkResult) -> Iterator[list]:
+        keys = set()
+        for index, row in enumerate(rows(data)):
+            values, errors = self.clean(row)
+            if not errors and values[:2] in keys:
+                errors = {"timestamp": ["Must be unique."]}
+            if errors:
+                result.reject(index, errors)
+                continue
+            keys.add(values[:2])
+            yield [index, *values]
+
+    def clean(self, row) -> tuple[tuple, dict[str, list[str]]]:
+        """Validate a row, returning its column values or its errors."""
+        if isinstance(row, Exception):
+            return (), {"non_field_errors": [str(row)]}
+        if not isinstance(row, dict):
+            return (), {"non_field_errors": ["Expected an object."]}
+        if row.get("type") == "Feature":
+            row = {**(row.get("properties") or {}), "geometry": row.get("geometry")}
+
+        errors: dict[str, list[str]] = {}
+        parent = self.clean_integer(row, self.parent, errors)
+        timestamp = self.clean_integer(row, "timestamp", errors)
+        if row.get("geometry") is None and row.get("box") is not None:
+            geometry, box = None, self.clean_box(row, errors)
+        else:
+            geometry, box = self.clean_geometry(row, errors), [None] * len(BOX_FIELDS)
+        document = row.get(self.document, self.document_default)
+        if document is None:
+            errors[self.document] = ["This field is required."]
+        elif has_nul(document):
+            # jsonb rejects them, which would fail the COPY of the whole chunk.
+            errors[self.document] = ["Must not contain NUL characters (\\u0000)."]
+        if errors:
+            return (), errors
+        return (parent, timestamp, geometry, *box, document), {}
+
+    def clean_integer(self, row: dict, name: str, errors: dict) -> Optional[int]:
+        value = row.get(name)
+        low, high = self.ranges[name]
+        if value is None:
+            errors[name] = ["This field is required."]
+        elif isinstance(value, bool) or not isinstance(value, int):
+            errors[name] = ["A valid integer is required."]
+        elif value < low:
+            errors[name] = [f"Ensure this value is greater than or equal to {low}."]
+        elif value > high:
+            errors[name] = [f"Ensure this value is less than or equal to {high}."]
+        return value
+
+    @staticmethod
+    def clean_geometry(row: dict, errors: dict) -> Optional[str]:
+        value = row.get("geometry")
+        if value is None:
+            errors["geometry"] = ["This field is required."]
+            return None
+        try:
+            if isinstance(value, dict):
+                geometry = GEOSGeometry(orjson.dumps(value).decode())
+                # GeoJSON is read as WGS 84, but its coordinates are local.
+                geometry.srid = 0
+            else:
+                geometry = GEOSGeometry(value)
+        except (GEOSException, TypeError, ValueError) as error:
+            errors["geometry"] = [f"Invalid geometry: {error}"]
+            return None
+        if geometry.srid not in (None, 0):
+            errors["geometry"] = ["Geometry must not have an SRID."]
+        elif not geometry.hasz:
+            errors["geometry"] = ["Geometry must have a Z coordinate."]
+        else:
+            return geometry.hexewkb.decode()
+        return None
+
+    @staticmethod
+    def clean_box(row: dict, errors: dict) -> list[float]:
+        value = row["box"]
+        if (
+            not isinstance(value, list)
+            or len(value) != len(BOX_FIELDS)
+            or not all(
+                isinstance(bound, (int, float))
+                and not isinstance(bound, bool)
+                and isfinite(bound)
+                for bound in value
+            )
+        ):
+            errors["box"] = ["Expected a list of 6 finite numbers."]
+            return []
+        if any(low > high for low, high in zip(value[:3], value[3:])):
+            errors["box"] = ["Expected minima not greater than their maxima."]
+            return []
+        return [float(bound) for bound in value]
+
+    @staticmethod
+    def csv(chunk: list[list]) -> io.StringIO:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [*row[:-1], orjson.dumps(row[-1]).decode()] for row in chunk
+        )
+        buffer.seek(0)
+        return buffer
+
+    def sql(self, name: str) -> str:
+        opts = self.model._meta
+        parent = opts.get_field(self.parent)
+        quote = self.connection.ops.quote_name
+        return getattr(self, name).format(
+            staging=quote(f"bulk_{opts.db_table}"),
+            table=quote(opts.db_table),
+            parent=quote(parent.column),
+            parent_table=quote(parent.related_model._meta.db_table),
+            document=quote(self.document),
+            box=", ".join(quote(name) for name in BOX_FIELDS),
+            box_columns=", ".join(
+                f"{quote(name)} double precision" for name in BOX_FIELDS
+            ),
+        )
+
+    CREATE_STAGING = """
+        CREATE TEMPORARY TABLE {staging} (
+            ordinal integer PRIMARY KEY,
+            {parent} bigint NOT NULL,
+            timestamp integer NOT NULL,
+            geometry geometry,
+            {box_columns},
+            {document} jsonb NOT NULL
+        ) ON COMMIT DROP
+    """
+
+    COPY = """
+        COPY {staging} (ordinal, {parent}, timestamp, geometry, {box}, {document})
+        FROM STDIN WITH (FORMAT csv)
+    """
+
+    REJECT_ORPHANS = """
+        DELETE FROM {staging} AS s
+        WHERE NOT EXISTS (SELECT FROM {parent_table} AS p WHERE p.id = s.{parent})
+        RETURNING s.ordinal
+    """
+
+    REJECT_DUPLICATES = """
+        DELETE FROM {staging} AS s
+        USING {table} AS t
+        WHERE t.{parent} = s.{parent} AND t.timestamp = s.timestamp
+        RETURNING s.ordinal
+    """
+
+    # Returns the parent of each inserted row by ordinal, or NULL for the rows
+    # skipped as they conflict with rows inserted concurrently.
+    INSERT = """
+        WITH inserted AS (
+            INSERT INTO {table} ({parent}, timestamp, geometry, {box}, {document})
+            SELECT {parent}, timestamp, geometry, {box}, {document}
+            FROM {staging}
+            ORDER BY ordinal
+            ON CONFLICT DO NOTHING
+            RETURNING {parent}, timestamp
+        )
+        SELECT s.ordinal, i.{parent}
+        FROM {staging} AS s
+        LEFT JOIN inserted AS i
+        ON i.{parent} = s.{parent} AND i.timestamp = s.timestamp
+    """
+
+    # The 2D extent of the rows of each universe.
+    FOOTPRINT = """
+        SELECT universe_id, ST_XMin(box), ST_YMin(box), ST_XMax(box), ST_YMax(box)
+        FROM (
+            SELECT p.universe_id, ST_Extent(
+                coalesce(
+                    s.geometry,
+                    ST_MakeEnvelope(s.box_xmin, s.box_ymin, s.box_xmax, s.box_ymax, 0)
+                )
+            ) AS box
+            FROM {staging} AS s
+            JOIN {parent_table} AS p ON p.id = s.{parent}
+            GROUP BY p.universe_id
+        ) AS s
+        WHERE box IS NOT NULL
+    """
+
+    DROP_STAGING = "DROP TABLE {staging}"
+
+
+class ExtentLoader(BulkLoader):
+    model = Extent
+    parent = "thing"
+    document = "metadata"
+    document_default: Any = {}
+
+    def atomic(self):
+        return trajectories.deferred(using=self.using)
+
+    def created(self, parents: set[int]):
+        trajectories.changed(parents, using=self.using)
+
+
+class MeasurementLoader(BulkLoader):
+    model = Measurement
+    parent = "coverage"
+    document = "properties"
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        super().__init__(using)
+        self.schemas: dict[int, Any] = {}
+
+    def validate_chunk(self, chunk: list[list], result: BulkResult) -> list[list]:
+        """Validate the properties against the schemas of their coverages."""
+        missing = {row[1] for row in chunk} - self.schemas.keys()
+        if missing:
+            self.schemas.update(
+                Coverage.objects.using(self.using)
+                .filter(pk__in=missing)
+                .values_list("pk", "properties_schema")
+            )
+
+        by_coverage = defaultdict(list)
+        for row in chunk:
+            by_coverage[row[1]].append(row)
+        rejected = set()
+        for coverage, group in by_coverage.items():
+            documents = [row[-1] for row in group]
+            invalid = schemas.validate_many(self.schemas.get(coverage), documents)
+            for position, messages in invalid.items():
+                index = group[position][0]
+                result.reject(index, {"properties": messages})
+                rejected.add(index)
+        return [row for row in chunk if row[0] not in rejected]
@@ -0,0 +1,78 @@
+"""Response caching.
+
+This module contains the caching of rendered list and detail responses
+in `SPATIOTEMPORAL_RESPONSE_CACHE`, one of Django's caches. Every model
+has a version counter for its lists, and every object one for its detail
+responses. Saving or deleting an object increments both once committed,
+which invalidates its cached responses without knowing their keys.
+
+Cached responses carry an `ETag`, so that clients revalidating with
+`If-None-Match` get a `304 Not Modified` without a body.
+
+https://docs.djangoproject.com/en/4.0/topics/cache/
+"""
+
+import hashlib
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+
+from spatiotemporal import versions
+
+
+def cache():
+    return caches[getattr(settings, "SPATIOTEMPORAL_RESPONSE_CACHE", "default")]
+
+
+def timeout() -> Optional[int]:
+    return getattr(settings, "SPATIOTEMPORAL_RESPONSE_CACHE_TIMEOUT", 300)
+
+
+def version_keys(model: type[models.Model], pk: Optional[Any] = None) -> list[str]:
+    """The versions a list, or with a `pk` a detail, response depends on."""
+    label = model._meta.label_lower
+    if pk is None:
+        return [f"responses:version:{label}"]
+    return [f"responses:version:{label}:{pk}"]
+
+
+def key(
+    model: type[models.Model],
+    pk: Optional[Any],
+    variant: str,
+    related: Iterable[type[models.Model]] = (),
+) -> str:
+    """The cache key of a response, e.g. by its path and media type.
+
+    Responses that include `related` models, e.g. expanded relations, also
+    depend on the versions of their lists, so that changing any of their
+    objects invalidates them.
+    """
+    keys = version_keys(model, pk)
+    for other in related:
+        keys.extend(version_keys(other))
+    current = versions.get(cache(), keys)
+    digest = hashlib.sha1(variant.encode()).hexdigest()
+    return ":".join(
+        ["responses", model._meta.label_lower, *map(str, current.values()), digest]
+    )
+
+
+def etag(content: bytes) -> str:
+    return f'"{hashlib.sha1(content).hexdigest()}"'
+
+
+def invalidate(
+    model: type[models.Model], pks: Iterable[Any], using: str = DEFAULT_DB_ALIAS
+):
+    """Invalidate the lists of a model and the details of some objects.
+
+    Runs once the current transaction is committed, so that responses are
+    not cached from the old rows again in the meantime.
+    """
+    keys = version_keys(model)
+    for pk in pks:
+        keys.extend(version_keys(model, pk))
+    transaction.on_commit(lambda: versions.increment(cache(), keys), using=using)
@@ -8,7 +8,8 @@ https://docs.djangoproject.com/en/4.0/ref/models/expressions/#func-expressions-1
 
 
 from django.contrib.gis.db.models import GeometryField, LineStringField, PointField
-from django.db.models import FloatField, Func
+from django.db.models import BinaryField, F, Field, FloatField, Func, Value
+from django.db.models.functions import Coalesce
 
 
 class Box3D(Func):
@@ -72,3 +73,133 @@ class MakeLine(Func):
 
     function = "ST_MakeLine"
     output_field = LineStringField(srid=0)
+
+
+class NDBox(Func):
+    """Compute a line whose n-D bounding box spans two corner points.
+
+    Corners are (x, y, z, m) tuples of numbers or expressions. Meant as
+    the right-hand side of n-D bounding box operators like `&&&`.
+    """
+
+    function = "ST_MakeLine"
+    output_field = GeometryField(srid=0)
+
+    def __init__(self, lower, upper, **extra):
+        super().__init__(MakePoint(*lower), MakePoint(*upper), **extra)
+
+
+class NDDistance(Func):
+    """The n-D distance between two geometries, including their M coordinates.
+
+    Compiles to the `<<->>` operator. Ordering by it is a k-nearest neighbour
+    search, supported by GiST indexes using `gist_geometry_ops_nd`.
+
+    https://postgis.net/docs/geometry_distance_centroid_nd.html
+    """
+
+    arg_joiner = " <<->> "
+    template = "(%(expressions)s)"
+    output_field = FloatField()
+
+
+class StoredBox(NDBox):
+    """The n-D box of the `box_xmin` to `box_zmax` columns of a row, see `boxes`.
+
+    The same expression is indexed on extents and measurements.
+    """
+
+    def __init__(self, **extra):
+        super().__init__(
+            [F("box_xmin"), F("box_ymin"), F("box_zmin")],
+            [F("box_xmax"), F("box_ymax"), F("box_zmax")],
+            **extra
+        )
+
+
+class StoredSpaceTimeBox(NDBox):
+    """The n-D box of the box columns of a row at its timestamp, see `boxes`.
+
+    The timestamp is the M coordinate of both corners, so that boxes only
+    overlap at the same timestamp. Indexed on extents, see `proximity`.
+    """
+
+    def __init__(self, **extra):
+        super().__init__(
+            [F("box_xmin"), F("box_ymin"), F("box_zmin"), F("timestamp")],
+            [F("box_xmax"), F("box_ymax"), F("box_zmax"), F("timestamp")],
+            **extra
+        )
+
+
+class StoredEnvelope(Func):
+    """The 2D envelope of the stored box columns of a row, see `boxes`."""
+
+    function = "ST_MakeEnvelope"
+    output_field = GeometryField(srid=0)
+
+    def __init__(self, **extra):
+        super().__init__(
+            F("box_xmin"),
+            F("box_ymin"),
+            F("box_xmax"),
+            F("box_ymax"),
+            Value(0),
+            **extra
+        )
+
+
+class StoredShape(Coalesce):
+    """The geometry of a row, or the envelope of its box if it has none.
+
+    Rows of extents and measurements may store a box instead of a geometry.
+    """
+
+    def __init__(self, field="geometry", **extra):
+        super().__init__(
+            F(field), StoredEnvelope(), output_field=GeometryField(srid=0), **extra
+        )
+
+
+class Row(Func):
+    """Construct a row value, e.g. for comparing composite keys.
+
+    Comparisons between rows are lexicographic and can use a
+    multicolumn btree index on the same columns.
+    """
+
+    function = "ROW"
+    output_field = Field()
+
+
+class LocateAlong(Func):
+    """Compute the points of a measured geometry at a measure.
+
+    Points between vertices are interpolated linearly.
+
+    https://postgis.net/docs/ST_LocateAlong.html
+    """
+
+    function = "ST_LocateAlong"
+    output_field = GeometryField(srid=0)
+
+
+class GeometryN(Func):
+    """Returns the Nth geometry of a collection, counting from 1."""
+
+    function = "ST_GeometryN"
+    output_field = GeometryField(srid=0)
+
+
+class Force3D(Func):
+    """Force a geometry into XYZ mode, e.g. to drop its M coordinates."""
+
+    function = "ST_Force3D"
+    output_field = GeometryField(srid=0, dim=3)
+
+
+class AsBinary(Func):
+    """Returns the ISO WKB of a geometry, including Z and M coordinates."""
+
+    function = "ST_AsBinary"
+    output_field = BinaryField()
@@ -0,0 +1,26 @@
+"""Django database lookups.
+
+This module supplements Django's own coverage of PostGIS
+operators.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-lookups/
+"""
+
+from django.db.models import Lookup
+
+
+class NDBBOverlaps(Lookup):
+    """Whether the n-D bounding boxes of two geometries intersect.
+
+    Compiles to the `&&&` operator, which is supported by GiST indexes
+    using the `gist_geometry_ops_nd` operator class.
+
+    https://postgis.net/docs/geometry_overlaps_nd.html
+    """
+
+    lookup_name = "ndbboverlaps"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} &&& {rhs}", [*lhs_params, *rhs_params]
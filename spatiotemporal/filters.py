@@ -0,0 +1,130 @@
+"""Django REST Framework filter backends.
+
+This module contains the DRF filter backends. These allow
+filtering list responses by query parameters.
+
+https://www.django-rest-framework.org/api-guide/filtering/
+"""
+
+from math import ceil, floor, inf
+from typing import Optional
+
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from spatiotemporal.db.functions import NDBox, StoredBox, StoredShape
+
+
+def parse_bounds(name: str, value: str, count: int) -> list[Optional[float]]:
+    """Parse comma separated bounds, where an empty bound is open."""
+    bounds = value.split(",")
+    if len(bounds) != count:
+        raise ValidationError({name: [f"Expected {count} comma separated numbers."]})
+    try:
+        return [float(bound) if bound.strip() else None for bound in bounds]
+    except ValueError:
+        raise ValidationError({name: ["Expected numbers."]})
+
+
+def open_box(lower, upper) -> NDBox:
+    """A box whose `None` bounds are replaced by infinity."""
+    return NDBox(
+        [-inf if bound is None else bound for bound in lower],
+        [inf if bound is None else bound for bound in upper],
+    )
+
+
+class TrajectoryBoundingBoxFilter(BaseFilterBackend):
+    """Filters spatial things by a spatiotemporal box.
+
+    Given as `?bbox=xmin,ymin,zmin,tmin,xmax,ymax,zmax,tmax`, where any
+    bound may be left empty. Uses the n-D index of the trajectories.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get("bbox")
+        if value is None:
+            return queryset
+        bounds = parse_bounds("bbox", value, 8)
+        return queryset.intersecting_box(bounds[:4], bounds[4:])
+
+
+class GeometryFilter(BaseFilterBackend):
+    """Filters extents or measurements by their geometry.
+
+    `?bbox=xmin,ymin,zmin,xmax,ymax,zmax` (or `xmin,ymin,xmax,ymax`) keeps
+    geometries whose 3D bounding box intersects the box. `?intersects=`
+    takes WKT or GeoJSON without an SRID, in the coordinates of the stored
+    geometries, and keeps geometries intersecting it in 2D.
+
+    Both compare the stored bounding boxes of the geometries with `&&&`
+    first, see `boxes`, so that geometries outside the box are never read.
+    Open dimensions, like Z of a 2D geometry, are unbounded rather than zero.
+    Objects stored as a box instead of a geometry intersect as its envelope.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        field = view.geometry_field
+        queryset = queryset.alias(stored_box=StoredBox())
+        value = request.query_params.get("bbox")
+        if value is not None:
+            count = 4 if value.count(",") == 3 else 6
+            bounds = parse_bounds("bbox", value, count)
+            if count == 4:
+                bounds = [*bounds[:2], None, *bounds[2:], None]
+            box = open_box(bounds[:3], bounds[3:])
+            queryset = queryset.filter(stored_box__ndbboverlaps=box)
+
+        value = request.query_params.get("intersects")
+        if value is not None:
+            try:
+                geometry = GEOSGeometry(value)
+            except (GEOSException, TypeError, ValueError) as error:
+                raise ValidationError({"intersects": [f"Invalid geometry: {error}"]})
+            if value.lstrip().startswith("{"):
+                # GeoJSON is read as WGS 84, but its coordinates are local.
+                geometry.srid = 0
+            elif geometry.srid not in (None, 0):
+                raise ValidationError(
+                    {"intersects": ["Geometry must not have an SRID."]}
+                )
+            xmin, ymin, xmax, ymax = geometry.extent
+            box = open_box([xmin, ymin, None], [xmax, ymax, None])
+            queryset = queryset.alias(stored_shape=StoredShape(field)).filter(
+                stored_box__ndbboverlaps=box, stored_shape__intersects=geometry
+            )
+        return queryset
+
+
+class TimestampFilter(BaseFilterBackend):
+    """Filters by an inclusive time range, given as `?timestamp=start,end`.
+
+    Either end may be left empty.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get("timestamp")
+        if value is None:
+            return queryset
+        start, end = parse_bounds("timestamp", value, 2)
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=ceil(start))
+        if end is not None:
+            queryset = queryset.filter(timestamp__lte=floor(end))
+        return queryset
+
+
+class ParentFilter(BaseFilterBackend):
+    """Filters by the primary keys of `view.parent_field`, e.g. `?coverage=1,2`."""
+
+    def filter_queryset(self, request, queryset, view):
+        field = view.parent_field
+        value = request.query_params.get(field)
+        if value is None:
+            return queryset
+        try:
+            pks = [int(pk) for pk in value.split(",")]
+        except ValueError:
+            raise ValidationError({field: ["Expected comma separated integers."]})
+        return queryset.filter(**{f"{field}__in": pks})
@@ -0,0 +1,206 @@
+"""Simplified trajectories.
+
+This module contains the maintenance of `TrajectoryLevel`, the simplified
+versions of `SpatialThing.trajectory` used for overviews. Each level of
+`SPATIOTEMPORAL_TRAJECTORY_LEVELS` either simplifies the trajectory with
+Douglas-Peucker to a `tolerance`, or keeps an evenly spaced selection of at
+most `vertices` vertices, always including the first and last vertex.
+
+Recomputing the levels reads the whole trajectory, so it is not done for
+every change. Instead, a row trigger on the spatial thing table marks the
+levels as stale, in `SpatialThing.levels_stale`, whenever the trajectory
+changes, whichever way the trajectory is maintained. Stale levels are
+refreshed in batches: for all things changed by a `trajectories.deferred()`
+block or a bulk write, and by `rebuild_trajectories`. Single writes of
+extents refresh the levels of their things once committed, see
+`signals.refresh_levels`, and `refresh_levels` catches up on things left
+stale, e.g. as their refresh failed. Until then, the previous levels are
+served. Levels that would not remove any vertex are not stored.
+
+https://postgis.net/docs/ST_Simplify.html
+"""
+
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+DEFAULT_LEVELS = [{"vertices": 1000}, {"vertices": 100}]
+
+TOLERANCE = "ST_Simplify(_trajectory, {tolerance}, true)"
+
+VERTICES = """(
+    SELECT ST_MakeLine(ST_PointN(_trajectory, n) ORDER BY n)
+    FROM (
+        SELECT DISTINCT round(1 + (ST_NPoints(_trajectory) - 1) * k / {last}.0)::int
+        FROM generate_series(0, {last}) AS k
+    ) AS v(n)
+)"""
+
+FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_trajectory_levels(
+        _thing bigint, _trajectory geometry
+    )
+    RETURNS void
+    LANGUAGE sql
+    AS $$
+        DELETE FROM spatiotemporal_trajectorylevel WHERE thing_id = _thing;
+        INSERT INTO spatiotemporal_trajectorylevel (thing_id, level, trajectory)
+        SELECT _thing, l.level, l.trajectory
+        FROM (VALUES {levels}) AS l(level, trajectory)
+        WHERE ST_NPoints(l.trajectory) < ST_NPoints(_trajectory);
+    $$
+"""
+
+# Without levels, the function only removes stale levels.
+EMPTY_FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_trajectory_levels(
+        _thing bigint, _trajectory geometry
+    )
+    RETURNS void
+    LANGUAGE sql
+    AS $$
+        DELETE FROM spatiotemporal_trajectorylevel WHERE thing_id = _thing;
+    $$
+"""
+
+# Marks the levels of a thing as stale, in the row being written.
+TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_spatialthing_levels()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        NEW.levels_stale := true;
+        RETURN NEW;
+    END;
+    $$
+"""
+
+TRIGGERS = {
+    "insert": """
+        BEFORE INSERT ON spatiotemporal_spatialthing
+        FOR EACH ROW WHEN (NEW.trajectory IS NOT NULL)
+    """,
+    "update": """
+        BEFORE UPDATE OF trajectory ON spatiotemporal_spatialthing
+        FOR EACH ROW WHEN (OLD.trajectory IS DISTINCT FROM NEW.trajectory)
+    """,
+}
+
+DROP_TRIGGER = """
+    DROP TRIGGER IF EXISTS spatiotemporal_spatialthing_{event}_levels
+    ON spatiotemporal_spatialthing
+"""
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER spatiotemporal_spatialthing_{event}_levels
+    {when}
+    EXECUTE FUNCTION spatiotemporal_spatialthing_levels()
+"""
+
+# Recomputes the levels of the things in the bigint array `{things}`.
+REFRESH_THINGS = """
+    UPDATE spatiotemporal_spatialthing AS t
+    SET levels_stale = false
+    FROM (
+        SELECT id, spatiotemporal_trajectory_levels(id, trajectory)
+        FROM spatiotemporal_spatialthing
+        {where}
+    ) AS r
+    WHERE t.id = r.id
+"""
+REFRESH = REFRESH_THINGS.format(where="WHERE id = ANY(%(things)s::bigint[])")
+REFRESH_ALL = REFRESH_THINGS.format(where="")
+
+# Locks a batch of things with stale levels, skipping those being written.
+STALE_THINGS = """
+    SELECT id
+    FROM spatiotemporal_spatialthing
+    WHERE levels_stale{where}
+    ORDER BY id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+"""
+STALE = STALE_THINGS.format(where="")
+STALE_OF = STALE_THINGS.format(where=" AND id = ANY(%(things)s::bigint[])")
+
+
+def levels() -> list[dict]:
+    """The configured levels, level 1 first."""
+    return getattr(settings, "SPATIOTEMPORAL_TRAJECTORY_LEVELS", DEFAULT_LEVELS)
+
+
+def expression(level: dict) -> str:
+    """The SQL simplifying `trajectory` for a level."""
+    if "tolerance" in level:
+        return TOLERANCE.format(tolerance=float(level["tolerance"]))
+    if int(level.get("vertices", 0)) >= 2:
+        return VERTICES.format(last=int(level["vertices"]) - 1)
+    raise ImproperlyConfigured(
+        "SPATIOTEMPORAL_TRAJECTORY_LEVELS must have a tolerance or at least "
+        "2 vertices per level."
+    )
+
+
+def install_triggers(connection):
+    """Install the function and triggers maintaining the levels."""
+    values = ", ".join(
+        f"({number}, {expression(level)})"
+        for number, level in enumerate(levels(), start=1)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(FUNCTION.format(levels=values) if values else EMPTY_FUNCTION)
+        cursor.execute(TRIGGER_FUNCTION)
+        for event, when in TRIGGERS.items():
+            cursor.execute(DROP_TRIGGER.format(event=event))
+            cursor.execute(CREATE_TRIGGER.format(event=event, when=when))
+
+
+def uninstall_triggers(connection):
+    """Remove the triggers and functions maintaining the levels."""
+    with connection.cursor() as cursor:
+        for event in TRIGGERS:
+            cursor.execute(DROP_TRIGGER.format(event=event))
+        cursor.execute("DROP FUNCTION IF EXISTS spatiotemporal_spatialthing_levels()")
+        cursor.execute(
+            "DROP FUNCTION IF EXISTS spatiotemporal_trajectory_levels(bigint, geometry)"
+        )
+
+
+def refresh(things: Iterable[int], using: str = DEFAULT_DB_ALIAS):
+    """Recompute the levels of spatial things, e.g. after changing levels."""
+    things = list(things)
+    if not things:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(REFRESH, {"things": things})
+
+
+def refresh_stale(
+    limit: int,
+    things: Optional[Iterable[int]] = None,
+    using: str = DEFAULT_DB_ALIAS,
+) -> list[int]:
+    """Recompute the stale levels of at most `limit` spatial things.
+
+    Only considers the given `things`, if any. Returns the refreshed things.
+    Things are locked before their levels are read, so that concurrent
+    writes wait rather than being marked fresh.
+    """
+    sql, params = STALE, {"limit": limit}
+    if things is not None:
+        sql, params = STALE_OF, {**params, "things": list(things)}
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        things = [thing for (thing,) in cursor.fetchall()]
+        if things:
+            cursor.execute(REFRESH, {"things": things})
+    return things
+
+
+def refresh_all(connection):
+    """Recompute the levels of all spatial things."""
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_ALL)
@@ -0,0 +1,396 @@
+"""Benchmark.
+
+This module contains a management command benchmarking ingestion,
+trajectory maintenance and the API against the configured database.
+It generates a synthetic universe shaped like the `tycho` fixture:
+spatial things whose cuboid extents move through space over time,
+and a coverage of measurements.
+
+All data is created in a transaction that is rolled back at the end.
+Results are written as JSON, for comparing them between commits.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-management-commands/
+"""
+
+import platform
+import random
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Optional
+from urllib.parse import quote
+
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import RequestFactory
+
+from spatiotemporal import caching, trajectories, versions
+from spatiotemporal.bulk import ExtentLoader, MeasurementLoader
+from spatiotemporal.models import (
+    Coverage,
+    Extent,
+    SpatialThing,
+    TimeUnit,
+    Universe,
+)
+from spatiotemporal.views import (
+    ExtentViewSet,
+    MeasurementViewSet,
+    SpatialThingViewSet,
+    UniverseViewSet,
+)
+
+
+class Rollback(Exception):
+    """Rolls back the benchmark data."""
+
+
+def cuboid(x: float, y: float, z: float) -> str:
+    """The WKT of a 1x4x9 cuboid at a corner, like the extents of `tycho`."""
+    x1, y1, z1 = x + 1, y + 4, z + 9
+    faces = [
+        [(x, y, z), (x, y1, z), (x1, y1, z), (x1, y, z)],
+        [(x, y, z1), (x1, y, z1), (x1, y1, z1), (x, y1, z1)],
+        [(x, y, z), (x, y, z1), (x, y1, z1), (x, y1, z)],
+        [(x1, y, z), (x1, y1, z), (x1, y1, z1), (x1, y, z1)],
+        [(x, y, z), (x1, y, z), (x1, y, z1), (x, y, z1)],
+        [(x, y1, z), (x, y1, z1), (x1, y1, z1), (x1, y1, z)],
+    ]
+    polygons = ",".join(
+        "((" + ",".join(f"{a} {b} {c}" for a, b, c in [*face, face[0]]) + "))"
+        for face in faces
+    )
+    return f"MULTIPOLYGON({polygons})"
+
+
+def summary(seconds: list[float], count: int) -> dict:
+    """Statistics of repeated timings of `count` operations each."""
+    ordered = sorted(seconds)
+    median = statistics.median(ordered)
+    return {
+        "repeat": len(ordered),
+        "count": count,
+        "min": ordered[0],
+        "median": median,
+        "p95": ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))],
+        "rate": count / median if median else None,
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark ingestion, trajectory maintenance and API latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--things", type=int, default=100)
+        parser.add_argument(
+            "--extents", type=int, default=100, help="Extents per spatial thing."
+        )
+        parser.add_argument("--measurements", type=int, default=10000)
+        parser.add_argument(
+            "--single", type=int, default=200, help="Extents saved one by one."
+        )
+        parser.add_argument(
+            "--trajectory-sizes",
+            default="10,100,1000",
+            help="Comma separated extents per spatial thing for trajectory updates.",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Results file. Defaults to stdout.")
+        parser.add_argument("--compare", help="Results file to compare with.")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.using = options["database"]
+        self.rng = random.Random(options["seed"])
+        self.factory = RequestFactory()
+        self.host = next(
+            (
+                host
+                for host in settings.ALLOWED_HOSTS
+                if "*" not in host and not host.startswith(".")
+            ),
+            "localhost",
+        )
+        self.results: dict[str, dict] = {}
+
+        try:
+            with transaction.atomic(using=self.using):
+                self.benchmark()
+                raise Rollback
+        except Rollback:
+            pass
+
+        report = {
+            "commit": self.commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": connections[self.using].vendor,
+            "trajectory_backend": trajectories.backend(),
+            "options": {
+                key: options[key]
+                for key in [
+                    "things",
+                    "extents",
+                    "measurements",
+                    "single",
+                    "trajectory_sizes",
+                    "repeat",
+                    "seed",
+                ]
+            },
+            "results": self.results,
+        }
+        content = orjson.dumps(report, option=orjson.OPT_INDENT_2).decode()
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(content + "\n")
+        else:
+            self.stdout.write(content)
+        if options["compare"]:
+            self.compare(options["compare"])
+
+    def benchmark(self):
+        timeunit, _ = TimeUnit.objects.using(self.using).get_or_create(name="seconds")
+        self.universe = Universe.objects.using(self.using).create(
+            timeunit=timeunit, name="benchmark"
+        )
+        self.coverage = Coverage.objects.using(self.using).create(
+            universe=self.universe, name="benchmark"
+        )
+        self.things = SpatialThing.objects.using(self.using).bulk_create(
+            SpatialThing(
+                universe=self.universe,
+                name=f"TMA-{index}",
+                properties={"code": f"TMA-{index}", "generation": index},
+            )
+            for index in range(self.options["things"])
+        )
+
+        self.benchmark_ingestion()
+        self.benchmark_trajectories()
+        self.benchmark_api()
+
+    def benchmark_ingestion(self):
+        extents = self.options["extents"]
+        rows = [
+            self.extent_row(thing.pk, timestamp)
+            for thing in self.things
+            for timestamp in range(extents)
+        ]
+        self.time(
+            "ingest_extents_bulk",
+            lambda: ExtentLoader(self.using).load(rows),
+            repeat=1,
+            count=len(rows),
+        )
+
+        measurements = [
+            {
+                "coverage": self.coverage.pk,
+                "timestamp": timestamp,
+                "geometry": cuboid(*self.position()),
+                "properties": {"flux": self.rng.random(), "label": "anomaly"},
+            }
+            for timestamp in range(self.options["measurements"])
+        ]
+        self.time(
+            "ingest_measurements_bulk",
+            lambda: MeasurementLoader(self.using).load(measurements),
+            repeat=1,
+            count=len(measurements),
+        )
+
+        thing = self.things[0]
+        single = self.options["single"]
+        timestamps = iter(range(extents, extents + single))
+        self.time(
+            "ingest_extents_single",
+            lambda: Extent.objects.using(self.using).create(
+                thing=thing,
+                timestamp=next(timestamps),
+                geometry=cuboid(*self.position()),
+            ),
+            repeat=single,
+        )
+
+    def benchmark_trajectories(self):
+        """Time updating a trajectory against the extents of its thing."""
+        sizes = [int(size) for size in self.options["trajectory_sizes"].split(",")]
+        for size in sizes:
+            thing = SpatialThing.objects.using(self.using).create(
+                universe=self.universe, name=f"trajectory-{size}"
+            )
+            ExtentLoader(self.using).load(
+                [self.extent_row(thing.pk, timestamp) for timestamp in range(size)]
+            )
+            timestamps = iter(range(size, size + self.options["repeat"]))
+            self.time(
+                f"trajectory_append_{size}",
+                lambda: Extent.objects.using(self.using).create(
+                    thing=thing,
+                    timestamp=next(timestamps),
+                    geometry=cuboid(*self.position()),
+                ),
+            )
+            middle = Extent.objects.using(self.using).get(
+                thing=thing, timestamp=size // 2
+            )
+
+            def move():
+                middle.geometry = cuboid(*self.position())
+                middle.save()
+
+            self.time(f"trajectory_move_{size}", move)
+            self.time(
+                f"trajectory_rebuild_{size}",
+                lambda: trajectories.rebuild([thing.pk], using=self.using),
+            )
+
+    def benchmark_api(self):
+        thing = self.things[-1]
+        extents = self.options["extents"]
+        self.time_get("list_universes", UniverseViewSet, "list", "/universes/")
+        self.time_get(
+            "list_extents",
+            ExtentViewSet,
+            "list",
+            f"/extents/?thing={thing.pk}",
+        )
+        self.time_get(
+            "list_measurements",
+            MeasurementViewSet,
+            "list",
+            f"/measurements/?coverage={self.coverage.pk}",
+        )
+
+        path = f"/spatialthings/{thing.pk}/"
+        keys = caching.version_keys(SpatialThing, thing.pk)
+        self.time_get(
+            "detail_spatialthing_cold",
+            SpatialThingViewSet,
+            "retrieve",
+            path,
+            pk=thing.pk,
+            before=lambda: versions.increment(caching.cache(), keys),
+        )
+        self.time_get(
+            "detail_spatialthing_warm",
+            SpatialThingViewSet,
+            "retrieve",
+            path,
+            pk=thing.pk,
+        )
+
+        self.time_get(
+            "query_extents_bbox",
+            ExtentViewSet,
+            "list",
+            "/extents/?bbox=0,0,0,100,100,100",
+        )
+        self.time_get(
+            "query_extents_intersects",
+            ExtentViewSet,
+            "list",
+            "/extents/?intersects=" + quote("POLYGON((0 0,0 100,100 100,100 0,0 0))"),
+        )
+        self.time_get(
+            "query_extents_timestamp",
+            ExtentViewSet,
+            "list",
+            f"/extents/?timestamp={extents // 4},{extents // 2}",
+        )
+        self.time_get(
+            "query_spatialthings_bbox",
+            SpatialThingViewSet,
+            "list",
+            f"/spatialthings/?bbox=0,0,,{extents // 4},100,100,,{extents // 2}",
+        )
+        times = ",".join(str(index + 0.5) for index in range(0, extents, 10))
+        self.time_get(
+            "query_spatialthings_at",
+            SpatialThingViewSet,
+            "at",
+            f"/spatialthings/at/?universe={self.universe.pk}&t={times}",
+        )
+        self.time_get(
+            "query_spatialthings_nearest",
+            SpatialThingViewSet,
+            "nearest",
+            f"/spatialthings/nearest/?universe={self.universe.pk}"
+            f"&point=50,50,0&t={extents // 2}&k=10&fields=id,name",
+        )
+
+    def extent_row(self, thing: int, timestamp: int) -> dict:
+        return {
+            "thing": thing,
+            "timestamp": timestamp,
+            "geometry": cuboid(*self.position()),
+        }
+
+    def position(self) -> tuple[float, float, float]:
+        return tuple(round(self.rng.uniform(0, 1000), 3) for _ in range(3))
+
+    def time(
+        self,
+        name: str,
+        function: Callable,
+        repeat: Optional[int] = None,
+        count: int = 1,
+    ):
+        """Time a function processing `count` rows, `repeat` times."""
+        seconds = []
+        for _ in range(repeat or self.options["repeat"]):
+            start = perf_counter()
+            function()
+            seconds.append(perf_counter() - start)
+        self.results[name] = summary(seconds, count)
+
+    def time_get(
+        self,
+        name: str,
+        viewset,
+        action: str,
+        path: str,
+        before: Optional[Callable] = None,
+        **kwargs,
+    ):
+        view = viewset.as_view({"get": action})
+
+        def get():
+            if before is not None:
+                before()
+            response = view(self.factory.get(path, HTTP_HOST=self.host), **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            if response.status_code != 200:
+                raise CommandError(f"GET {path} returned {response.status_code}.")
+
+        self.time(name, get)
+
+    def commit(self) -> Optional[str]:
+        try:
+            result = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return result.stdout.strip()
+
+    def compare(self, path: str):
+        """Print the median time of each result relative to a previous run."""
+        with open(path, "rb") as file:
+            previous = orjson.loads(file.read())["results"]
+        for name, result in self.results.items():
+            if name not in previous:
+                continue
+            ratio = result["median"] / previous[name]["median"]
+            style = self.style.ERROR if ratio > 1.1 else self.style.SUCCESS
+            self.stderr.write(style(f"{name:>32}: {ratio:6.2f}x"))
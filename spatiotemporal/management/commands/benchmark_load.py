@@ -0,0 +1,171 @@
+"""Benchmark load.
+
+This module contains a management command putting running servers under
+concurrent load, e.g. to compare the viewsets served by WSGI with their
+async counterparts served by ASGI:
+
+    gunicorn -w 4 pannotationsd.wsgi -b :8000
+    uvicorn pannotationsd.asgi:application --port 8001
+    ./manage.py benchmark_load \\
+        "http://localhost:8000/extents/?format=ndjson" \\
+        "http://localhost:8001/async/extents/stream"
+
+Requests are made by one event loop, each on its own connection, so the
+client is not limited by threads either. Results are written as JSON.
+
+https://docs.python.org/3/library/asyncio-stream.html
+"""
+
+import asyncio
+import ssl
+import statistics
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Optional
+from urllib.parse import urlsplit
+
+import orjson
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(ordered: list[float], fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+async def get(url: str, timeout: float) -> tuple[int, int, float, float]:
+    """Read a response, returning its status, size, first byte and total time."""
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += f"?{parts.query}"
+
+    start = perf_counter()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(
+            parts.hostname, port, ssl=ssl.create_default_context() if secure else None
+        ),
+        timeout,
+    )
+    try:
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Accept: */*\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(request.encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        first_byte = perf_counter() - start
+        size = 0
+        while chunk := await asyncio.wait_for(reader.read(65536), timeout):
+            size += len(chunk)
+    finally:
+        writer.close()
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        status = 0
+    return status, size, first_byte, perf_counter() - start
+
+
+async def load(url: str, requests: int, concurrency: int, timeout: float) -> dict:
+    """Make `requests` requests, at most `concurrency` at a time."""
+    remaining = iter(range(requests))
+    latencies, first_bytes, statuses = [], [], {}
+    errors = 0
+    size = 0
+
+    async def worker():
+        nonlocal errors, size
+        for _ in remaining:
+            try:
+                status, length, first_byte, seconds = await get(url, timeout)
+            except (OSError, asyncio.TimeoutError):
+                errors += 1
+                continue
+            statuses[status] = statuses.get(status, 0) + 1
+            if status != 200:
+                errors += 1
+                continue
+            size += length
+            latencies.append(seconds)
+            first_bytes.append(first_byte)
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = perf_counter() - start
+
+    latencies.sort()
+    first_bytes.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "seconds": seconds,
+        "throughput": len(latencies) / seconds,
+        "bytes": size,
+        "latency": {
+            "median": statistics.median(latencies) if latencies else None,
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else None,
+        },
+        "first_byte": {
+            "median": statistics.median(first_bytes) if first_bytes else None,
+            "p95": percentile(first_bytes, 0.95),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark running servers under concurrent load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="URLs benchmarked one by one.")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument(
+            "--concurrency",
+            default="10,100,500",
+            help="Comma separated numbers of concurrent requests.",
+        )
+        parser.add_argument("--timeout", type=float, default=60.0)
+        parser.add_argument("--output", help="Results file. Defaults to stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError(
+                "Expected comma separated numbers of concurrent requests."
+            )
+
+        results = {}
+        for url in options["urls"]:
+            results[url] = []
+            for concurrency in levels:
+                result = asyncio.run(
+                    load(url, options["requests"], concurrency, options["timeout"])
+                )
+                results[url].append(result)
+                self.stderr.write(
+                    f"{url} x{concurrency}: {result['throughput']:.1f} requests/s, "
+                    f"median {result['latency']['median'] or 0:.3f}s, "
+                    f"{result['errors']} errors"
+                )
+
+        report = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "results": results,
+        }
+        content = orjson.dumps(report, option=orjson.OPT_INDENT_2).decode()
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(content + "\n")
+        else:
+            self.stdout.write(content)
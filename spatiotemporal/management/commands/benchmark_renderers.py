@@ -0,0 +1,76 @@
+"""Benchmark renderers.
+
+This module contains a management command comparing the throughput
+of the JSON renderers on serialized measurements.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-management-commands/
+"""
+
+import random
+from time import perf_counter
+
+from django.contrib.gis.geos import Polygon
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from spatiotemporal.models import Measurement
+from spatiotemporal.renderers import NDJSONRenderer, ORJSONRenderer
+from spatiotemporal.serializers import MeasurementSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the throughput of the JSON renderers on measurements."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000)
+        parser.add_argument("--properties", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        data = MeasurementSerializer(self.measurements(**options), many=True).data
+        renderers = [JSONRenderer(), ORJSONRenderer(), NDJSONRenderer()]
+
+        for renderer in renderers:
+            seconds = []
+            for _ in range(options["repeat"]):
+                start = perf_counter()
+                content = renderer.render(data, renderer.media_type)
+                seconds.append(perf_counter() - start)
+            best = min(seconds)
+            self.stdout.write(
+                f"{type(renderer).__name__:>16}: "
+                f"{best * 1000:8.1f} ms, "
+                f"{options['count'] / best:10.0f} objects/s, "
+                f"{len(content) / best / 2**20:7.1f} MiB/s"
+            )
+
+    @staticmethod
+    def measurements(count: int, properties: int, seed: int, **options):
+        """Synthetic measurements of a box moving through a coverage."""
+        rng = random.Random(seed)
+        for index in range(count):
+            x, y = rng.uniform(0, 1920), rng.uniform(0, 1080)
+            geometry = Polygon(
+                (
+                    (x, y, 0),
+                    (x, y + 50, 0),
+                    (x + 80, y + 50, 0),
+                    (x + 80, y, 0),
+                    (x, y, 0),
+                )
+            )
+            yield Measurement(
+                id=index + 1,
+                coverage_id=1,
+                timestamp=index,
+                geometry=geometry,
+                properties={
+                    f"signal_{key}": {
+                        "value": rng.random(),
+                        "label": rng.choice(["car", "person", "bicycle"]),
+                        "tags": [rng.randrange(100) for _ in range(3)],
+                    }
+                    for key in range(properties)
+                },
+            )
@@ -0,0 +1,60 @@
+"""Export measurements.
+
+This module contains a management command for exporting the
+measurements of a coverage to an Apache Arrow IPC stream or
+an Apache Parquet file, for analytics outside of the API.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-management-commands/
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from spatiotemporal import arrow
+from spatiotemporal.models import Coverage, Measurement
+
+
+class Command(BaseCommand):
+    help = "Export the measurements of a coverage to Arrow or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("coverage", type=int, help="Coverage ID.")
+        parser.add_argument(
+            "path",
+            help="Output file. Parquet if it ends with .parquet, else Arrow.",
+        )
+        parser.add_argument(
+            "--properties",
+            help="Comma separated properties to export. Defaults to all.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=arrow.MeasurementExport.batch_size,
+            help="Number of measurements per record batch.",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if not arrow.available():
+            raise CommandError("Exporting measurements requires pyarrow.")
+        using = options["database"]
+        try:
+            coverage = Coverage.objects.using(using).get(pk=options["coverage"])
+        except Coverage.DoesNotExist:
+            raise CommandError(f"Coverage {options['coverage']} does not exist.")
+
+        properties = options["properties"]
+        export = arrow.MeasurementExport(
+            Measurement.objects.using(using).filter(coverage=coverage),
+            properties=properties.split(",") if properties else None,
+            schema=coverage.properties_schema,
+            batch_size=options["batch_size"],
+        )
+        path = options["path"]
+        format = "parquet" if path.endswith(".parquet") else "arrow"
+        with open(path, "wb") as file:
+            for data in export.stream(format):
+                file.write(data)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported coverage to {path}."))
@@ -0,0 +1,91 @@
+"""Maintain partitions.
+
+This module contains a management command for maintaining the time
+partitions of the extent and measurement tables: converting the tables,
+creating partitions ahead of the data and detaching or dropping old ones.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-management-commands/
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from spatiotemporal import partitions
+
+
+class Command(BaseCommand):
+    help = "Create, detach or drop time partitions of extents and measurements."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table",
+            action="append",
+            choices=["extent", "measurement"],
+            default=[],
+            help="Only maintain this table. Defaults to both tables.",
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Convert unpartitioned tables into partitioned tables first.",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=0,
+            help="Number of partitions to create after the latest timestamp.",
+        )
+        parser.add_argument(
+            "--until",
+            type=int,
+            help="Create the partitions up to this timestamp.",
+        )
+        parser.add_argument(
+            "--before",
+            type=int,
+            help="Detach the partitions ending at or before this timestamp.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the detached partitions instead of keeping their tables.",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        interval, modulus = partitions.config()
+        if not interval:
+            raise CommandError("SPATIOTEMPORAL_PARTITIONING has no interval.")
+
+        using = options["database"]
+        connection = connections[using]
+        tables = [f"spatiotemporal_{table}" for table in options["table"]] or list(
+            partitions.TABLES
+        )
+        for table in tables:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                if options["convert"]:
+                    partitions.partition_table(connection, table, interval, modulus)
+                if not partitions.is_partitioned(cursor, table):
+                    raise CommandError(f"{table} is not partitioned, use --convert.")
+
+                latest = partitions.latest_timestamp(cursor, table)
+                end = options["until"]
+                if options["ahead"] and latest is not None:
+                    ahead = latest + options["ahead"] * interval
+                    end = ahead if end is None else max(end, ahead)
+                if end is not None:
+                    start = latest if latest is not None else end
+                    partitions.create_partitions(
+                        cursor, table, min(start, end), end, interval, modulus
+                    )
+
+                if options["before"] is not None:
+                    removed = partitions.remove_partitions(
+                        cursor, table, options["before"], options["drop"], using
+                    )
+                    verb = "Dropped" if options["drop"] else "Detached"
+                    for name in removed:
+                        self.stdout.write(f"{verb} {name}")
+
+        self.stdout.write(self.style.SUCCESS(f"Maintained {len(tables)} tables."))
@@ -0,0 +1,103 @@
+"""Find spatial things near each other.
+
+This module contains a management command for finding the pairs of
+spatial things of a universe whose extents are at most a distance apart
+at the same timestamp, see `proximity`. Pairs are written as NDJSON to a
+file or standard output. With `--jobs`, the command instead runs the
+queued proximity jobs of the API, e.g. from a scheduler or a worker loop.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-management-commands/
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from spatiotemporal import proximity
+from spatiotemporal.models import ProximityJob, Universe
+
+
+class Command(BaseCommand):
+    help = "Find the spatial things near each other at the same timestamp."
+
+    def add_arguments(self, parser):
+        parser.add_argument("universe", nargs="?", type=int, help="Universe ID.")
+        parser.add_argument(
+            "--distance",
+            type=float,
+            help="Maximum distance between the extents of a pair.",
+        )
+        parser.add_argument("--start", type=int, help="First timestamp searched.")
+        parser.add_argument("--end", type=int, help="Last timestamp searched.")
+        parser.add_argument(
+            "--bucket-size",
+            type=int,
+            help="Number of consecutive timestamps searched per query.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes searching buckets in parallel.",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Output NDJSON file. Defaults to standard output.",
+        )
+        parser.add_argument(
+            "--jobs",
+            action="store_true",
+            help="Run the pending proximity jobs instead, until none is left.",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+        if options["jobs"]:
+            return self.run_jobs(options)
+
+        using = options["database"]
+        if options["universe"] is None or options["distance"] is None:
+            raise CommandError("A universe and --distance are required.")
+        if options["distance"] < 0:
+            raise CommandError("--distance must be at least 0.")
+        if not Universe.objects.using(using).filter(pk=options["universe"]).exists():
+            raise CommandError(f"Universe {options['universe']} does not exist.")
+        try:
+            buckets = proximity.buckets(
+                options["universe"],
+                options["start"],
+                options["end"],
+                options["bucket_size"],
+                using=using,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        arguments = (options["universe"], options["distance"], buckets)
+        if options["output"] == "-":
+            count = proximity.search(
+                *arguments, sys.stdout.buffer, options["workers"], using
+            )
+            sys.stdout.buffer.flush()
+        else:
+            with open(options["output"], "wb") as file:
+                count = proximity.search(*arguments, file, options["workers"], using)
+
+        message = f"Found {count} pairs in {len(buckets)} buckets."
+        self.stderr.write(self.style.SUCCESS(message))
+
+    def run_jobs(self, options):
+        using = options["database"]
+        count = 0
+        while (job := proximity.claim(using=using)) is not None:
+            proximity.run(job, options["workers"], using=using)
+            if job.status == ProximityJob.Status.FAILED:
+                self.stderr.write(self.style.ERROR(f"Job {job.pk} failed: {job.error}"))
+            elif options["verbosity"] > 1:
+                self.stdout.write(f"Job {job.pk} found {job.pairs} pairs.")
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Ran {count} proximity jobs."))
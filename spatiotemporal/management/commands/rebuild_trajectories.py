@@ -0,0 +1,64 @@
+"""Rebuild trajectories.
+
+This module contains a management command for rebuilding
+`SpatialThing.trajectory` from all extents of the spatial things,
+for example after loading extents without signals. The simplified
+trajectory levels and the trajectory segments are recomputed as well.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-management-commands/
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from spatiotemporal import levels, trajectories
+from spatiotemporal.models import SpatialThing
+
+
+class Command(BaseCommand):
+    help = "Rebuild the trajectories of spatial things from their extents."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "things",
+            nargs="*",
+            type=int,
+            help="Spatial thing IDs. Defaults to all spatial things.",
+        )
+        parser.add_argument(
+            "--universe",
+            action="append",
+            type=int,
+            default=[],
+            help="Only rebuild spatial things of this universe.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of spatial things rebuilt per transaction.",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        things = SpatialThing.objects.using(using).order_by("pk")
+        if options["things"]:
+            things = things.filter(pk__in=options["things"])
+        if options["universe"]:
+            things = things.filter(universe__in=options["universe"])
+
+        ids = list(things.values_list("pk", flat=True))
+        size = options["batch_size"]
+        for start in range(0, len(ids), size):
+            with transaction.atomic(using=using):
+                batch = ids[start : start + size]
+                trajectories.rebuild(batch, using=using)
+                levels.refresh(batch, using=using)
+                trajectories.trajectories_changed.send(
+                    sender=None, things=set(batch), using=using
+                )
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Rebuilt {min(start + size, len(ids))}/{len(ids)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(ids)} trajectories."))
@@ -0,0 +1,41 @@
+"""Refresh trajectory levels.
+
+This module contains a management command for refreshing the stale
+simplified trajectory levels of spatial things, e.g. left behind by
+single writes of extents whose refresh after committing failed, see
+`levels`. Run it periodically, e.g. from a scheduler.
+
+https://docs.djangoproject.com/en/4.0/howto/custom-management-commands/
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from spatiotemporal import caching, levels
+from spatiotemporal.models import SpatialThing
+
+
+class Command(BaseCommand):
+    help = "Refresh the stale trajectory levels of spatial things."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of spatial things refreshed per transaction.",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        count = 0
+        while things := levels.refresh_stale(options["batch_size"], using=using):
+            caching.invalidate(SpatialThing, things, using=using)
+            count += len(things)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Refreshed {count}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Refreshed the levels of {count} spatial things.")
+        )
@@ -206,7 +206,7 @@ class Migration(migrations.Migration):
         ),
         migrations.AddIndex(
             model_name="spatialthing",
-            index=django.contrib.postgres.indexes.GinIndex(
+            index=django.contrib.postgres.indexes.GistIndex(
                 fields=["trajectory"],
                 name="spatiotemporal_trajectory_idx",
                 opclasses=["GIST_GEOMETRY_OPS_ND"],
@@ -0,0 +1,79 @@
+from django.db import migrations
+
+# Rebuilds the trajectories of the things changed by a statement. The
+# triggers calling it are installed, or removed, according to the configured
+# backend after every `migrate`, see `signals.sync_trajectory_triggers`.
+TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_extent_trajectory()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        things bigint[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            things := ARRAY(SELECT DISTINCT thing_id FROM new_extents);
+        ELSIF TG_OP = 'DELETE' THEN
+            things := ARRAY(SELECT DISTINCT thing_id FROM old_extents);
+        ELSE
+            things := ARRAY(
+                SELECT DISTINCT unnest(ARRAY[o.thing_id, n.thing_id])
+                FROM old_extents AS o
+                JOIN new_extents AS n USING (id)
+                WHERE (o.thing_id, o.timestamp, o.geometry)
+                    IS DISTINCT FROM (n.thing_id, n.timestamp, n.geometry)
+            );
+        END IF;
+        IF cardinality(things) > 0 THEN
+            UPDATE spatiotemporal_spatialthing AS t
+            SET trajectory = r.trajectory
+            FROM (
+                SELECT
+                    thing.id,
+                    ST_MakeLine(
+                        ST_MakePoint(
+                            (ST_XMin(b.bbox) + ST_XMax(b.bbox)) / 2,
+                            (ST_YMin(b.bbox) + ST_YMax(b.bbox)) / 2,
+                            (ST_ZMin(b.bbox) + ST_ZMax(b.bbox)) / 2,
+                            e.timestamp
+                        )
+                        ORDER BY e.timestamp
+                    ) FILTER (WHERE e.id IS NOT NULL) AS trajectory
+                FROM unnest(things) AS thing(id)
+                LEFT JOIN (
+                    spatiotemporal_extent AS e
+                    CROSS JOIN LATERAL (SELECT Box3D(e.geometry) AS bbox) AS b
+                ) ON e.thing_id = thing.id
+                GROUP BY thing.id
+            ) AS r
+            WHERE t.id = r.id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$
+"""
+
+DROP_TRIGGERS = [
+    f"""
+    DROP TRIGGER IF EXISTS spatiotemporal_extent_{event}_trajectory
+    ON spatiotemporal_extent
+    """
+    for event in ["insert", "update", "delete"]
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            TRIGGER_FUNCTION,
+            [
+                *DROP_TRIGGERS,
+                "DROP FUNCTION IF EXISTS spatiotemporal_extent_trajectory()",
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0002_trajectory_triggers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coverage",
+            name="properties_schema",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="universe",
+            name="properties_schema",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
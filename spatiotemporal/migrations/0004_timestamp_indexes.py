@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0003_properties_schema"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="measurement",
+            name="timestamp",
+            field=models.IntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name="extent",
+            index=models.Index(
+                fields=["timestamp", "id"], name="extent_timestamp_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="measurement",
+            index=models.Index(
+                fields=["timestamp", "id"], name="measurement_timestamp_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,117 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+import spatiotemporal.db.fields
+
+# The levels of the default `SPATIOTEMPORAL_TRAJECTORY_LEVELS`, evenly spaced
+# selections of at most 1000 and 100 vertices. The configured levels are
+# installed after every `migrate`, see `signals.sync_trajectory_triggers`.
+VERTICES = """(
+    SELECT ST_MakeLine(ST_PointN(_trajectory, n) ORDER BY n)
+    FROM (
+        SELECT DISTINCT round(1 + (ST_NPoints(_trajectory) - 1) * k / {last}.0)::int
+        FROM generate_series(0, {last}) AS k
+    ) AS v(n)
+)"""
+
+FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION spatiotemporal_trajectory_levels(
+        _thing bigint, _trajectory geometry
+    )
+    RETURNS void
+    LANGUAGE sql
+    AS $$
+        DELETE FROM spatiotemporal_trajectorylevel WHERE thing_id = _thing;
+        INSERT INTO spatiotemporal_trajectorylevel (thing_id, level, trajectory)
+        SELECT _thing, l.level, l.trajectory
+        FROM (
+            VALUES (1, {VERTICES.format(last=999)}), (2, {VERTICES.format(last=99)})
+        ) AS l(level, trajectory)
+        WHERE ST_NPoints(l.trajectory) < ST_NPoints(_trajectory);
+    $$
+"""
+
+TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_spatialthing_levels()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        PERFORM spatiotemporal_trajectory_levels(NEW.id, NEW.trajectory);
+        RETURN NULL;
+    END;
+    $$
+"""
+
+TRIGGERS = """
+    CREATE TRIGGER spatiotemporal_spatialthing_insert_levels
+    AFTER INSERT ON spatiotemporal_spatialthing FOR EACH ROW
+    EXECUTE FUNCTION spatiotemporal_spatialthing_levels();
+
+    CREATE TRIGGER spatiotemporal_spatialthing_update_levels
+    AFTER UPDATE OF trajectory ON spatiotemporal_spatialthing
+    FOR EACH ROW WHEN (OLD.trajectory IS DISTINCT FROM NEW.trajectory)
+    EXECUTE FUNCTION spatiotemporal_spatialthing_levels();
+"""
+
+REFRESH_ALL = """
+    SELECT spatiotemporal_trajectory_levels(id, trajectory)
+    FROM spatiotemporal_spatialthing
+"""
+
+UNINSTALL = """
+    DROP TRIGGER IF EXISTS spatiotemporal_spatialthing_insert_levels
+    ON spatiotemporal_spatialthing;
+    DROP TRIGGER IF EXISTS spatiotemporal_spatialthing_update_levels
+    ON spatiotemporal_spatialthing;
+    DROP FUNCTION IF EXISTS spatiotemporal_spatialthing_levels();
+    DROP FUNCTION IF EXISTS spatiotemporal_trajectory_levels(bigint, geometry);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0004_timestamp_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrajectoryLevel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("level", models.PositiveSmallIntegerField()),
+                (
+                    "trajectory",
+                    spatiotemporal.db.fields.TrajectoryField(
+                        dim=4, editable=False, spatial_index=False, srid=0
+                    ),
+                ),
+                (
+                    "thing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="levels",
+                        to="spatiotemporal.spatialthing",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="trajectorylevel",
+            constraint=models.UniqueConstraint(
+                fields=("thing", "level"), name="unique_trajectory_level"
+            ),
+        ),
+        migrations.RunSQL(
+            [FUNCTION, TRIGGER_FUNCTION, TRIGGERS, REFRESH_ALL], UNINSTALL
+        ),
+    ]
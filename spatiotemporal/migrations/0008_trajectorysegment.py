@@ -0,0 +1,129 @@
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+import spatiotemporal.db.fields
+
+# Segments of the default `SPATIOTEMPORAL_TRAJECTORY_SEGMENT_VERTICES`, 64
+# vertices spanning 63 steps. The configured size is installed after every
+# `migrate`, see `signals.sync_trajectory_triggers`.
+FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_trajectory_segments(
+        _thing bigint, _trajectory geometry
+    )
+    RETURNS void
+    LANGUAGE sql
+    AS $$
+        DELETE FROM spatiotemporal_trajectorysegment
+        WHERE thing_id = _thing
+        AND sequence > coalesce((ST_NPoints(_trajectory) - 2) / 63, -1);
+        INSERT INTO spatiotemporal_trajectorysegment (thing_id, sequence, trajectory)
+        SELECT _thing, s.sequence, ST_MakeLine(ST_PointN(_trajectory, s.n) ORDER BY s.n)
+        FROM (
+            SELECT k, n
+            FROM generate_series(0, (ST_NPoints(_trajectory) - 2) / 63) AS k
+            CROSS JOIN LATERAL generate_series(
+                k * 63 + 1,
+                least((k + 1) * 63 + 1, ST_NPoints(_trajectory))
+            ) AS n
+        ) AS s(sequence, n)
+        GROUP BY s.sequence
+        ON CONFLICT (thing_id, sequence) DO UPDATE
+        SET trajectory = EXCLUDED.trajectory
+        WHERE spatiotemporal_trajectorysegment.trajectory
+            IS DISTINCT FROM EXCLUDED.trajectory;
+    $$
+"""
+
+TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_spatialthing_segments()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        PERFORM spatiotemporal_trajectory_segments(NEW.id, NEW.trajectory);
+        RETURN NULL;
+    END;
+    $$
+"""
+
+TRIGGERS = """
+    CREATE TRIGGER spatiotemporal_spatialthing_insert_segments
+    AFTER INSERT ON spatiotemporal_spatialthing FOR EACH ROW
+    EXECUTE FUNCTION spatiotemporal_spatialthing_segments();
+
+    CREATE TRIGGER spatiotemporal_spatialthing_update_segments
+    AFTER UPDATE OF trajectory ON spatiotemporal_spatialthing
+    FOR EACH ROW WHEN (OLD.trajectory IS DISTINCT FROM NEW.trajectory)
+    EXECUTE FUNCTION spatiotemporal_spatialthing_segments();
+"""
+
+REFRESH_ALL = """
+    SELECT spatiotemporal_trajectory_segments(id, trajectory)
+    FROM spatiotemporal_spatialthing
+"""
+
+UNINSTALL = """
+    DROP TRIGGER IF EXISTS spatiotemporal_spatialthing_insert_segments
+    ON spatiotemporal_spatialthing;
+    DROP TRIGGER IF EXISTS spatiotemporal_spatialthing_update_segments
+    ON spatiotemporal_spatialthing;
+    DROP FUNCTION IF EXISTS spatiotemporal_spatialthing_segments();
+    DROP FUNCTION IF EXISTS spatiotemporal_trajectory_segments(bigint, geometry);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0007_trajectorylevel"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrajectorySegment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sequence", models.PositiveIntegerField()),
+                (
+                    "trajectory",
+                    spatiotemporal.db.fields.TrajectoryField(
+                        dim=4, editable=False, spatial_index=False, srid=0
+                    ),
+                ),
+                (
+                    "thing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="segments",
+                        to="spatiotemporal.spatialthing",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="trajectorysegment",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["trajectory"],
+                name="spatiotemporal_segment_idx",
+                opclasses=["GIST_GEOMETRY_OPS_ND"],
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="trajectorysegment",
+            constraint=models.UniqueConstraint(
+                fields=("thing", "sequence"), name="unique_trajectory_segment"
+            ),
+        ),
+        migrations.RunSQL(
+            [FUNCTION, TRIGGER_FUNCTION, TRIGGERS, REFRESH_ALL], UNINSTALL
+        ),
+    ]
@@ -0,0 +1,149 @@
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+import spatiotemporal.db.functions
+
+# The trajectory triggers, which now read the stored boxes, are reinstalled
+# after migrating by `signals.sync_trajectory_triggers`.
+
+STORE_BOX = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_store_box()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        box box3d;
+    BEGIN
+        IF NEW.geometry IS NOT NULL THEN
+            box := Box3D(NEW.geometry);
+            NEW.box_xmin := ST_XMin(box);
+            NEW.box_ymin := ST_YMin(box);
+            NEW.box_zmin := ST_ZMin(box);
+            NEW.box_xmax := ST_XMax(box);
+            NEW.box_ymax := ST_YMax(box);
+            NEW.box_zmax := ST_ZMax(box);
+        END IF;
+        RETURN NEW;
+    END;
+    $$
+"""
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER {table}_box
+    BEFORE INSERT OR UPDATE ON {table}
+    FOR EACH ROW
+    EXECUTE FUNCTION spatiotemporal_store_box()
+"""
+
+FILL = """
+    UPDATE {table}
+    SET box_xmin = ST_XMin(b.box),
+        box_ymin = ST_YMin(b.box),
+        box_zmin = ST_ZMin(b.box),
+        box_xmax = ST_XMax(b.box),
+        box_ymax = ST_YMax(b.box),
+        box_zmax = ST_ZMax(b.box)
+    FROM (SELECT id, Box3D(geometry) AS box FROM {table}) AS b
+    WHERE {table}.id = b.id AND {table}.box_xmin IS NULL
+"""
+
+TABLES = ["spatiotemporal_extent", "spatiotemporal_measurement"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0008_trajectorysegment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="extent",
+            name="box_xmin",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="extent",
+            name="box_ymin",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="extent",
+            name="box_zmin",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="extent",
+            name="box_xmax",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="extent",
+            name="box_ymax",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="extent",
+            name="box_zmax",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="measurement",
+            name="box_xmin",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="measurement",
+            name="box_ymin",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="measurement",
+            name="box_zmin",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="measurement",
+            name="box_xmax",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="measurement",
+            name="box_ymax",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="measurement",
+            name="box_zmax",
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            [
+                STORE_BOX,
+                *[FILL.format(table=table) for table in TABLES],
+                *[CREATE_TRIGGER.format(table=table) for table in TABLES],
+            ],
+            [
+                *[f"DROP TRIGGER IF EXISTS {table}_box ON {table}" for table in TABLES],
+                "DROP FUNCTION IF EXISTS spatiotemporal_store_box()",
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="extent",
+            index=django.contrib.postgres.indexes.GistIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    spatiotemporal.db.functions.StoredBox(), name="gist_geometry_ops_nd"
+                ),
+                name="extent_box_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="measurement",
+            index=django.contrib.postgres.indexes.GistIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    spatiotemporal.db.functions.StoredBox(), name="gist_geometry_ops_nd"
+                ),
+                name="measurement_box_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+# The trajectory triggers, which now compare the boxes of extents rather
+# than their geometry, are reinstalled after migrating by
+# `signals.sync_trajectory_triggers`.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0009_boxes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="extent",
+            name="geometry",
+            field=django.contrib.gis.db.models.fields.GeometryField(
+                blank=True, dim=3, null=True, srid=0
+            ),
+        ),
+        migrations.AlterField(
+            model_name="measurement",
+            name="geometry",
+            field=django.contrib.gis.db.models.fields.GeometryField(
+                blank=True, dim=3, null=True, srid=0
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="extent",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    ("geometry__isnull", False),
+                    models.Q(
+                        ("box_xmax__isnull", False),
+                        ("box_xmin__isnull", False),
+                        ("box_ymax__isnull", False),
+                        ("box_ymin__isnull", False),
+                        ("box_zmax__isnull", False),
+                        ("box_zmin__isnull", False),
+                    ),
+                    _connector="OR",
+                ),
+                name="extent_geometry_or_box",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="measurement",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    ("geometry__isnull", False),
+                    models.Q(
+                        ("box_xmax__isnull", False),
+                        ("box_xmin__isnull", False),
+                        ("box_ymax__isnull", False),
+                        ("box_ymin__isnull", False),
+                        ("box_zmax__isnull", False),
+                        ("box_zmin__isnull", False),
+                    ),
+                    _connector="OR",
+                ),
+                name="measurement_geometry_or_box",
+            ),
+        ),
+    ]
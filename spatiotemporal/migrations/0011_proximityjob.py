@@ -0,0 +1,67 @@
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+import spatiotemporal.db.functions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0010_geometry_or_box"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProximityJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("distance", models.FloatField()),
+                ("start", models.IntegerField(blank=True, null=True)),
+                ("end", models.IntegerField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        editable=False,
+                        max_length=16,
+                    ),
+                ),
+                ("pairs", models.BigIntegerField(editable=False, null=True)),
+                ("error", models.TextField(blank=True, editable=False)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("finished", models.DateTimeField(editable=False, null=True)),
+                (
+                    "universe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="spatiotemporal.universe",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="extent",
+            index=django.contrib.postgres.indexes.GistIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    spatiotemporal.db.functions.StoredSpaceTimeBox(),
+                    name="gist_geometry_ops_nd",
+                ),
+                name="extent_spacetime_idx",
+            ),
+        ),
+    ]
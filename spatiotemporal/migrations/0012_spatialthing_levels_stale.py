@@ -0,0 +1,98 @@
+from django.db import migrations, models
+
+# Levels are marked stale by a row trigger and refreshed in batches, rather
+# than recomputed by the trigger on every change of a trajectory.
+MARK_STALE = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_spatialthing_levels()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        NEW.levels_stale := true;
+        RETURN NEW;
+    END;
+    $$
+"""
+
+REFRESH_LEVELS = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_spatialthing_levels()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        PERFORM spatiotemporal_trajectory_levels(NEW.id, NEW.trajectory);
+        RETURN NULL;
+    END;
+    $$
+"""
+
+DROP_TRIGGERS = [
+    f"""
+    DROP TRIGGER IF EXISTS spatiotemporal_spatialthing_{event}_levels
+    ON spatiotemporal_spatialthing
+    """
+    for event in ["insert", "update"]
+]
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER spatiotemporal_spatialthing_{event}_levels
+    {timing} {operation} ON spatiotemporal_spatialthing
+    FOR EACH ROW {when}
+    EXECUTE FUNCTION spatiotemporal_spatialthing_levels()
+"""
+
+CHANGED = "WHEN (OLD.trajectory IS DISTINCT FROM NEW.trajectory)"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spatiotemporal", "0011_proximityjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="spatialthing",
+            name="levels_stale",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="spatialthing",
+            index=models.Index(
+                condition=models.Q(("levels_stale", True)),
+                fields=["id"],
+                name="spatialthing_levels_stale_idx",
+            ),
+        ),
+        migrations.RunSQL(
+            [
+                *DROP_TRIGGERS,
+                MARK_STALE,
+                CREATE_TRIGGER.format(
+                    event="insert",
+                    timing="BEFORE",
+                    operation="INSERT",
+                    when="WHEN (NEW.trajectory IS NOT NULL)",
+                ),
+                CREATE_TRIGGER.format(
+                    event="update",
+                    timing="BEFORE",
+                    operation="UPDATE OF trajectory",
+                    when=CHANGED,
+                ),
+            ],
+            [
+                *DROP_TRIGGERS,
+                REFRESH_LEVELS,
+                CREATE_TRIGGER.format(
+                    event="insert", timing="AFTER", operation="INSERT", when=""
+                ),
+                CREATE_TRIGGER.format(
+                    event="update",
+                    timing="AFTER",
+                    operation="UPDATE OF trajectory",
+                    when=CHANGED,
+                ),
+            ],
+        ),
+    ]
@@ -8,13 +8,71 @@ https://www.w3.org/TR/sdw-bp
 """
 
 
+from math import inf
+from typing import Iterable, Optional, Sequence
+
 from django.contrib.gis.db.models import GeometryField
 from django.contrib.postgres.fields import ArrayField
-from django.contrib.postgres.indexes import GinIndex
-from django.db import models
-from django.db.models import UniqueConstraint
+from django.contrib.postgres.indexes import GinIndex, GistIndex, OpClass
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, transaction
+from django.db.models import CheckConstraint, Q, UniqueConstraint, Value
 
+from spatiotemporal import tiles, trajectories
 from spatiotemporal.db.fields import TrajectoryField
+from spatiotemporal.db.functions import (
+    Force3D,
+    GeometryN,
+    LocateAlong,
+    MakePoint,
+    NDBox,
+    NDDistance,
+    StoredBox,
+    StoredSpaceTimeBox,
+)
+
+# The (x, y, z, t) corner of a spatiotemporal box. `None` leaves it open.
+Corner = Sequence[Optional[float]]
+
+# The columns storing the 3D bounding box of a geometry, see `boxes`.
+BOX_FIELDS = ["box_xmin", "box_ymin", "box_zmin", "box_xmax", "box_ymax", "box_zmax"]
+
+# Extents and measurements have a geometry, or a box instead of one.
+HAS_GEOMETRY_OR_BOX = Q(geometry__isnull=False) | Q(
+    **{f"{name}__isnull": False for name in BOX_FIELDS}
+)
+
+
+def planar_extent(
+    geometry, box: Sequence[Optional[float]]
+) -> Optional[tuple[float, float, float, float]]:
+    """The 2D extent of a geometry, or of the box given instead of one."""
+    if geometry:
+        return geometry.extent
+    if box and None not in box:
+        xmin, ymin, _, xmax, ymax, _ = box
+        return xmin, ymin, xmax, ymax
+    return None
+
+
+def invalidate_tiles(objs: list[models.Model], parent: str, using: str):
+    """Invalidate the tiles of created extents or measurements by universe."""
+    if not objs:
+        return
+    field = objs[0]._meta.get_field(parent)
+    universes = dict(
+        field.related_model.objects.using(using)
+        .filter(pk__in={getattr(obj, field.attname) for obj in objs})
+        .values_list("id", "universe_id")
+    )
+    extents = {}
+    for obj in objs:
+        universe = universes.get(getattr(obj, field.attname))
+        extents.setdefault(universe, []).append(
+            planar_extent(obj.geometry, [getattr(obj, name) for name in BOX_FIELDS])
+        )
+    for universe, extent_list in extents.items():
+        tiles.invalidate(extent_list, universe, using=using)
 
 
 class TimeUnit(models.Model):
@@ -51,11 +109,105 @@ class Universe(models.Model):
     description = models.TextField(blank=True)
     links = ArrayField(models.URLField(), default=list)
     properties = models.JSONField(default=dict)
+    # A JSON Schema for the `properties` of spatial things in this universe.
+    properties_schema = models.JSONField(null=True, blank=True)
 
     class Meta:
         indexes = [GinIndex(fields=["properties"])]
 
 
+# Interpolated within the segments spanning each time. A time at the shared
+# vertex of two segments is located in either, at the same position.
+POSITIONS = """
+    SELECT DISTINCT ON (t.timestamp, s.thing_id)
+        s.thing_id, t.timestamp, ST_X(l.position), ST_Y(l.position), ST_Z(l.position)
+    FROM unnest(%s::float8[]) AS t(timestamp)
+    JOIN spatiotemporal_trajectorysegment AS s ON s.trajectory &&& ST_MakeLine(
+        ST_MakePoint('-infinity', '-infinity', '-infinity', t.timestamp),
+        ST_MakePoint('infinity', 'infinity', 'infinity', t.timestamp)
+    )
+    CROSS JOIN LATERAL (
+        SELECT ST_GeometryN(ST_LocateAlong(s.trajectory, t.timestamp), 1) AS position
+    ) AS l
+    WHERE s.thing_id IN ({things}) AND l.position IS NOT NULL
+    ORDER BY t.timestamp, s.thing_id
+"""
+
+
+class SpatialThingQuerySet(models.QuerySet):
+    def intersecting_box(self, lower: Corner, upper: Corner):
+        """Filter spatial things whose trajectory intersects the box.
+
+        Compares the n-D bounding boxes of trajectory segments, so that the
+        segment index is used, and long-lived things only match the box
+        where their path actually passes it.
+        """
+        lower = [-inf if bound is None else bound for bound in lower]
+        upper = [inf if bound is None else bound for bound in upper]
+        segments = TrajectorySegment.objects.filter(
+            trajectory__ndbboverlaps=NDBox(lower, upper)
+        )
+        return self.filter(pk__in=segments.values("thing"))
+
+    def at(self, timestamp: float):
+        """Filter spatial things that exist at the time, with their `position`.
+
+        The position is interpolated between the extents before and after.
+        """
+        position = LocateAlong("trajectory", Value(float(timestamp)))
+        return self.intersecting_box(
+            [None, None, None, timestamp], [None, None, None, timestamp]
+        ).annotate(position=Force3D(GeometryN(position, Value(1))))
+
+    def nearest(
+        self,
+        point: Sequence[float],
+        timestamp: float,
+        window: Optional[Sequence[Optional[float]]] = None,
+    ):
+        """Order spatial things by their distance to a point at a time.
+
+        The distance is the n-D distance of the trajectory to the point
+        `(x, y, z, timestamp)`, in which time counts like the other axes, and
+        is annotated as `distance`. Ordering by it walks the trajectory index
+        nearest first, so that slicing the top k reads only about k things.
+        A `(start, end)` window keeps only things that exist during it.
+        """
+        x, y, z = (float(coordinate) for coordinate in point)
+        queryset = self
+        if window is not None:
+            start, end = window
+            queryset = queryset.intersecting_box(
+                [None, None, None, start], [None, None, None, end]
+            )
+        target = MakePoint(Value(x), Value(y), Value(z), Value(float(timestamp)))
+        return (
+            queryset.filter(trajectory__isnull=False)
+            .annotate(distance=NDDistance("trajectory", target))
+            .order_by("distance")
+        )
+
+    def positions(self, timestamps: Iterable[float]) -> list[dict]:
+        """The positions of the spatial things at each of the times.
+
+        Computed in one query, with rows ordered by time and spatial thing.
+        Spatial things that do not exist at a time have no row for it.
+        """
+        try:
+            things, params = self.values("pk").query.get_compiler(self.db).as_sql()
+        except EmptyResultSet:
+            return []
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                POSITIONS.format(things=things),
+                [[float(timestamp) for timestamp in timestamps], *params],
+            )
+            return [
+                {"thing": thing, "timestamp": timestamp, "position": [x, y, z]}
+                for thing, timestamp, x, y, z in cursor.fetchall()
+            ]
+
+
 class SpatialThing(models.Model):
     """Abstraction of real world phenomena.
 
@@ -83,16 +235,117 @@ class SpatialThing(models.Model):
     description = models.TextField(blank=True)
     links = ArrayField(models.URLField(), default=list)
     properties = models.JSONField(default=dict)
+    # Set by the database when the trajectory changes, see `levels`.
+    levels_stale = models.BooleanField(default=False, editable=False)
+
+    objects = SpatialThingQuerySet.as_manager()
 
     class Meta:
         indexes = [
-            GinIndex(
+            GistIndex(
                 fields=["trajectory"],
                 name="spatiotemporal_trajectory_idx",
                 opclasses=["GIST_GEOMETRY_OPS_ND"],
             ),
             GinIndex(fields=["properties"]),
+            models.Index(
+                fields=["id"],
+                condition=Q(levels_stale=True),
+                name="spatialthing_levels_stale_idx",
+            ),
+        ]
+
+
+class TrajectoryLevel(models.Model):
+    """A simplified trajectory of a spatial thing.
+
+    Level 1 is the most detailed level. Levels are refreshed in batches
+    after the trajectory changes, see `levels`.
+    """
+
+    thing = models.ForeignKey(
+        "SpatialThing", on_delete=models.CASCADE, related_name="levels"
+    )
+    level = models.PositiveSmallIntegerField()
+    trajectory = TrajectoryField(
+        editable=False,
+        dim=4,
+        srid=0,
+        spatial_index=False,
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                name="unique_trajectory_level",
+                fields=["thing", "level"],
+            )
+        ]
+
+
+class TrajectorySegment(models.Model):
+    """A piece of the trajectory of a spatial thing.
+
+    Consecutive segments share their boundary vertex. Their `sequence` is
+    unique per spatial thing, but not in the order of time. Segments are
+    maintained along with the trajectory, see `segments`.
+    """
+
+    thing = models.ForeignKey(
+        "SpatialThing", on_delete=models.CASCADE, related_name="segments"
+    )
+    sequence = models.PositiveIntegerField()
+    trajectory = TrajectoryField(
+        editable=False,
+        dim=4,
+        srid=0,
+        spatial_index=False,
+    )
+
+    class Meta:
+        indexes = [
+            GistIndex(
+                fields=["trajectory"],
+                name="spatiotemporal_segment_idx",
+                opclasses=["GIST_GEOMETRY_OPS_ND"],
+            ),
         ]
+        constraints = [
+            UniqueConstraint(
+                name="unique_trajectory_segment",
+                fields=["thing", "sequence"],
+            )
+        ]
+
+
+class ExtentQuerySet(models.QuerySet):
+    """Keeps trajectories and tiles current for writes that bypass signals."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        trajectories.changed({obj.thing_id for obj in objs}, using=self.db)
+        invalidate_tiles(objs, "thing", self.db)
+        return objs
+
+    def update(self, **kwargs):
+        if (
+            not {"thing", "thing_id", "timestamp", "geometry", *BOX_FIELDS}
+            & kwargs.keys()
+        ):
+            rows = super().update(**kwargs)
+            tiles.invalidate_all(using=self.db)
+            return rows
+        with transaction.atomic(using=self.db):
+            things = set(self.values_list("thing_id", flat=True))
+            thing = kwargs.get("thing", kwargs.get("thing_id"))
+            if isinstance(thing, models.Model):
+                things.add(thing.pk)
+            elif isinstance(thing, int):
+                things.add(thing)
+            rows = super().update(**kwargs)
+            trajectories.changed(things, using=self.db)
+            tiles.invalidate_all(using=self.db)
+        return rows
 
 
 class Extent(models.Model):
@@ -106,17 +359,53 @@ class Extent(models.Model):
 
     thing = models.ForeignKey("SpatialThing", on_delete=models.CASCADE)
     timestamp = models.IntegerField()
-    geometry = GeometryField(dim=3, srid=0)
+    geometry = GeometryField(dim=3, srid=0, null=True, blank=True)
     metadata = models.JSONField(default=dict)
+    # The bounding box of the geometry, stored by the database, see `boxes`.
+    # Axis-aligned boxes, e.g. from labeling images, are stored without one.
+    box_xmin = models.FloatField(null=True, editable=False)
+    box_ymin = models.FloatField(null=True, editable=False)
+    box_zmin = models.FloatField(null=True, editable=False)
+    box_xmax = models.FloatField(null=True, editable=False)
+    box_ymax = models.FloatField(null=True, editable=False)
+    box_zmax = models.FloatField(null=True, editable=False)
+
+    objects = ExtentQuerySet.as_manager()
 
     class Meta:
         constraints = [
             UniqueConstraint(
                 name="unique_extent",
                 fields=["thing", "timestamp"],
-            )
+            ),
+            CheckConstraint(check=HAS_GEOMETRY_OR_BOX, name="extent_geometry_or_box"),
         ]
-        indexes = [GinIndex(fields=["metadata"])]
+        indexes = [
+            GinIndex(fields=["metadata"]),
+            models.Index(fields=["timestamp", "id"], name="extent_timestamp_id_idx"),
+            GistIndex(
+                OpClass(StoredBox(), name="gist_geometry_ops_nd"),
+                name="extent_box_idx",
+            ),
+            GistIndex(
+                OpClass(StoredSpaceTimeBox(), name="gist_geometry_ops_nd"),
+                name="extent_spacetime_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which trajectory vertex is stored for this extent. Saving
+        # can then splice that vertex instead of rebuilding the trajectory.
+        stored = dict(zip(field_names, values))
+        if "thing_id" in stored and "timestamp" in stored:
+            instance._stored_vertex = (stored["thing_id"], stored["timestamp"])
+        # Remember the stored 2D extent, whose tiles change when it is moved.
+        instance._stored_extent = planar_extent(
+            stored.get("geometry"), [stored.get(name) for name in BOX_FIELDS]
+        )
+        return instance
 
 
 class Coverage(models.Model):
@@ -135,11 +424,27 @@ class Coverage(models.Model):
     description = models.TextField(blank=True)
     links = ArrayField(models.URLField(), default=list)
     metadata = models.JSONField(default=dict)
+    # A JSON Schema for the `properties` of measurements of this coverage.
+    properties_schema = models.JSONField(null=True, blank=True)
 
     class Meta:
         indexes = [GinIndex(fields=["metadata"])]
 
 
+class MeasurementQuerySet(models.QuerySet):
+    """Keeps tiles current for writes that bypass signals."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        invalidate_tiles(objs, "coverage", self.db)
+        return objs
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        tiles.invalidate_all(using=self.db)
+        return rows
+
+
 class Measurement(models.Model):
     """A sample of a coverage.
 
@@ -164,15 +469,75 @@ class Measurement(models.Model):
     """
 
     coverage = models.ForeignKey("Coverage", on_delete=models.CASCADE)
-    timestamp = models.IntegerField(db_index=True)
-    geometry = GeometryField(dim=3, srid=0)
+    timestamp = models.IntegerField()
+    geometry = GeometryField(dim=3, srid=0, null=True, blank=True)
     properties = models.JSONField()
+    # The bounding box of the geometry, stored by the database, see `boxes`.
+    # Axis-aligned boxes, e.g. from labeling images, are stored without one.
+    box_xmin = models.FloatField(null=True, editable=False)
+    box_ymin = models.FloatField(null=True, editable=False)
+    box_zmin = models.FloatField(null=True, editable=False)
+    box_xmax = models.FloatField(null=True, editable=False)
+    box_ymax = models.FloatField(null=True, editable=False)
+    box_zmax = models.FloatField(null=True, editable=False)
+
+    objects = MeasurementQuerySet.as_manager()
 
     class Meta:
-        indexes = [GinIndex(fields=["properties"])]
+        indexes = [
+            GinIndex(fields=["properties"]),
+            models.Index(
+                fields=["timestamp", "id"], name="measurement_timestamp_id_idx"
+            ),
+            GistIndex(
+                OpClass(StoredBox(), name="gist_geometry_ops_nd"),
+                name="measurement_box_idx",
+            ),
+        ]
         constraints = [
             UniqueConstraint(
                 fields=["coverage", "timestamp"],
                 name="unique_coverage_timestamp",
-            )
+            ),
+            CheckConstraint(
+                check=HAS_GEOMETRY_OR_BOX, name="measurement_geometry_or_box"
+            ),
         ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored 2D extent, whose tiles change when it is moved.
+        stored = dict(zip(field_names, values))
+        instance._stored_extent = planar_extent(
+            stored.get("geometry"), [stored.get(name) for name in BOX_FIELDS]
+        )
+        return instance
+
+
+class ProximityJob(models.Model):
+    """A search for spatial things near each other, see `proximity`.
+
+    Finds the pairs of spatial things of `universe` whose extents are at
+    most `distance` apart at the same timestamp, between `start` and `end`
+    if given. Jobs are queued when created and run by the `proximity`
+    management command, which stores the pairs in a file.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    universe = models.ForeignKey("Universe", on_delete=models.CASCADE)
+    distance = models.FloatField()
+    start = models.IntegerField(null=True, blank=True)
+    end = models.IntegerField(null=True, blank=True)
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING, editable=False
+    )
+    pairs = models.BigIntegerField(null=True, editable=False)
+    error = models.TextField(blank=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, editable=False)
@@ -0,0 +1,138 @@
+"""Django REST Framework pagination.
+
+This module contains the DRF pagination styles. These allow
+listing large tables one bounded page at a time.
+
+https://www.django-rest-framework.org/api-guide/pagination/
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+import orjson
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections, models
+from django.db.models import F, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from spatiotemporal.db.functions import Row
+
+
+class KeysetPagination(BasePagination):
+    """Paginates by the key of the first or last object of a page.
+
+    The key is given by the view's `keyset`, e.g. `("timestamp", "id")`,
+    and must be unique. Pages continue after (or, going back, before) the
+    key in the cursor with a row comparison on the key's columns, so deep
+    pages are as fast as the first one given an index on those columns.
+    """
+
+    page_size = api_settings.PAGE_SIZE or 100
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    keyset = ("id",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = getattr(view, "keyset", self.keyset)
+        self.size = self.get_page_size(request)
+        key, self.reverse = self.decode_cursor(request)
+        if key is not None:
+            key = self.clean_key(queryset, key)
+
+        ordering = self.keyset
+        if self.reverse:
+            ordering = tuple(f"-{field}" for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if key is not None:
+            lookup = "lt" if self.reverse else "gt"
+            queryset = queryset.alias(
+                keyset=Row(*(F(field) for field in self.keyset))
+            ).filter(**{f"keyset__{lookup}": Row(*(Value(v) for v in key))})
+
+        page = list(queryset[: self.size + 1])
+        has_more = len(page) > self.size
+        page = page[: self.size]
+        if self.reverse:
+            page.reverse()
+
+        self.next = self.previous = None
+        if page and (has_more or self.reverse):
+            self.next = self.encode_cursor(page[-1], reverse=False)
+        if page and (has_more if self.reverse else key is not None):
+            self.previous = self.encode_cursor(page[0], reverse=True)
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.next, "previous": self.previous, "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = orjson.loads(urlsafe_b64decode(encoded.encode()))
+            key, reverse = cursor["key"], bool(cursor.get("reverse"))
+        except (BinasciiError, orjson.JSONDecodeError, KeyError, TypeError):
+            raise NotFound("Invalid cursor.")
+        if not isinstance(key, list) or len(key) != len(self.keyset):
+            raise NotFound("Invalid cursor.")
+        return key, reverse
+
+    def clean_key(self, queryset, key: list) -> list:
+        """Check the values of a decoded key against the fields of the keyset.
+
+        Integers must fit their column, so that a forged cursor is not
+        found rather than failing the query.
+        """
+        opts = queryset.model._meta
+        ops = connections[queryset.db].ops
+        cleaned = []
+        for name, value in zip(self.keyset, key):
+            field = opts.get_field(name)
+            if isinstance(field, models.IntegerField):
+                low, high = ops.integer_field_range(field.get_internal_type())
+                if (
+                    isinstance(value, bool)
+                    or not isinstance(value, int)
+                    or not low <= value <= high
+                ):
+                    raise NotFound("Invalid cursor.")
+            else:
+                try:
+                    value = field.to_python(value)
+                except (DjangoValidationError, TypeError, ValueError):
+                    raise NotFound("Invalid cursor.")
+                if value is None:
+                    raise NotFound("Invalid cursor.")
+            cleaned.append(value)
+        return cleaned
+
+    def encode_cursor(self, obj, reverse: bool) -> str:
+        key = [getattr(obj, field) for field in self.keyset]
+        cursor = {"key": key, "reverse": reverse} if reverse else {"key": key}
+        encoded = urlsafe_b64encode(orjson.dumps(cursor)).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
@@ -0,0 +1,62 @@
+"""Django REST Framework parsers.
+
+This module contains the DRF parsers. These allow
+reading request bodies in formats other than JSON.
+
+https://www.django-rest-framework.org/api-guide/parsers/
+"""
+
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class ORJSONParser(BaseParser):
+    """Parses JSON with orjson.
+
+    https://github.com/ijl/orjson
+    """
+
+    media_type = "application/json"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError(f"JSON parse error - {error}")
+
+
+class NDJSONParser(BaseParser):
+    """Parses newline delimited JSON lazily.
+
+    Returns an iterator over the JSON values of the lines. Lines that
+    are not valid JSON are returned as `ParseError`, so that a single
+    bad line does not reject the whole body.
+
+    http://ndjson.org/
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return self._values(stream)
+
+    def _values(self, stream):
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as error:
+                yield ParseError(f"JSON parse error - {error}")
+
+
+class GeoJSONParser(ORJSONParser):
+    """Parses GeoJSON, e.g. a feature collection.
+
+    https://datatracker.ietf.org/doc/html/rfc7946
+    """
+
+    media_type = "application/geo+json"
@@ -0,0 +1,232 @@
+"""Table partitioning.
+
+This module contains the optional declarative partitioning of the extent
+and measurement tables by range of `timestamp`, and optionally by hash of
+their thing or coverage within each range. Partitioning is configured by
+`SPATIOTEMPORAL_PARTITIONING`, e.g. `{"interval": 86400, "modulus": 4}`.
+
+Queries filtering on `timestamp` only scan the matching partitions, and
+old data is removed by detaching or dropping whole partitions instead of
+deleting rows. Rows outside of all ranges go to a default partition.
+
+https://www.postgresql.org/docs/current/ddl-partitioning.html
+"""
+
+import re
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from spatiotemporal import levels, tiles, trajectories
+
+# The partitioned tables, with the column their ranges are hashed by.
+TABLES = {
+    "spatiotemporal_extent": "thing_id",
+    "spatiotemporal_measurement": "coverage_id",
+}
+
+BOUNDS = re.compile(r"FOR VALUES FROM \((-?\d+)\) TO \((-?\d+)\)")
+
+
+def config() -> tuple[int, int]:
+    """The configured range interval and hash modulus, 0 if disabled."""
+    partitioning = getattr(settings, "SPATIOTEMPORAL_PARTITIONING", None) or {}
+    return partitioning.get("interval", 0), partitioning.get("modulus", 0)
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute(
+        "SELECT EXISTS (SELECT FROM pg_partitioned_table WHERE partrelid = %s::regclass)",
+        [table],
+    )
+    return cursor.fetchone()[0]
+
+
+def partition_name(table: str, start: int) -> str:
+    return f"{table}_p{start}".replace("-", "m")
+
+
+def partitions(cursor, table: str) -> Iterator[tuple[str, int, int]]:
+    """The range partitions of a table as (name, start, end), by start."""
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits AS i
+        JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        """,
+        [table],
+    )
+    bounds = []
+    for name, bound in cursor.fetchall():
+        match = BOUNDS.match(bound)
+        if match:
+            bounds.append((name, int(match[1]), int(match[2])))
+    return iter(sorted(bounds, key=lambda partition: partition[1]))
+
+
+def create_partition(cursor, table: str, start: int, interval: int, modulus: int):
+    """Create the range partition starting at `start`, if it is missing.
+
+    Rows of the range in the default partition are moved to it.
+    """
+    name = partition_name(table, start)
+    default = f"{table}_default"
+    key = TABLES[table]
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    if cursor.fetchone()[0]:
+        return
+
+    end = start + interval
+    cursor.execute(
+        f"SELECT EXISTS (SELECT FROM {default} WHERE timestamp >= %s AND timestamp < %s)",
+        [start, end],
+    )
+    move = cursor.fetchone()[0]
+    if move:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+
+    hashed = f" PARTITION BY HASH ({key})" if modulus else ""
+    cursor.execute(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ({start}) TO ({end}){hashed}"
+    )
+    for remainder in range(modulus):
+        cursor.execute(
+            f"CREATE TABLE {name}_h{remainder} PARTITION OF {name} "
+            f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        )
+
+    if move:
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {default}
+                WHERE timestamp >= %s AND timestamp < %s
+                RETURNING *
+            )
+            INSERT INTO {table} SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+
+
+def create_partitions(
+    cursor, table: str, start: int, end: int, interval: int, modulus: int
+):
+    """Create the missing range partitions covering `start` to `end`."""
+    first = start - start % interval
+    for bucket in range(first, end + 1, interval):
+        create_partition(cursor, table, bucket, interval, modulus)
+
+
+def remove_partitions(
+    cursor, table: str, before: int, drop: bool, using: str = DEFAULT_DB_ALIAS
+) -> list[str]:
+    """Detach, or drop, the range partitions ending at or before `before`.
+
+    Neither signals nor triggers see the rows removed, so the trajectories
+    of the things losing extents are rebuilt, with their segments and
+    levels, and all tiles are invalidated once committed.
+    """
+    removed = []
+    things = set()
+    for name, start, end in partitions(cursor, table):
+        if end > before:
+            break
+        if table == "spatiotemporal_extent":
+            cursor.execute(f"SELECT DISTINCT thing_id FROM {name}")
+            things.update(thing for (thing,) in cursor.fetchall())
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if drop:
+            cursor.execute(f"DROP TABLE {name}")
+        removed.append(name)
+
+    if things:
+        trajectories.rebuild(things, using)
+        levels.refresh(things, using)
+        trajectories.trajectories_changed.send(sender=None, things=things, using=using)
+    if removed:
+        tiles.invalidate_all(using)
+    return removed
+
+
+def latest_timestamp(cursor, table: str) -> Optional[int]:
+    cursor.execute(f"SELECT max(timestamp) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def partition_table(connection, table: str, interval: int, modulus: int):
+    """Convert a table into a partitioned table, keeping its rows.
+
+    Renames, copies and drops the whole table, so must run in a transaction
+    to not leave it half converted, see the `partitions --convert` command.
+
+    The indexes, constraints and triggers of the table are recreated with
+    the same names on the partitioned table, whose primary key also
+    includes the partition keys.
+    """
+    key = TABLES[table]
+    old = f"{table}_unpartitioned"
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, table):
+            return
+
+        cursor.execute(
+            """
+            SELECT pg_get_indexdef(i.indexrelid)
+            FROM pg_index AS i
+            WHERE i.indrelid = %s::regclass
+            AND NOT EXISTS (SELECT FROM pg_constraint WHERE conindid = i.indexrelid)
+            """,
+            [table],
+        )
+        indexes = [definition for (definition,) in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype <> 'p'
+            """,
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT pg_get_triggerdef(oid)
+            FROM pg_trigger
+            WHERE tgrelid = %s::regclass AND NOT tgisinternal
+            """,
+            [table],
+        )
+        triggers = [definition for (definition,) in cursor.fetchall()]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        (sequence,) = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        cursor.execute(
+            f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING STORAGE) "
+            f"PARTITION BY RANGE (timestamp)"
+        )
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        cursor.execute(f"SELECT min(timestamp), max(timestamp) FROM {old}")
+        start, end = cursor.fetchone()
+        if start is not None:
+            create_partitions(cursor, table, start, end, interval, modulus)
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+        cursor.execute(f"DROP TABLE {old}")
+
+        primary_key = ", ".join(["id", "timestamp", *([key] if modulus else [])])
+        cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({primary_key})")
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in constraints:
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        # The triggers were dropped together with the old table.
+        for definition in triggers:
+            cursor.execute(definition)
+
+    trajectories.sync_triggers(connection)
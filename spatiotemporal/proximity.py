@@ -0,0 +1,280 @@
+"""Proximity of spatial things.
+
+This module contains the search for pairs of spatial things of a universe
+whose extents are at most a distance apart at the same timestamp, a
+spatiotemporal self-join of the extents.
+
+Extents are joined through `extent_spacetime_idx`, the n-D index of their
+stored boxes with the timestamp as M coordinate, see `StoredSpaceTimeBox`:
+each extent probes the index with its box grown by the distance and pinned
+to its timestamp, so that only extents of the same timestamp and nearby
+boxes are read. Candidates are then compared by the 3D distance of their
+geometries, or of their boxes if either is stored as a box only.
+
+The time range is cut into buckets of consecutive timestamps, each searched
+by a query of its own, so that buckets can be searched by parallel worker
+processes. Pairs are read from a server-side cursor and written as NDJSON
+as they arrive, rather than collected in memory.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+import django
+import orjson
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from spatiotemporal.models import ProximityJob
+
+DEFAULT_BUCKET_SIZE = 1000
+
+# The number of pairs fetched from the server-side cursor at a time.
+FETCH_SIZE = 10000
+
+# The 3D distance between the boxes of the extents `a` and `b`.
+BOX_DISTANCE = """
+    sqrt(
+        greatest(a.box_xmin - b.box_xmax, b.box_xmin - a.box_xmax, 0) ^ 2
+        + greatest(a.box_ymin - b.box_ymax, b.box_ymin - a.box_ymax, 0) ^ 2
+        + greatest(a.box_zmin - b.box_zmax, b.box_zmin - a.box_zmax, 0) ^ 2
+    )
+"""
+
+# The pairs of things of a universe near each other in a time range. The
+# left-hand side of `&&&` is the expression of `extent_spacetime_idx`.
+PAIRS = f"""
+    SELECT a.timestamp, a.thing_id, b.thing_id, d.distance
+    FROM spatiotemporal_extent AS a
+    JOIN spatiotemporal_spatialthing AS ta ON ta.id = a.thing_id
+    JOIN spatiotemporal_extent AS b ON ST_MakeLine(
+        ST_MakePoint(b.box_xmin, b.box_ymin, b.box_zmin, b.timestamp),
+        ST_MakePoint(b.box_xmax, b.box_ymax, b.box_zmax, b.timestamp)
+    ) &&& ST_MakeLine(
+        ST_MakePoint(
+            a.box_xmin - %(distance)s,
+            a.box_ymin - %(distance)s,
+            a.box_zmin - %(distance)s,
+            a.timestamp
+        ),
+        ST_MakePoint(
+            a.box_xmax + %(distance)s,
+            a.box_ymax + %(distance)s,
+            a.box_zmax + %(distance)s,
+            a.timestamp
+        )
+    )
+    JOIN spatiotemporal_spatialthing AS tb ON tb.id = b.thing_id
+    CROSS JOIN LATERAL (
+        SELECT CASE
+            WHEN a.geometry IS NOT NULL AND b.geometry IS NOT NULL
+            THEN ST_3DDistance(a.geometry, b.geometry)
+            ELSE {BOX_DISTANCE}
+        END AS distance
+    ) AS d
+    WHERE ta.universe_id = %(universe)s
+    AND tb.universe_id = %(universe)s
+    AND a.timestamp BETWEEN %(start)s AND %(end)s
+    AND b.timestamp = a.timestamp
+    AND a.thing_id < b.thing_id
+    AND d.distance <= %(distance)s
+"""
+
+# The first and last timestamps of the extents of a universe.
+RANGE = """
+    SELECT min(e.timestamp), max(e.timestamp)
+    FROM spatiotemporal_extent AS e
+    JOIN spatiotemporal_spatialthing AS t ON t.id = e.thing_id
+    WHERE t.universe_id = %(universe)s
+"""
+
+Bucket = tuple[int, int]
+
+
+def bucket_size() -> int:
+    """The number of consecutive timestamps searched by a query."""
+    return int(
+        getattr(settings, "SPATIOTEMPORAL_PROXIMITY_BUCKET_SIZE", DEFAULT_BUCKET_SIZE)
+    )
+
+
+def root() -> Path:
+    """The directory of the pairs found by jobs."""
+    directory = getattr(settings, "SPATIOTEMPORAL_PROXIMITY_ROOT", None)
+    if directory is None:
+        return Path(tempfile.gettempdir()) / "spatiotemporal-proximity"
+    return Path(directory)
+
+
+def results(job: ProximityJob) -> Path:
+    """The NDJSON file of the pairs found by a job."""
+    return root() / f"{job.pk}.ndjson"
+
+
+def buckets(
+    universe: int,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    size: Optional[int] = None,
+    using: str = DEFAULT_DB_ALIAS,
+) -> list[Bucket]:
+    """The inclusive time ranges covering the extents of a universe.
+
+    Open ends are taken from the first and last extents of the universe.
+    """
+    size = size or bucket_size()
+    if size < 1:
+        raise ValueError("Buckets must have at least one timestamp.")
+    if start is None or end is None:
+        with connections[using].cursor() as cursor:
+            cursor.execute(RANGE, {"universe": universe})
+            first, last = cursor.fetchone()
+        if first is None:
+            return []
+        start = first if start is None else start
+        end = last if end is None else end
+    return [(low, min(low + size - 1, end)) for low in range(start, end + 1, size)]
+
+
+def pairs(
+    universe: int, distance: float, bucket: Bucket, using: str = DEFAULT_DB_ALIAS
+) -> Iterator[tuple[int, int, int, float]]:
+    """The things at most `distance` apart at the same timestamp in a bucket.
+
+    Yields `(timestamp, thing, other, distance)` with `thing < other`, in no
+    particular order, from a server-side cursor.
+    """
+    start, end = bucket
+    params = {
+        "universe": universe,
+        "distance": float(distance),
+        "start": start,
+        "end": end,
+    }
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.chunked_cursor() as cursor:
+        cursor.execute(PAIRS, params)
+        while rows := cursor.fetchmany(FETCH_SIZE):
+            yield from rows
+
+
+def write(rows: Iterable[tuple[int, int, int, float]], file: BinaryIO) -> int:
+    """Write pairs as NDJSON, returning how many were written."""
+    count = 0
+    for timestamp, thing, other, distance in rows:
+        file.write(
+            orjson.dumps(
+                {"timestamp": timestamp, "things": [thing, other], "distance": distance}
+            )
+        )
+        file.write(b"\n")
+        count += 1
+    return count
+
+
+def search(
+    universe: int,
+    distance: float,
+    bucket_list: list[Bucket],
+    file: BinaryIO,
+    workers: int = 1,
+    using: str = DEFAULT_DB_ALIAS,
+) -> int:
+    """Write the pairs of all buckets to a file, returning how many there are.
+
+    With several `workers`, buckets are searched by as many processes, each
+    into a temporary file, and the files are appended in bucket order.
+    """
+    if workers <= 1:
+        return sum(
+            write(pairs(universe, distance, bucket, using), file)
+            for bucket in bucket_list
+        )
+
+    # Forked workers must not share the connections of this process.
+    connections.close_all()
+    count = 0
+    with tempfile.TemporaryDirectory() as directory, multiprocessing.Pool(
+        workers, initializer=_setup_worker
+    ) as pool:
+        tasks = [
+            (universe, distance, bucket, os.path.join(directory, str(index)), using)
+            for index, bucket in enumerate(bucket_list)
+        ]
+        for path, written in pool.imap(_search_bucket, tasks):
+            with open(path, "rb") as part:
+                shutil.copyfileobj(part, file)
+            os.remove(path)
+            count += written
+    return count
+
+
+def _setup_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def _search_bucket(task: tuple) -> tuple[str, int]:
+    universe, distance, bucket, path, using = task
+    try:
+        with open(path, "wb") as file:
+            return path, write(pairs(universe, distance, bucket, using), file)
+    finally:
+        connections.close_all()
+
+
+def claim(using: str = DEFAULT_DB_ALIAS) -> Optional[ProximityJob]:
+    """Mark the oldest pending job as running and return it.
+
+    Jobs are locked while claimed, skipping those locked by other workers,
+    so that several workers can run jobs at once.
+    """
+    with transaction.atomic(using=using):
+        job = (
+            ProximityJob.objects.using(using)
+            .select_for_update(skip_locked=True)
+            .filter(status=ProximityJob.Status.PENDING)
+            .order_by("created", "id")
+            .first()
+        )
+        if job is not None:
+            job.status = ProximityJob.Status.RUNNING
+            job.save(update_fields=["status"])
+    return job
+
+
+def run(job: ProximityJob, workers: int = 1, using: str = DEFAULT_DB_ALIAS):
+    """Search the pairs of a claimed job into its file, recording the outcome.
+
+    The file only appears once complete. Errors fail the job with their
+    message rather than being raised.
+    """
+    path = results(job)
+    partial = path.with_suffix(".partial")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        bucket_list = buckets(job.universe_id, job.start, job.end, using=using)
+        with open(partial, "wb") as file:
+            job.pairs = search(
+                job.universe_id, job.distance, bucket_list, file, workers, using
+            )
+        os.replace(partial, path)
+        job.status = ProximityJob.Status.DONE
+    except Exception as error:
+        partial.unlink(missing_ok=True)
+        job.status = ProximityJob.Status.FAILED
+        job.error = str(error)
+    finally:
+        job.finished = timezone.now()
+        job.save(using=using, update_fields=["status", "pairs", "error", "finished"])
+
+
+def delete_results(job: ProximityJob):
+    """Remove the file of the pairs found by a job."""
+    results(job).unlink(missing_ok=True)
@@ -0,0 +1,161 @@
+"""Django REST Framework renderers.
+
+This module contains the DRF renderers. These allow
+returning responses in formats other than JSON.
+
+https://www.django-rest-framework.org/api-guide/renderers/
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import Optional
+
+import orjson
+from django.contrib.gis.geos import GEOSGeometry
+from rest_framework.renderers import BaseRenderer
+
+OPTION = orjson.OPT_NON_STR_KEYS
+
+
+def default(value):
+    """Serialize values that orjson does not support natively.
+
+    Mirrors the encoder of the DRF `JSONRenderer`. Geometries are
+    rendered as EWKT, like the serializers do.
+    """
+    if isinstance(value, GEOSGeometry):
+        return value.ewkt
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return str(value.total_seconds())
+    if isinstance(value, bytes):
+        return value.decode()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "__iter__") and not isinstance(value, str):
+        return list(value)
+    return str(value)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """Renders JSON with orjson.
+
+    Datetimes, UUIDs and dataclasses are serialized natively by
+    orjson, anything else by `default`.
+
+    https://github.com/ijl/orjson
+    """
+
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        option = OPTION
+        if "indent" in (accepted_media_type or ""):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renders newline delimited JSON, one object per line.
+
+    Used by the viewsets to stream list responses record by record.
+
+    http://ndjson.org/
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        view = (renderer_context or {}).get("view")
+        geometry_field = getattr(view, "geometry_field", None)
+        rows = data if isinstance(data, list) else [data]
+        return b"".join(self.record(row, geometry_field) for row in rows)
+
+    def record(
+        self,
+        row: dict,
+        geometry_field: Optional[str] = None,
+        geometry: Optional[bytes] = None,
+    ) -> bytes:
+        """Render a single object.
+
+        `geometry` may hold the GeoJSON of the object's geometry if it
+        has already been computed, e.g. by the database.
+        """
+        return orjson.dumps(row, default=default, option=OPTION) + b"\n"
+
+
+class GeoJSONSeqRenderer(NDJSONRenderer):
+    """Renders a GeoJSON text sequence, one feature per record.
+
+    https://datatracker.ietf.org/doc/html/rfc8142
+    """
+
+    media_type = "application/geo+json-seq"
+    format = "geojsonseq"
+
+    def record(
+        self,
+        row: dict,
+        geometry_field: Optional[str] = None,
+        geometry: Optional[bytes] = None,
+    ) -> bytes:
+        properties = dict(row)
+        pk = properties.pop("id", None)
+        value = properties.pop(geometry_field, None) if geometry_field else None
+        if geometry is None:
+            geometry = GEOSGeometry(value).json.encode() if value else b"null"
+        return b'\x1e{"type":"Feature","id":%b,"geometry":%b,"properties":%b}\n' % (
+            orjson.dumps(pk),
+            geometry,
+            orjson.dumps(properties, default=default, option=OPTION),
+        )
+
+
+class MVTRenderer(BaseRenderer):
+    """Passes through Mapbox Vector Tiles encoded by the database.
+
+    Also the base of renderers of other binary formats encoded elsewhere.
+
+    https://github.com/mapbox/vector-tile-spec
+    """
+
+    media_type = "application/vnd.mapbox-vector-tile"
+    format = "mvt"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        # Errors are rendered as JSON, and labelled as such.
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = "application/json"
+        return orjson.dumps(data, default=default, option=OPTION)
+
+
+class ArrowRenderer(MVTRenderer):
+    """Passes through Apache Arrow IPC streams.
+
+    https://arrow.apache.org/docs/format/Columnar.html#ipc-streaming-format
+    """
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+
+
+class ParquetRenderer(MVTRenderer):
+    """Passes through Apache Parquet files.
+
+    https://parquet.apache.org/docs/file-format/
+    """
+
+    media_type = "application/vnd.apache.parquet"
+    format = "parquet"
@@ -0,0 +1,53 @@
+"""JSON Schema validation.
+
+This module contains the validation of JSON documents, e.g.
+`Measurement.properties`, against the JSON Schema stored on their
+coverage or universe.
+
+Compiled validators are cached by the content of their schema. Changing
+the schema of a row therefore compiles a new validator on next use, in
+every process, while unchanged schemas are only compiled once.
+
+https://json-schema.org/
+"""
+
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+import jsonschema_rs
+import orjson
+
+
+@lru_cache(maxsize=256)
+def _compile(schema: bytes) -> jsonschema_rs.JSONSchema:
+    return jsonschema_rs.JSONSchema.from_str(schema.decode())
+
+
+def validator(schema: Optional[Any]) -> Optional[jsonschema_rs.JSONSchema]:
+    """The compiled validator of a schema, or `None` without a schema.
+
+    Raises `ValueError` if the schema is invalid.
+    """
+    if schema is None:
+        return None
+    return _compile(orjson.dumps(schema, option=orjson.OPT_SORT_KEYS))
+
+
+def errors(schema: Optional[Any], document: Any) -> list[str]:
+    """The messages of all errors of the document against the schema."""
+    compiled = validator(schema)
+    if compiled is None or compiled.is_valid(document):
+        return []
+    return [error.message for error in compiled.iter_errors(document)]
+
+
+def validate_many(schema: Optional[Any], documents: Iterable) -> dict[int, list[str]]:
+    """The error messages of the invalid documents, by their position."""
+    compiled = validator(schema)
+    if compiled is None:
+        return {}
+    return {
+        index: [error.message for error in compiled.iter_errors(document)]
+        for index, document in enumerate(documents)
+        if not compiled.is_valid(document)
+    }
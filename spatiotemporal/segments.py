@@ -0,0 +1,336 @@
+"""Trajectory segments.
+
+This module contains the maintenance of `TrajectorySegment`, the pieces of
+`SpatialThing.trajectory` of at most `SPATIOTEMPORAL_TRAJECTORY_SEGMENT_VERTICES`
+vertices each. Consecutive segments share their boundary vertex, so every
+instant of the trajectory is covered by a segment.
+
+The n-D bounding box of a whole trajectory grows with the lifetime of its
+thing, so that a long-lived thing matches every query box around its path
+and must then be rechecked in full. The boxes of segments stay small, so
+space-time queries look up segments by their index and collapse them to
+their spatial things.
+
+A row trigger computes the segments of spatial things inserted with a
+trajectory. Rebuilding trajectories, see `trajectories.rebuild`, recomputes
+all segments of the rebuilt things, leaving those that did not change as
+they are. Splicing a single vertex, see `splice`, only changes the one or
+two segments around it, without reading the trajectory: a segment growing
+beyond the maximum is split in halves, and the segments sharing a removed
+vertex share the next one instead. Spliced segments thus have from 2 up to
+the maximum number of vertices, in no particular `sequence`.
+"""
+
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULT_VERTICES = 64
+
+FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_trajectory_segments(
+        _thing bigint, _trajectory geometry
+    )
+    RETURNS void
+    LANGUAGE sql
+    AS $$
+        DELETE FROM spatiotemporal_trajectorysegment
+        WHERE thing_id = _thing
+        AND sequence > coalesce((ST_NPoints(_trajectory) - 2) / {vertices}, -1);
+        INSERT INTO spatiotemporal_trajectorysegment (thing_id, sequence, trajectory)
+        SELECT _thing, s.sequence, ST_MakeLine(ST_PointN(_trajectory, s.n) ORDER BY s.n)
+        FROM (
+            SELECT k, n
+            FROM generate_series(0, (ST_NPoints(_trajectory) - 2) / {vertices}) AS k
+            CROSS JOIN LATERAL generate_series(
+                k * {vertices} + 1,
+                least((k + 1) * {vertices} + 1, ST_NPoints(_trajectory))
+            ) AS n
+        ) AS s(sequence, n)
+        GROUP BY s.sequence
+        ON CONFLICT (thing_id, sequence) DO UPDATE
+        SET trajectory = EXCLUDED.trajectory
+        WHERE spatiotemporal_trajectorysegment.trajectory
+            IS DISTINCT FROM EXCLUDED.trajectory;
+    $$
+"""
+
+# The segments of the thing `_thing` whose time range includes `{timestamp}`,
+# through the index of the segments.
+AT = """
+    s.thing_id = _thing
+    AND s.trajectory &&& ST_MakeLine(
+        ST_MakePoint('-infinity', '-infinity', '-infinity', {timestamp}),
+        ST_MakePoint('infinity', 'infinity', 'infinity', {timestamp})
+    )
+"""
+
+# Splices the vertex at `_timestamp` into the segments of a thing, next to the
+# vertex at `_neighbour`, replaces it if `_neighbour` is NULL, or removes it if
+# `_vertex` is NULL. Returns false if the segments have no such vertex.
+SPLICE_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION spatiotemporal_trajectory_segment_vertex(
+        _thing bigint,
+        _timestamp double precision,
+        _vertex geometry,
+        _neighbour double precision
+    )
+    RETURNS boolean
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        _segment spatiotemporal_trajectorysegment;
+        _next spatiotemporal_trajectorysegment;
+        _line geometry;
+        _half integer;
+    BEGIN
+        IF _vertex IS NULL THEN
+            SELECT * INTO _segment
+            FROM spatiotemporal_trajectorysegment AS s
+            WHERE {AT.format(timestamp="_timestamp")}
+            ORDER BY ST_M(ST_StartPoint(s.trajectory))
+            LIMIT 1;
+            IF NOT FOUND THEN
+                RETURN false;
+            END IF;
+
+            IF ST_M(ST_EndPoint(_segment.trajectory)) = _timestamp THEN
+                SELECT * INTO _next
+                FROM spatiotemporal_trajectorysegment AS s
+                WHERE {AT.format(timestamp="_timestamp")}
+                AND s.id <> _segment.id
+                AND ST_M(ST_StartPoint(s.trajectory)) = _timestamp;
+                IF NOT FOUND THEN
+                    IF ST_NPoints(_segment.trajectory) > 2 THEN
+                        _line := ST_RemovePoint(
+                            _segment.trajectory, ST_NPoints(_segment.trajectory) - 1
+                        );
+                    END IF;
+                ELSIF ST_NPoints(_next.trajectory) = 2 THEN
+                    _line := ST_SetPoint(
+                        _segment.trajectory, -1, ST_EndPoint(_next.trajectory)
+                    );
+                    DELETE FROM spatiotemporal_trajectorysegment WHERE id = _next.id;
+                ELSE
+                    _line := ST_SetPoint(
+                        _segment.trajectory, -1, ST_PointN(_next.trajectory, 2)
+                    );
+                    UPDATE spatiotemporal_trajectorysegment
+                    SET trajectory = ST_RemovePoint(trajectory, 0)
+                    WHERE id = _next.id;
+                END IF;
+            ELSIF ST_M(ST_StartPoint(_segment.trajectory)) = _timestamp THEN
+                IF ST_NPoints(_segment.trajectory) > 2 THEN
+                    _line := ST_RemovePoint(_segment.trajectory, 0);
+                END IF;
+            ELSE
+                SELECT ST_MakeLine(d.geom ORDER BY d.path) INTO _line
+                FROM ST_DumpPoints(_segment.trajectory) AS d
+                WHERE ST_M(d.geom) <> _timestamp;
+                IF ST_NPoints(_line) = ST_NPoints(_segment.trajectory) THEN
+                    RETURN false;
+                END IF;
+            END IF;
+
+            -- A segment left with a single vertex is removed.
+            IF _line IS NULL THEN
+                DELETE FROM spatiotemporal_trajectorysegment WHERE id = _segment.id;
+            ELSE
+                UPDATE spatiotemporal_trajectorysegment
+                SET trajectory = _line
+                WHERE id = _segment.id;
+            END IF;
+            RETURN true;
+        END IF;
+
+        IF _neighbour IS NULL THEN
+            UPDATE spatiotemporal_trajectorysegment AS o
+            SET trajectory = ST_SetPoint(o.trajectory, p.n, _vertex)
+            FROM (
+                SELECT s.id, d.path[1] - 1 AS n
+                FROM spatiotemporal_trajectorysegment AS s
+                CROSS JOIN LATERAL ST_DumpPoints(s.trajectory) AS d
+                WHERE {AT.format(timestamp="_timestamp")}
+                AND ST_M(d.geom) = _timestamp
+            ) AS p
+            WHERE o.id = p.id;
+            RETURN FOUND;
+        END IF;
+
+        -- The later of two segments sharing the neighbour, which is the
+        -- previous vertex unless the vertex is the first one.
+        SELECT * INTO _segment
+        FROM spatiotemporal_trajectorysegment AS s
+        WHERE {AT.format(timestamp="_neighbour")}
+        ORDER BY ST_M(ST_StartPoint(s.trajectory)) DESC
+        LIMIT 1;
+        IF NOT FOUND THEN
+            RETURN false;
+        END IF;
+
+        SELECT ST_MakeLine(p.geom ORDER BY ST_M(p.geom)) INTO _line
+        FROM (
+            SELECT d.geom FROM ST_DumpPoints(_segment.trajectory) AS d
+            UNION ALL
+            SELECT _vertex
+        ) AS p(geom);
+        IF ST_NPoints(_line) <= {{vertices}} THEN
+            UPDATE spatiotemporal_trajectorysegment
+            SET trajectory = _line
+            WHERE id = _segment.id;
+            RETURN true;
+        END IF;
+
+        _half := (ST_NPoints(_line) + 1) / 2;
+        UPDATE spatiotemporal_trajectorysegment
+        SET trajectory = (
+            SELECT ST_MakeLine(d.geom ORDER BY d.path)
+            FROM ST_DumpPoints(_line) AS d
+            WHERE d.path[1] <= _half
+        )
+        WHERE id = _segment.id;
+        INSERT INTO spatiotemporal_trajectorysegment (thing_id, sequence, trajectory)
+        SELECT
+            _thing,
+            (
+                SELECT max(sequence) + 1
+                FROM spatiotemporal_trajectorysegment
+                WHERE thing_id = _thing
+            ),
+            ST_MakeLine(d.geom ORDER BY d.path)
+        FROM ST_DumpPoints(_line) AS d
+        WHERE d.path[1] >= _half;
+        RETURN true;
+    END;
+    $$
+"""
+
+SPLICE = """
+    SELECT spatiotemporal_trajectory_segment_vertex(
+        %(thing)s, %(timestamp)s, %(vertex)s::geometry, %(neighbour)s
+    )
+"""
+
+TRIGGER_FUNCTION = """
+    CREATE OR REPLACE FUNCTION spatiotemporal_spatialthing_segments()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        PERFORM spatiotemporal_trajectory_segments(NEW.id, NEW.trajectory);
+        RETURN NULL;
+    END;
+    $$
+"""
+
+TRIGGERS = {
+    "insert": "AFTER INSERT ON spatiotemporal_spatialthing FOR EACH ROW",
+}
+
+# Recomputed all segments on every change of a trajectory, replaced by
+# `splice` and `refresh`.
+OBSOLETE_TRIGGERS = ["update"]
+
+DROP_TRIGGER = """
+    DROP TRIGGER IF EXISTS spatiotemporal_spatialthing_{event}_segments
+    ON spatiotemporal_spatialthing
+"""
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER spatiotemporal_spatialthing_{event}_segments
+    {when}
+    EXECUTE FUNCTION spatiotemporal_spatialthing_segments()
+"""
+
+REFRESH = """
+    SELECT spatiotemporal_trajectory_segments(id, trajectory)
+    FROM spatiotemporal_spatialthing
+    WHERE id = ANY(%(things)s::bigint[])
+"""
+
+REFRESH_ALL = """
+    SELECT spatiotemporal_trajectory_segments(id, trajectory)
+    FROM spatiotemporal_spatialthing
+"""
+
+
+def vertices() -> int:
+    """The maximum number of vertices of a segment."""
+    count = getattr(
+        settings, "SPATIOTEMPORAL_TRAJECTORY_SEGMENT_VERTICES", DEFAULT_VERTICES
+    )
+    if int(count) < 2:
+        raise ImproperlyConfigured(
+            "SPATIOTEMPORAL_TRAJECTORY_SEGMENT_VERTICES must be at least 2."
+        )
+    return int(count)
+
+
+def install_triggers(connection):
+    """Install the functions and triggers maintaining the segments."""
+    with connection.cursor() as cursor:
+        # A segment of `vertices` vertices spans `vertices - 1` steps.
+        cursor.execute(FUNCTION.format(vertices=vertices() - 1))
+        cursor.execute(SPLICE_FUNCTION.format(vertices=vertices()))
+        cursor.execute(TRIGGER_FUNCTION)
+        for event in OBSOLETE_TRIGGERS:
+            cursor.execute(DROP_TRIGGER.format(event=event))
+        for event, when in TRIGGERS.items():
+            cursor.execute(DROP_TRIGGER.format(event=event))
+            cursor.execute(CREATE_TRIGGER.format(event=event, when=when))
+
+
+def uninstall_triggers(connection):
+    """Remove the triggers and functions maintaining the segments."""
+    with connection.cursor() as cursor:
+        for event in [*TRIGGERS, *OBSOLETE_TRIGGERS]:
+            cursor.execute(DROP_TRIGGER.format(event=event))
+        cursor.execute("DROP FUNCTION IF EXISTS spatiotemporal_spatialthing_segments()")
+        cursor.execute(
+            "DROP FUNCTION IF EXISTS "
+            "spatiotemporal_trajectory_segments(bigint, geometry)"
+        )
+        cursor.execute(
+            "DROP FUNCTION IF EXISTS spatiotemporal_trajectory_segment_vertex("
+            "bigint, double precision, geometry, double precision)"
+        )
+
+
+def refresh(things: Iterable[int], using: str = DEFAULT_DB_ALIAS):
+    """Recompute the segments of spatial things from their trajectories."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(REFRESH, {"things": list(things)})
+
+
+def splice(
+    thing: int,
+    timestamp: float,
+    vertex: Optional[str] = None,
+    neighbour: Optional[float] = None,
+    using: str = DEFAULT_DB_ALIAS,
+):
+    """Splice a vertex of a trajectory into, or out of, its segments.
+
+    Inserts the `vertex` at `timestamp` next to the vertex at `neighbour`,
+    replaces it if there is no `neighbour`, or removes it if there is no
+    `vertex`. Recomputes all segments of the thing if that is not possible.
+    """
+    params = {
+        "thing": thing,
+        "timestamp": timestamp,
+        "vertex": vertex,
+        "neighbour": neighbour,
+    }
+    with connections[using].cursor() as cursor:
+        cursor.execute(SPLICE, params)
+        (spliced,) = cursor.fetchone()
+    if not spliced:
+        refresh([thing], using)
+
+
+def refresh_all(connection):
+    """Recompute the segments of all spatial things."""
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_ALL)
@@ -6,49 +6,267 @@ manipulating the Django models represented by JSON.
 https://www.django-rest-framework.org/api-guide/serializers/
 """
 
+from math import isfinite
+from typing import Optional
+
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
+from spatiotemporal import schemas
 from spatiotemporal.models import (
+    BOX_FIELDS,
     Coverage,
     Extent,
     Measurement,
+    ProximityJob,
     SpatialThing,
     TimeUnit,
     Universe,
 )
 
 
-class TimeUnitSerializer(serializers.ModelSerializer):
+def sparse_fields(
+    request, names: list[str], expandable: list[str]
+) -> tuple[list[str], list[str]]:
+    """The fields selected by a request and the relations to expand.
+
+    Fields are selected by `?fields=id,name` and `?omit=trajectory`, and
+    relations are expanded by `?expand=universe`. Only responses to safe
+    methods are sparse, so that writes keep all their fields.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return names, []
+
+    def parse(param: str, allowed: list[str]) -> Optional[list[str]]:
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        keys = [key.strip() for key in value.split(",") if key.strip()]
+        unknown = [key for key in keys if key not in allowed]
+        if unknown:
+            raise serializers.ValidationError(
+                {param: [f"Unknown fields: {', '.join(unknown)}."]}
+            )
+        return keys
+
+    fields = parse("fields", names)
+    omit = parse("omit", names) or []
+    expand = parse("expand", expandable) or []
+    selected = [
+        name
+        for name in names
+        if (fields is None or name in fields) and name not in omit
+    ]
+    return selected, [name for name in expand if name in selected]
+
+
+class SparseFieldsMixin:
+    """Drops the fields not selected by the request, see `sparse_fields`.
+
+    Expanded relations are nested with their serializer in
+    `expandable_fields` instead of being represented by their primary key.
+    """
+
+    expandable_fields: dict[str, type[serializers.Serializer]] = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = sparse_fields(
+            self.context.get("request"), list(self.fields), list(self.expandable_fields)
+        )
+        for name in list(self.fields):
+            if name not in fields:
+                self.fields.pop(name)
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+
+
+class BoxField(serializers.Field):
+    """A 3D bounding box as `[xmin, ymin, zmin, xmax, ymax, zmax]`.
+
+    Reads and writes the box columns of extents and measurements directly,
+    see `boxes`, rather than a single model field.
+    """
+
+    default_error_messages = {
+        "invalid": "Expected a list of 6 finite numbers.",
+        "inverted": "Expected minima not greater than their maxima.",
+    }
+
+    # The model fields read and written, deferred by sparse fieldsets.
+    columns = BOX_FIELDS
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        box = [getattr(instance, name) for name in self.columns]
+        return None if None in box else box
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or len(data) != len(self.columns):
+            self.fail("invalid")
+        if not all(
+            isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and isfinite(value)
+            for value in data
+        ):
+            self.fail("invalid")
+        box = [float(value) for value in data]
+        if any(low > high for low, high in zip(box[:3], box[3:])):
+            self.fail("inverted")
+        return dict(zip(self.columns, box))
+
+
+class GeometryOrBoxMixin:
+    """Stores either a geometry or, instead of one, a compact `box`.
+
+    A geometry takes precedence, and the database stores its bounding box
+    as the box, see `boxes`. Giving only a box clears the geometry.
+    """
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        has_box = BOX_FIELDS[0] in attrs
+        if attrs.get("geometry") is not None:
+            for name in BOX_FIELDS:
+                attrs.pop(name, None)
+        elif has_box:
+            attrs["geometry"] = None
+        elif "geometry" in attrs or self.instance is None:
+            raise serializers.ValidationError(
+                {"geometry": ["Either a geometry or a box is required."]}
+            )
+        return attrs
+
+    def save(self, **kwargs):
+        instance = super().save(**kwargs)
+        # The box of a geometry is only known to the database.
+        if instance.geometry is not None:
+            instance.refresh_from_db(fields=BOX_FIELDS)
+        return instance
+
+
+class PropertiesSchemaMixin:
+    """Validates that `properties_schema` is a valid JSON Schema."""
+
+    def validate_properties_schema(self, value):
+        try:
+            schemas.validator(value)
+        except ValueError as error:
+            raise serializers.ValidationError(f"Invalid JSON Schema: {error}")
+        return value
+
+
+class ValidatedPropertiesMixin:
+    """Validates `properties` against the JSON Schema of `schema_owner`."""
+
+    schema_owner: str
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        owner = attrs.get(self.schema_owner)
+        if owner is None and self.instance is not None:
+            owner = getattr(self.instance, self.schema_owner)
+        if "properties" in attrs:
+            properties = attrs["properties"]
+        elif self.instance is not None:
+            properties = self.instance.properties
+        else:
+            # Created without properties, which are then the model default.
+            field = self.Meta.model._meta.get_field("properties")
+            properties = field.get_default()
+        if owner is not None:
+            messages = schemas.errors(owner.properties_schema, properties)
+            if messages:
+                raise serializers.ValidationError({"properties": messages})
+        return attrs
+
+
+class TimeUnitSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = TimeUnit
         fields = "__all__"
 
 
-class UniverseSerializer(serializers.ModelSerializer):
+class UniverseSerializer(
+    SparseFieldsMixin, PropertiesSchemaMixin, serializers.ModelSerializer
+):
     class Meta:
         model = Universe
         fields = "__all__"
 
 
-class SpatialThingSerializer(serializers.ModelSerializer):
+class SpatialThingSerializer(
+    SparseFieldsMixin, ValidatedPropertiesMixin, serializers.ModelSerializer
+):
+    schema_owner = "universe"
+    expandable_fields = {"universe": UniverseSerializer}
+
+    def to_representation(self, instance):
+        # A simplified trajectory may have been loaded instead of the full one.
+        if hasattr(instance, "simplified_trajectory"):
+            instance.trajectory = instance.simplified_trajectory
+        return super().to_representation(instance)
+
     class Meta:
         model = SpatialThing
-        fields = "__all__"
+        exclude = ["levels_stale"]
+
 
+class ExtentSerializer(
+    SparseFieldsMixin, GeometryOrBoxMixin, serializers.ModelSerializer
+):
+    expandable_fields = {"thing": SpatialThingSerializer}
+    box = BoxField(required=False)
 
-class ExtentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Extent
-        fields = "__all__"
+        exclude = BOX_FIELDS
 
 
-class CoverageSerializer(serializers.ModelSerializer):
+class CoverageSerializer(
+    SparseFieldsMixin, PropertiesSchemaMixin, serializers.ModelSerializer
+):
+    expandable_fields = {"universe": UniverseSerializer}
+
     class Meta:
         model = Coverage
         fields = "__all__"
 
 
-class MeasurementSerializer(serializers.ModelSerializer):
+class MeasurementSerializer(
+    SparseFieldsMixin,
+    ValidatedPropertiesMixin,
+    GeometryOrBoxMixin,
+    serializers.ModelSerializer,
+):
+    schema_owner = "coverage"
+    expandable_fields = {"coverage": CoverageSerializer}
+    box = BoxField(required=False)
+
     class Meta:
         model = Measurement
+        exclude = BOX_FIELDS
+
+
+class ProximityJobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"universe": UniverseSerializer}
+
+    def validate_distance(self, value):
+        if not isfinite(value) or value < 0:
+            raise serializers.ValidationError("Expected a distance of at least 0.")
+        return value
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        start, end = attrs.get("start"), attrs.get("end")
+        if start is not None and end is not None and start > end:
+            raise serializers.ValidationError({"end": ["Expected end after start."]})
+        return attrs
+
+    class Meta:
+        model = ProximityJob
         fields = "__all__"
@@ -5,43 +5,170 @@ for handling signals.
 
 https://docs.djangoproject.com/en/4.0/topics/signals/
 """
-from django.contrib.postgres.expressions import ArraySubquery  # type: ignore
-from django.db.models import F
-
-from spatiotemporal.db.functions import (
-    Box3D,
-    MakeLine,
-    MakePoint,
-    XMax,
-    XMin,
-    YMax,
-    YMin,
-    ZMax,
-    ZMin,
+import time
+
+from django.db import connections, transaction
+from django.db.models.signals import post_delete
+
+from spatiotemporal import caching, levels, segments, tiles, trajectories
+from spatiotemporal.models import (
+    BOX_FIELDS,
+    Coverage,
+    Extent,
+    Measurement,
+    SpatialThing,
+    TimeUnit,
+    Universe,
+    planar_extent,
 )
-from spatiotemporal.models import Extent, SpatialThing
+
+# The models whose responses are cached.
+CACHED = {TimeUnit, Universe, Coverage, SpatialThing}
 
 
 def update_trajectory(sender, instance: Extent, **kwargs):
-    """Update `SpatialThing.trajectory` when `Extent` is changed."""
-    if sender is Extent:
-        SpatialThing.objects.filter(pk=instance.thing_id).update(
-            trajectory=MakeLine(
-                ArraySubquery(
-                    (
-                        Extent.objects.filter(thing_id=instance.thing_id)
-                        .order_by("timestamp")
-                        .annotate(
-                            bbox=Box3D("geometry"),
-                            point=MakePoint(
-                                (XMin("bbox") + XMax("bbox")) / 2,
-                                (YMin("bbox") + YMax("bbox")) / 2,
-                                (ZMin("bbox") + ZMax("bbox")) / 2,
-                                F("timestamp"),
-                            ),
-                        )
-                        .values("point")
-                    )
-                )
-            )
-        )
+    """Update `SpatialThing.trajectory` when `Extent` is changed.
+
+    Only the vertex of the changed extent is spliced into the trajectory.
+    The trajectory is rebuilt from all extents of the thing when the extent
+    moved to another thing or timestamp, or when splicing is not possible.
+    Inside `trajectories.deferred()` the thing is only collected.
+    """
+    if sender is not Extent:
+        return
+
+    start = time.perf_counter()
+    _update_trajectory(instance, **kwargs)
+    trajectories.trajectory_updated.send(
+        sender=Extent,
+        instance=instance,
+        using=kwargs["using"],
+        duration=time.perf_counter() - start,
+    )
+
+
+def _update_trajectory(instance: Extent, **kwargs):
+    using = kwargs["using"]
+    current = (instance.thing_id, instance.timestamp)
+    stored = getattr(instance, "_stored_vertex", None)
+    things = {current[0]} if stored is None else {current[0], stored[0]}
+
+    if trajectories.collect(things, using=using):
+        instance._stored_vertex = current
+        return
+
+    if kwargs["signal"] is post_delete:
+        thing, timestamp = stored or current
+        if not trajectories.remove_vertex(thing, timestamp, using=using):
+            trajectories.rebuild([thing], using=using)
+        return
+
+    if kwargs["created"] or stored is None:
+        spliced = trajectories.insert_vertex(instance.pk, using=using)
+    elif stored == current:
+        spliced = trajectories.set_vertex(instance.pk, using=using)
+    else:
+        spliced = False
+
+    if not spliced:
+        trajectories.rebuild(things, using=using)
+    instance._stored_vertex = current
+
+
+def refresh_levels(sender, instance, **kwargs):
+    """Refresh the levels of the things of a changed `Extent` once committed.
+
+    Skipped inside `trajectories.deferred()`, which refreshes the levels of
+    all its things at once. Must be connected before `update_trajectory`,
+    which updates the stored thing of the extent.
+    """
+    if sender is not Extent or trajectories.is_deferred():
+        return
+
+    using = kwargs["using"]
+    stored = getattr(instance, "_stored_vertex", None)
+    things = {instance.thing_id, *(stored[:1] if stored else ())}
+    transaction.on_commit(lambda: _refresh_levels(things, using), using=using)
+
+
+def _refresh_levels(things: set[int], using: str):
+    refreshed = levels.refresh_stale(len(things), things, using=using)
+    caching.invalidate(SpatialThing, refreshed, using=using)
+
+
+def invalidate_tiles(sender, instance, **kwargs):
+    """Invalidate the tiles of a changed `Extent` or `Measurement`.
+
+    Covers the footprints of both the new and the stored geometry or box.
+    """
+    if sender not in {Extent, Measurement}:
+        return
+
+    extent = planar_extent(
+        instance.geometry, [getattr(instance, name) for name in BOX_FIELDS]
+    )
+    stored = getattr(instance, "_stored_extent", None)
+    universe = _universe(instance, using=kwargs["using"])
+    tiles.invalidate([extent, stored], universe, using=kwargs["using"])
+    instance._stored_extent = extent
+
+
+def _universe(instance, using):
+    """The universe of an `Extent` or `Measurement`, or None if it is gone.
+
+    Read from the thing or coverage if it is cached. Otherwise it is looked
+    up once per parent and remembered on the instance for later writes.
+    """
+    field = Extent.thing if isinstance(instance, Extent) else Measurement.coverage
+    if field.is_cached(instance):
+        return getattr(instance, field.field.name).universe_id
+    parent = getattr(instance, field.field.attname)
+    stored = getattr(instance, "_stored_universe", None)
+    if stored is not None and stored[0] == parent:
+        return stored[1]
+    universe = (
+        field.field.related_model.objects.using(using)
+        .filter(pk=parent)
+        .values_list("universe_id", flat=True)
+        .first()
+    )
+    instance._stored_universe = (parent, universe)
+    return universe
+
+
+def invalidate_responses(sender, instance, **kwargs):
+    """Invalidate the cached responses of a changed object.
+
+    A changed `Extent` invalidates the spatial things whose trajectory it
+    changes. Must be connected before `update_trajectory`, which updates
+    the stored thing of the extent.
+    """
+    using = kwargs["using"]
+    if sender in CACHED:
+        caching.invalidate(sender, [instance.pk], using=using)
+    elif sender is Extent:
+        stored = getattr(instance, "_stored_vertex", None)
+        things = {instance.thing_id, *(stored[:1] if stored else ())}
+        caching.invalidate(SpatialThing, things, using=using)
+
+
+def invalidate_trajectories(sender, things: set[int], using: str, **kwargs):
+    """Invalidate the cached responses of spatial things with new trajectories."""
+    caching.invalidate(SpatialThing, things, using=using)
+
+
+def sync_trajectory_triggers(sender, using: str, **kwargs):
+    """Install or remove the trajectory triggers after migrating.
+
+    Also reinstalls the triggers maintaining the trajectory levels and
+    segments, which picks up changes of the configured levels and size of
+    segments.
+    """
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    if "spatiotemporal_extent" in tables:
+        trajectories.sync_triggers(connection)
+    if "spatiotemporal_trajectorylevel" in tables:
+        levels.install_triggers(connection)
+    if "spatiotemporal_trajectorysegment" in tables:
+        segments.install_triggers(connection)
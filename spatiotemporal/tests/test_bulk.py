@@ -0,0 +1,121 @@
+"""Bulk ingestion tests.
+
+This module contains tests asserting that the `COPY` loaders create the
+valid rows of a batch and report the others by their index, see `bulk`.
+"""
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.test import TestCase
+
+from spatiotemporal.bulk import ExtentLoader, MeasurementLoader
+from spatiotemporal.models import (
+    Coverage,
+    Extent,
+    Measurement,
+    SpatialThing,
+    TimeUnit,
+    Universe,
+)
+
+POINT = "POINT Z (1 2 3)"
+
+
+class BulkLoaderTests(TestCase):
+    def setUp(self):
+        timeunit = TimeUnit.objects.create(name="second")
+        universe = Universe.objects.create(timeunit=timeunit)
+        self.thing = SpatialThing.objects.create(universe=universe)
+        self.coverage = Coverage.objects.create(
+            universe=universe,
+            properties_schema={"type": "object", "required": ["value"]},
+        )
+
+    def errors(self, result) -> dict[int, set[str]]:
+        return {error["index"]: set(error["errors"]) for error in result.errors}
+
+    def test_extents(self):
+        result = ExtentLoader().load(
+            [
+                {"thing": self.thing.pk, "timestamp": 1, "geometry": POINT},
+                {"thing": self.thing.pk, "timestamp": 2, "box": [0, 0, 0, 1, 1, 1]},
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [1, 2, 3]},
+                    "properties": {"thing": self.thing.pk, "timestamp": 3},
+                },
+            ]
+        )
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(Extent.objects.filter(thing=self.thing).count(), 3)
+        self.assertTrue(
+            SpatialThing.objects.filter(
+                pk=self.thing.pk, trajectory__isnull=False
+            ).exists()
+        )
+
+    def test_invalid_rows(self):
+        Extent.objects.create(
+            thing=self.thing, timestamp=0, geometry=GEOSGeometry(POINT, srid=0)
+        )
+        result = ExtentLoader().load(
+            [
+                {"thing": self.thing.pk, "timestamp": 1, "geometry": POINT},
+                {"thing": self.thing.pk, "timestamp": 1, "geometry": POINT},
+                {"thing": self.thing.pk, "timestamp": 0, "geometry": POINT},
+                {"thing": 0, "timestamp": 2, "geometry": POINT},
+                {"thing": self.thing.pk, "timestamp": 2**31, "geometry": POINT},
+                {"thing": self.thing.pk, "timestamp": 3, "geometry": "POINT (1 2)"},
+                {"thing": self.thing.pk, "timestamp": 4, "box": [1, 0, 0, 0, 1, 1]},
+                "extent",
+            ]
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(
+            self.errors(result),
+            {
+                1: {"timestamp"},
+                2: {"timestamp"},
+                3: {"thing"},
+                4: {"timestamp"},
+                5: {"geometry"},
+                6: {"box"},
+                7: {"non_field_errors"},
+            },
+        )
+
+    def test_nul(self):
+        result = ExtentLoader().load(
+            [
+                {
+                    "thing": self.thing.pk,
+                    "timestamp": 1,
+                    "geometry": POINT,
+                    "metadata": {"label": "a\x00b"},
+                },
+                {"thing": self.thing.pk, "timestamp": 2, "geometry": POINT},
+            ]
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(self.errors(result), {0: {"metadata"}})
+
+    def test_measurement_schema(self):
+        result = MeasurementLoader().load(
+            [
+                {
+                    "coverage": self.coverage.pk,
+                    "timestamp": 1,
+                    "geometry": POINT,
+                    "properties": {"value": 1},
+                },
+                {
+                    "coverage": self.coverage.pk,
+                    "timestamp": 2,
+                    "geometry": POINT,
+                    "properties": {},
+                },
+            ]
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(self.errors(result), {1: {"properties"}})
+        self.assertEqual(Measurement.objects.filter(coverage=self.coverage).count(), 1)
@@ -0,0 +1,67 @@
+"""Response caching tests.
+
+This module contains tests asserting that cached responses are served
+with their `ETag` until a write they depend on commits, see `caching`.
+"""
+
+from django.contrib.gis.geos import Point
+from rest_framework.test import APITestCase
+
+from spatiotemporal import caching
+from spatiotemporal.models import Coverage, Extent, SpatialThing, TimeUnit, Universe
+
+
+class CachedResponseTests(APITestCase):
+    def setUp(self):
+        caching.cache().clear()
+        timeunit = TimeUnit.objects.create(name="second")
+        self.universe = Universe.objects.create(timeunit=timeunit, name="a")
+        self.thing = SpatialThing.objects.create(universe=self.universe)
+
+    def get(self, url: str, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def rename(self, name: str):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.universe.name = name
+            self.universe.save()
+
+    def test_etag(self):
+        response = self.get(f"/universes/{self.universe.pk}/")
+        etag = response["ETag"]
+        self.assertEqual(self.get(f"/universes/{self.universe.pk}/")["ETag"], etag)
+        response = self.client.get(
+            f"/universes/{self.universe.pk}/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_save(self):
+        detail = self.get(f"/universes/{self.universe.pk}/")
+        listed = self.get("/universes/")
+        self.rename("b")
+        self.assertEqual(
+            self.get(f"/universes/{self.universe.pk}/").json()["name"], "b"
+        )
+        self.assertNotEqual(self.get("/universes/")["ETag"], listed["ETag"])
+        self.assertNotEqual(
+            self.get(f"/universes/{self.universe.pk}/")["ETag"], detail["ETag"]
+        )
+
+    def test_extent(self):
+        url = f"/spatialthings/{self.thing.pk}/"
+        etag = self.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Extent.objects.create(
+                thing=self.thing, timestamp=0, geometry=Point(0, 0, 0, srid=0)
+            )
+        self.assertNotEqual(self.get(url)["ETag"], etag)
+
+    def test_expand(self):
+        coverage = Coverage.objects.create(universe=self.universe)
+        url = f"/coverages/{coverage.pk}/"
+        self.get(url, expand="universe")
+        self.rename("b")
+        response = self.get(url, expand="universe")
+        self.assertEqual(response.json()["universe"]["name"], "b")
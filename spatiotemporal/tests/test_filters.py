@@ -0,0 +1,70 @@
+"""Filter backend tests.
+
+This module contains tests asserting that the filters of extents and
+measurements are answered from their indexes, by the plans of their
+queries. Sequential scans are disabled, so that the plans of the empty
+test tables use an index whenever one applies.
+
+https://www.postgresql.org/docs/current/using-explain.html
+"""
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from spatiotemporal.views import ExtentViewSet, MeasurementViewSet
+
+POLYGON = "POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))"
+
+GEOJSON = (
+    '{"type": "Polygon", '
+    '"coordinates": [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]}'
+)
+
+
+class IndexUsageTests(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def plan(self, viewset, **params) -> str:
+        request = Request(APIRequestFactory().get("/", params))
+        view = viewset(
+            request=request, args=(), kwargs={}, format_kwarg=None, action="list"
+        )
+        return view.filter_queryset(view.get_queryset()).explain()
+
+    def test_extent_bbox(self):
+        plan = self.plan(ExtentViewSet, bbox="0,0,0,10,10,10")
+        self.assertIn("extent_box_idx", plan)
+
+    def test_extent_2d_bbox(self):
+        plan = self.plan(ExtentViewSet, bbox="0,0,10,10")
+        self.assertIn("extent_box_idx", plan)
+
+    def test_extent_intersects(self):
+        plan = self.plan(ExtentViewSet, intersects=POLYGON)
+        self.assertIn("extent_box_idx", plan)
+
+    def test_extent_timestamp(self):
+        plan = self.plan(ExtentViewSet, timestamp="0,10")
+        self.assertIn("extent_timestamp_id_idx", plan)
+
+    def test_measurement_bbox(self):
+        plan = self.plan(MeasurementViewSet, bbox="0,0,0,10,10,10")
+        self.assertIn("measurement_box_idx", plan)
+
+    def test_measurement_intersects_geojson(self):
+        plan = self.plan(MeasurementViewSet, intersects=GEOJSON)
+        self.assertIn("measurement_box_idx", plan)
+        self.assertNotIn("st_transform", plan.lower())
+
+    def test_measurement_timestamp(self):
+        plan = self.plan(MeasurementViewSet, timestamp="0,10")
+        self.assertIn("measurement_timestamp_id_idx", plan)
+
+    def test_intersects_srid(self):
+        with self.assertRaises(ValidationError):
+            self.plan(ExtentViewSet, intersects=f"SRID=4326;{POLYGON}")
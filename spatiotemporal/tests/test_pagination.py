@@ -0,0 +1,64 @@
+"""Pagination tests.
+
+This module contains tests asserting that keyset pagination walks a list
+page by page in both directions, without skipping or repeating objects,
+see `pagination`.
+"""
+
+from base64 import urlsafe_b64encode
+
+import orjson
+from django.contrib.gis.geos import Point
+from rest_framework.test import APITestCase
+
+from spatiotemporal.models import Extent, SpatialThing, TimeUnit, Universe
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        timeunit = TimeUnit.objects.create(name="second")
+        universe = Universe.objects.create(timeunit=timeunit)
+        things = [SpatialThing.objects.create(universe=universe) for _ in range(2)]
+        # Extents sharing a timestamp are ordered by id.
+        for timestamp in (2, 0, 1):
+            for thing in things:
+                Extent.objects.create(
+                    thing=thing, timestamp=timestamp, geometry=Point(0, 0, 0, srid=0)
+                )
+        self.ordered = list(
+            Extent.objects.order_by("timestamp", "id").values_list("id", flat=True)
+        )
+
+    def page(self, url: str, **params) -> dict:
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def cursor(self, key) -> str:
+        return urlsafe_b64encode(orjson.dumps({"key": key})).decode()
+
+    def test_forward(self):
+        page = self.page("/extents/", page_size=4)
+        self.assertIsNone(page["previous"])
+        ids = [extent["id"] for extent in page["results"]]
+        page = self.page(page["next"])
+        self.assertIsNone(page["next"])
+        ids += [extent["id"] for extent in page["results"]]
+        self.assertEqual(ids, self.ordered)
+
+    def test_backward(self):
+        first = self.page("/extents/", page_size=2)
+        second = self.page(first["next"])
+        self.assertEqual(self.page(second["previous"])["results"], first["results"])
+        third = self.page(second["next"])
+        self.assertEqual(self.page(third["previous"])["results"], second["results"])
+
+    def test_invalid_cursor(self):
+        for cursor in (
+            "x",
+            self.cursor([0]),
+            self.cursor([0, "x"]),
+            self.cursor([0, 2**63]),
+        ):
+            response = self.client.get("/extents/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 404)
@@ -0,0 +1,197 @@
+"""Trajectory tests.
+
+This module contains tests asserting that the trajectories maintained
+while extents are written equal the ones rebuilt from all extents of their
+spatial things, see `trajectories`.
+"""
+
+from typing import Optional
+
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
+
+from spatiotemporal import signals, trajectories
+from spatiotemporal.models import Extent, SpatialThing, TimeUnit, Universe
+
+TRAJECTORY = """
+    SELECT ST_AsText(trajectory) FROM spatiotemporal_spatialthing WHERE id = %s
+"""
+
+
+class TrajectoryTestCase(TestCase):
+    def setUp(self):
+        timeunit = TimeUnit.objects.create(name="second")
+        self.universe = Universe.objects.create(timeunit=timeunit)
+        self.thing = SpatialThing.objects.create(universe=self.universe)
+
+    def extent(self, timestamp: int, x: float = 0, thing=None) -> Extent:
+        return Extent.objects.create(
+            thing=thing or self.thing,
+            timestamp=timestamp,
+            geometry=Point(x, x, x, srid=0),
+        )
+
+    def trajectory(self, thing=None) -> Optional[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(TRAJECTORY, [(thing or self.thing).pk])
+            return cursor.fetchone()[0]
+
+    def assertRebuilt(self, thing=None):
+        """Assert that rebuilding leaves the stored trajectory as it is."""
+        stored = self.trajectory(thing)
+        trajectories.rebuild([(thing or self.thing).pk])
+        self.assertEqual(stored, self.trajectory(thing))
+
+
+class SpliceTests(TrajectoryTestCase):
+    def test_append(self):
+        for timestamp in range(4):
+            self.extent(timestamp, x=timestamp)
+            self.assertRebuilt()
+        self.assertIsNotNone(self.trajectory())
+
+    def test_insert_first(self):
+        self.extent(2, x=2)
+        self.extent(3, x=3)
+        self.extent(1, x=1)
+        self.assertRebuilt()
+
+    def test_insert_middle(self):
+        self.extent(1, x=1)
+        self.extent(3, x=3)
+        self.extent(2, x=2)
+        self.assertRebuilt()
+
+    def test_move_timestamp(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(4)]
+        extent = Extent.objects.get(pk=extents[1].pk)
+        extent.timestamp = 5
+        extent.save()
+        self.assertRebuilt()
+
+    def test_move_thing(self):
+        other = SpatialThing.objects.create(universe=self.universe)
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        self.extent(1, thing=other)
+        extent = Extent.objects.get(pk=extents[2].pk)
+        extent.thing = other
+        extent.save()
+        self.assertRebuilt()
+        self.assertRebuilt(other)
+
+    def test_update_geometry(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        for extent in extents:
+            extent = Extent.objects.get(pk=extent.pk)
+            extent.geometry = Point(5, 5, 5, srid=0)
+            extent.save()
+            self.assertRebuilt()
+
+    def test_delete_first(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        extents[0].delete()
+        self.assertRebuilt()
+
+    def test_delete_middle(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        extents[1].delete()
+        self.assertRebuilt()
+
+    def test_delete_last(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        extents[2].delete()
+        self.assertRebuilt()
+
+    def test_delete_to_empty(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        for extent in extents:
+            extent.delete()
+            self.assertRebuilt()
+        self.assertIsNone(self.trajectory())
+
+
+class DeferredTests(TrajectoryTestCase):
+    def test_rebuilt_on_exit(self):
+        with trajectories.deferred():
+            extents = [self.extent(timestamp, x=timestamp) for timestamp in range(4)]
+            extents[1].delete()
+            extent = Extent.objects.get(pk=extents[2].pk)
+            extent.timestamp = 5
+            extent.save()
+            self.assertIsNone(self.trajectory())
+        self.assertIsNotNone(self.trajectory())
+        self.assertRebuilt()
+        self.thing.refresh_from_db()
+        self.assertFalse(self.thing.levels_stale)
+
+    def test_nested(self):
+        with trajectories.deferred():
+            with trajectories.deferred():
+                self.extent(1)
+            self.assertIsNone(self.trajectory())
+            self.extent(2)
+        self.assertRebuilt()
+
+    def test_bulk_create(self):
+        Extent.objects.bulk_create(
+            Extent(
+                thing=self.thing, timestamp=timestamp, geometry=Point(0, 0, 0, srid=0)
+            )
+            for timestamp in range(3)
+        )
+        self.assertIsNotNone(self.trajectory())
+        self.assertRebuilt()
+
+    def test_update(self):
+        for timestamp in range(3):
+            self.extent(timestamp, x=timestamp)
+        Extent.objects.filter(timestamp=1).update(timestamp=5)
+        self.assertRebuilt()
+
+
+@override_settings(SPATIOTEMPORAL_TRAJECTORY_BACKEND="trigger")
+class TriggerTests(TrajectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        for signal in (post_save, post_delete):
+            if signal.disconnect(signals.update_trajectory):
+                self.addCleanup(signal.connect, signals.update_trajectory)
+        trajectories.install_triggers(connection)
+
+    def test_insert(self):
+        for timestamp in (2, 0, 3, 1):
+            self.extent(timestamp, x=timestamp)
+            self.assertRebuilt()
+
+    def test_update(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        extent = Extent.objects.get(pk=extents[1].pk)
+        extent.timestamp = 5
+        extent.geometry = Point(5, 5, 5, srid=0)
+        extent.save()
+        self.assertRebuilt()
+
+    def test_move_thing(self):
+        other = SpatialThing.objects.create(universe=self.universe)
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        Extent.objects.filter(pk=extents[0].pk).update(thing=other)
+        self.assertRebuilt()
+        self.assertRebuilt(other)
+
+    def test_delete_to_empty(self):
+        extents = [self.extent(timestamp, x=timestamp) for timestamp in range(3)]
+        extents[1].delete()
+        self.assertRebuilt()
+        Extent.objects.filter(thing=self.thing).delete()
+        self.assertIsNone(self.trajectory())
+
+    def test_raw_sql(self):
+        self.extent(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE spatiotemporal_extent SET timestamp = 1 WHERE thing_id = %s",
+                [self.thing.pk],
+            )
+        self.assertRebuilt()
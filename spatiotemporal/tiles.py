@@ -0,0 +1,292 @@
+"""Vector tiles.
+
+This module contains the rendering and caching of Mapbox Vector Tiles of
+the extents and measurements of a universe. Tiles are encoded by PostGIS
+with `ST_AsMVT` on a grid spanning `SPATIOTEMPORAL_TILE_BOUNDS`.
+
+Rendered tiles are cached by `SPATIOTEMPORAL_TILE_CACHE`. Every tile has
+a version counter in the cache that is part of the key of its cached
+renderings. Changing a geometry increments the versions of the tiles in
+its footprint, at every cached zoom level, after the change is committed.
+Changes with a large footprint increment a generation counter shared by
+the tiles of their universe instead, and changes with an unknown footprint
+or universe one shared by all tiles.
+
+https://github.com/mapbox/vector-tile-spec
+"""
+
+import hashlib
+from math import floor, inf
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from spatiotemporal import versions
+
+# The bounds of the Web Mercator grid, as used by `ST_TileEnvelope`.
+WEB_MERCATOR = (
+    -20037508.342789244,
+    -20037508.342789244,
+    20037508.342789244,
+    20037508.342789244,
+)
+
+# Tile coordinates in the tile's own space, and the margin around it.
+EXTENT = 4096
+BUFFER = 256
+
+# Invalidating more tiles than this increments a generation instead.
+MAX_INVALIDATED = 1024
+
+GENERATION = "tiles:generation"
+
+TILE = """
+    SELECT
+        envelope,
+        ST_MakeLine(
+            ST_MakePoint(
+                ST_XMin(envelope) - %(margin)s, ST_YMin(envelope) - %(margin)s, %(low)s
+            ),
+            ST_MakePoint(
+                ST_XMax(envelope) + %(margin)s, ST_YMax(envelope) + %(margin)s, %(high)s
+            )
+        ) AS box
+    FROM (
+        SELECT ST_TileEnvelope(
+            %(z)s, %(x)s, %(y)s,
+            ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 0)
+        ) AS envelope
+    ) AS e
+"""
+
+# The 2D geometry of a feature, or the envelope of the box stored instead.
+STORED_SHAPE = """
+    ST_Force2D(coalesce(
+        o.geometry,
+        ST_MakeEnvelope(o.box_xmin, o.box_ymin, o.box_xmax, o.box_ymax, 0)
+    ))
+"""
+
+LAYER = """
+    WITH tile AS ({tile})
+    SELECT ST_AsMVT(layer, %(name)s, %(extent)s, 'geom', 'id')
+    FROM (
+        SELECT
+            ST_AsMVTGeom(
+                {shape}, t.envelope, %(extent)s, %(buffer)s
+            ) AS geom,
+            o.id,
+            o.{parent},
+            o.timestamp{document}
+        FROM {table} AS o
+        JOIN {parent_table} AS p ON p.id = o.{parent}
+        CROSS JOIN tile AS t
+        WHERE {where}
+    ) AS layer
+    WHERE geom IS NOT NULL
+"""
+
+# The stored bounding box of a feature, as indexed, see `boxes`.
+STORED_BOX = """
+    ST_MakeLine(
+        ST_MakePoint(o.box_xmin, o.box_ymin, o.box_zmin),
+        ST_MakePoint(o.box_xmax, o.box_ymax, o.box_zmax)
+    )
+"""
+
+DOCUMENT = """,
+            (
+                SELECT jsonb_object_agg(key, value)
+                FROM jsonb_each(o.{document})
+                WHERE key = ANY(%(properties)s)
+            ) AS {document}"""
+
+# The layers of a tile, by name.
+LAYERS = {
+    "extents": {
+        "table": "spatiotemporal_extent",
+        "parent": "thing_id",
+        "parent_table": "spatiotemporal_spatialthing",
+        "document": "metadata",
+    },
+    "measurements": {
+        "table": "spatiotemporal_measurement",
+        "parent": "coverage_id",
+        "parent_table": "spatiotemporal_coverage",
+        "document": "properties",
+    },
+}
+
+
+def bounds() -> tuple[float, float, float, float]:
+    """The (xmin, ymin, xmax, ymax) bounds of tile 0/0/0."""
+    return tuple(getattr(settings, "SPATIOTEMPORAL_TILE_BOUNDS", None) or WEB_MERCATOR)
+
+
+def cache():
+    return caches[getattr(settings, "SPATIOTEMPORAL_TILE_CACHE", "default")]
+
+
+def timeout() -> Optional[int]:
+    return getattr(settings, "SPATIOTEMPORAL_TILE_CACHE_TIMEOUT", 3600)
+
+
+def max_zoom() -> int:
+    """The highest zoom level of cached tiles."""
+    return getattr(settings, "SPATIOTEMPORAL_TILE_CACHE_MAX_ZOOM", 18)
+
+
+def is_valid(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= 30 and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def render(
+    universe: int,
+    z: int,
+    x: int,
+    y: int,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    properties: Iterable[str] = (),
+    layers: Iterable[str] = LAYERS,
+    using: str = DEFAULT_DB_ALIAS,
+) -> bytes:
+    """Render a tile of the universe with features from `start` to `end`.
+
+    Features have their id, parent and timestamp as attributes, and the
+    listed `properties` of their metadata or properties.
+    """
+    xmin, ymin, xmax, ymax = bounds()
+    properties = list(properties)
+    params = {
+        "universe": universe,
+        "z": z,
+        "x": x,
+        "y": y,
+        "xmin": xmin,
+        "ymin": ymin,
+        "xmax": xmax,
+        "ymax": ymax,
+        "margin": (xmax - xmin) / 2**z * BUFFER / EXTENT,
+        "low": -inf,
+        "high": inf,
+        "extent": EXTENT,
+        "buffer": BUFFER,
+        "start": start,
+        "end": end,
+        "properties": properties,
+    }
+    where = ["p.universe_id = %(universe)s", f"{STORED_BOX} &&& t.box"]
+    if start is not None:
+        where.append("o.timestamp >= %(start)s")
+    if end is not None:
+        where.append("o.timestamp <= %(end)s")
+
+    tile = b""
+    with connections[using].cursor() as cursor:
+        for name in layers:
+            layer = LAYERS[name]
+            document = DOCUMENT.format(**layer) if properties else ""
+            sql = LAYER.format(
+                tile=TILE,
+                shape=STORED_SHAPE,
+                where=" AND ".join(where),
+                **{**layer, "document": document},
+            )
+            cursor.execute(sql, {**params, "name": name})
+            (data,) = cursor.fetchone()
+            tile += bytes(data or b"")
+    return tile
+
+
+def tile(universe: int, z: int, x: int, y: int, **options) -> bytes:
+    """Render a tile, or return it from the cache.
+
+    Tiles above the cached zoom levels are always rendered.
+    """
+    if z > max_zoom():
+        return render(universe, z, x, y, **options)
+
+    key = _version_key(z, x, y)
+    generation = _generation_key(universe)
+    current = versions.get(cache(), [GENERATION, generation, key])
+    digest = hashlib.sha1(repr(sorted(options.items())).encode()).hexdigest()
+    cached = (
+        f"tiles:{universe}:{z}:{x}:{y}:{current[GENERATION]}:{current[generation]}"
+        f":{current[key]}:{digest}"
+    )
+    data = cache().get(cached)
+    if data is None:
+        data = render(universe, z, x, y, **options)
+        cache().set(cached, data, timeout())
+    return data
+
+
+def footprint(
+    extent: tuple[float, float, float, float]
+) -> Iterator[tuple[int, int, int]]:
+    """The cached tiles that may render a geometry with a 2D extent."""
+    gxmin, gymin, gxmax, gymax = bounds()
+    xmin, ymin, xmax, ymax = extent
+    for z in range(max_zoom() + 1):
+        count = 2**z
+        size = (gxmax - gxmin) / count
+        margin = size * BUFFER / EXTENT
+        first_x = max(floor((xmin - margin - gxmin) / size), 0)
+        last_x = min(floor((xmax + margin - gxmin) / size), count - 1)
+        first_y = max(floor((gymax - ymax - margin) / size), 0)
+        last_y = min(floor((gymax - ymin + margin) / size), count - 1)
+        for x in range(first_x, last_x + 1):
+            for y in range(first_y, last_y + 1):
+                yield z, x, y
+
+
+def invalidate(
+    extents: Iterable[Optional[tuple[float, float, float, float]]],
+    universe: Optional[int] = None,
+    using: str = DEFAULT_DB_ALIAS,
+):
+    """Invalidate the tiles rendering geometries with these 2D extents.
+
+    Geometries belong to `universe`, whose tiles are all invalidated if the
+    footprint is too large, or to any universe if it is None.
+
+    Runs once the current transaction is committed, so that tiles are not
+    rendered from the old rows again in the meantime.
+    """
+    extents = [extent for extent in extents if extent is not None]
+    if extents:
+        transaction.on_commit(lambda: _invalidate(extents, universe), using=using)
+
+
+def invalidate_all(using: str = DEFAULT_DB_ALIAS):
+    """Invalidate all tiles, once the current transaction is committed."""
+    transaction.on_commit(
+        lambda: versions.increment(cache(), [GENERATION]), using=using
+    )
+
+
+def _invalidate(
+    extents: list[tuple[float, float, float, float]], universe: Optional[int]
+):
+    keys = set()
+    for extent in extents:
+        for z, x, y in footprint(extent):
+            keys.add(_version_key(z, x, y))
+            if len(keys) > MAX_INVALIDATED:
+                generation = GENERATION
+                if universe is not None:
+                    generation = _generation_key(universe)
+                versions.increment(cache(), [generation])
+                return
+    versions.increment(cache(), keys)
+
+
+def _generation_key(universe: int) -> str:
+    return f"{GENERATION}:{universe}"
+
+
+def _version_key(z: int, x: int, y: int) -> str:
+    return f"tiles:version:{z}:{x}:{y}"
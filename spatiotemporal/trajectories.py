@@ -0,0 +1,375 @@
+"""Trajectory materialization.
+
+This module contains the SQL used to materialize `SpatialThing.trajectory`
+from the extents of a spatial thing. Each extent contributes one vertex:
+the center of its 3D bounding box, measured (M) by its timestamp. The box is
+read from the columns storing it, see `boxes`, not from the geometry, so
+extents stored as a box rather than a geometry contribute alike.
+
+Vertices are ordered by timestamp, so the position of an extent's vertex is
+the number of extents of the same thing with an earlier timestamp. This
+allows splicing a single vertex instead of rebuilding the whole line. The
+splicing statements check the neighbouring vertices and update nothing if
+the stored trajectory does not agree with the extents, in which case the
+caller falls back to a full rebuild.
+
+Bulk writes should run inside `deferred()`. The things whose extents change
+inside the block are collected, and their trajectories and levels are
+rebuilt with set-based statements when the block completes.
+
+Alternatively, `SPATIOTEMPORAL_TRAJECTORY_BACKEND = "trigger"` maintains
+trajectories with statement-level triggers on `spatiotemporal_extent`.
+These also cover raw SQL, `QuerySet.update()` and `loaddata`. They are
+installed, or removed, after every `migrate`, see
+`signals.sync_trajectory_triggers`.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.dispatch import Signal
+
+from spatiotemporal import levels, segments
+
+# Sent with `things` and `using` by `changed()`, whichever way trajectories
+# are maintained, e.g. for invalidating cached spatial things.
+trajectories_changed = Signal()
+
+# Sent with `instance`, `using` and the `duration` in seconds after
+# `signals.update_trajectory` updated a trajectory for a saved extent.
+trajectory_updated = Signal()
+
+# The things collected per database by the innermost `deferred()` block.
+_dirty: ContextVar[Optional[dict[str, set[int]]]] = ContextVar(
+    "dirty_trajectories", default=None
+)
+
+# The extents, aliased as `e`.
+VERTICES = """
+    spatiotemporal_extent AS e
+"""
+
+# The trajectory vertex of the extent `e`, from its stored bounding box.
+VERTEX = """
+    ST_MakePoint(
+        (e.box_xmin + e.box_xmax) / 2,
+        (e.box_ymin + e.box_ymax) / 2,
+        (e.box_zmin + e.box_zmax) / 2,
+        e.timestamp
+    )
+"""
+
+# The number of extents of the thing `t` before the given timestamp.
+POSITION = """
+    (
+        SELECT count(*)
+        FROM spatiotemporal_extent AS p
+        WHERE p.thing_id = t.id AND p.timestamp < {timestamp}
+    )::integer
+"""
+EXTENT_POSITION = POSITION.format(timestamp="e.timestamp")
+DELETED_POSITION = POSITION.format(timestamp="%(timestamp)s")
+
+# Rebuilds the trajectories of the things in the bigint array `{things}`.
+REBUILD_THINGS = f"""
+    UPDATE spatiotemporal_spatialthing AS t
+    SET trajectory = r.trajectory
+    FROM (
+        SELECT
+            thing.id,
+            ST_MakeLine({VERTEX} ORDER BY e.timestamp)
+                FILTER (WHERE e.id IS NOT NULL) AS trajectory
+        FROM unnest({{things}}) AS thing(id)
+        LEFT JOIN ({VERTICES}) ON e.thing_id = thing.id
+        GROUP BY thing.id
+    ) AS r
+    WHERE t.id = r.id
+"""
+REBUILD = REBUILD_THINGS.format(things="%(things)s::bigint[]")
+
+# The splicing statements return the spliced thing, and the timestamp of the
+# spliced vertex, the vertex and that of a neighbouring vertex when they are
+# needed for splicing the segments of the thing, see `segments.splice`.
+INSERT_VERTEX = f"""
+    WITH spliced AS (
+        SELECT
+            t.id,
+            {VERTEX} AS vertex,
+            CASE
+                WHEN ST_M(ST_EndPoint(t.trajectory)) < e.timestamp
+                THEN ST_NPoints(t.trajectory)
+                ELSE {EXTENT_POSITION}
+            END AS position
+        FROM {VERTICES}
+        JOIN spatiotemporal_spatialthing AS t ON t.id = e.thing_id
+        WHERE e.id = %(extent)s
+    )
+    UPDATE spatiotemporal_spatialthing AS t
+    SET trajectory = ST_AddPoint(t.trajectory, s.vertex, s.position)
+    FROM spliced AS s
+    WHERE t.id = s.id
+    AND (
+        s.position = 0
+        OR ST_M(ST_PointN(t.trajectory, s.position)) < ST_M(s.vertex)
+    )
+    AND (
+        s.position = ST_NPoints(t.trajectory)
+        OR ST_M(ST_PointN(t.trajectory, s.position + 1)) > ST_M(s.vertex)
+    )
+    RETURNING
+        t.id,
+        ST_M(s.vertex),
+        s.vertex,
+        ST_M(
+            ST_PointN(
+                t.trajectory, CASE WHEN s.position = 0 THEN 2 ELSE s.position END
+            )
+        )
+"""
+
+SET_VERTEX = f"""
+    WITH spliced AS (
+        SELECT
+            t.id,
+            {VERTEX} AS vertex,
+            CASE
+                WHEN ST_M(ST_EndPoint(t.trajectory)) = e.timestamp
+                THEN ST_NPoints(t.trajectory) - 1
+                ELSE {EXTENT_POSITION}
+            END AS position
+        FROM {VERTICES}
+        JOIN spatiotemporal_spatialthing AS t ON t.id = e.thing_id
+        WHERE e.id = %(extent)s
+    )
+    UPDATE spatiotemporal_spatialthing AS t
+    SET trajectory = ST_SetPoint(t.trajectory, s.position, s.vertex)
+    FROM spliced AS s
+    WHERE t.id = s.id
+    AND ST_M(ST_PointN(t.trajectory, s.position + 1)) = ST_M(s.vertex)
+    RETURNING t.id, ST_M(s.vertex), s.vertex
+"""
+
+REMOVE_VERTEX = f"""
+    WITH spliced AS (
+        SELECT
+            t.id,
+            CASE
+                WHEN ST_M(ST_EndPoint(t.trajectory)) = %(timestamp)s
+                THEN ST_NPoints(t.trajectory) - 1
+                ELSE {DELETED_POSITION}
+            END AS position
+        FROM spatiotemporal_spatialthing AS t
+        WHERE t.id = %(thing)s
+    )
+    UPDATE spatiotemporal_spatialthing AS t
+    SET trajectory = ST_RemovePoint(t.trajectory, s.position)
+    FROM spliced AS s
+    WHERE t.id = s.id
+    AND ST_NPoints(t.trajectory) > 2
+    AND ST_M(ST_PointN(t.trajectory, s.position + 1)) = %(timestamp)s
+    RETURNING t.id, %(timestamp)s::double precision
+"""
+
+
+# Rebuilds the things changed by the statement, from its transition tables.
+TRIGGER_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION spatiotemporal_extent_trajectory()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        things bigint[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            things := ARRAY(SELECT DISTINCT thing_id FROM new_extents);
+        ELSIF TG_OP = 'DELETE' THEN
+            things := ARRAY(SELECT DISTINCT thing_id FROM old_extents);
+        ELSE
+            things := ARRAY(
+                SELECT DISTINCT unnest(ARRAY[o.thing_id, n.thing_id])
+                FROM old_extents AS o
+                JOIN new_extents AS n USING (id)
+                WHERE (
+                    o.thing_id, o.timestamp,
+                    o.box_xmin, o.box_ymin, o.box_zmin,
+                    o.box_xmax, o.box_ymax, o.box_zmax
+                ) IS DISTINCT FROM (
+                    n.thing_id, n.timestamp,
+                    n.box_xmin, n.box_ymin, n.box_zmin,
+                    n.box_xmax, n.box_ymax, n.box_zmax
+                )
+            );
+        END IF;
+        IF cardinality(things) > 0 THEN
+            {REBUILD_THINGS.format(things="things")};
+            PERFORM spatiotemporal_trajectory_segments(id, trajectory)
+            FROM spatiotemporal_spatialthing
+            WHERE id = ANY(things);
+        END IF;
+        RETURN NULL;
+    END;
+    $$
+"""
+
+TRIGGERS = {
+    "insert": "REFERENCING NEW TABLE AS new_extents",
+    "update": "REFERENCING OLD TABLE AS old_extents NEW TABLE AS new_extents",
+    "delete": "REFERENCING OLD TABLE AS old_extents",
+}
+
+DROP_TRIGGER = """
+    DROP TRIGGER IF EXISTS spatiotemporal_extent_{event}_trajectory
+    ON spatiotemporal_extent
+"""
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER spatiotemporal_extent_{event}_trajectory
+    AFTER {event} ON spatiotemporal_extent
+    {transitions}
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spatiotemporal_extent_trajectory()
+"""
+
+
+def backend() -> str:
+    """The configured way of maintaining trajectories.
+
+    Either "signal" (the default) or "trigger".
+    """
+    return getattr(settings, "SPATIOTEMPORAL_TRAJECTORY_BACKEND", "signal")
+
+
+def install_triggers(connection):
+    """Install the triggers maintaining trajectories in the database."""
+    with connection.cursor() as cursor:
+        cursor.execute(TRIGGER_FUNCTION)
+        for event, transitions in TRIGGERS.items():
+            cursor.execute(DROP_TRIGGER.format(event=event))
+            cursor.execute(CREATE_TRIGGER.format(event=event, transitions=transitions))
+
+
+def uninstall_triggers(connection):
+    """Remove the triggers and function maintaining trajectories."""
+    with connection.cursor() as cursor:
+        for event in TRIGGERS:
+            cursor.execute(DROP_TRIGGER.format(event=event))
+        cursor.execute("DROP FUNCTION IF EXISTS spatiotemporal_extent_trajectory()")
+
+
+def sync_triggers(connection):
+    """Install or remove the triggers according to `backend()`."""
+    if backend() == "trigger":
+        install_triggers(connection)
+    else:
+        uninstall_triggers(connection)
+
+
+def _execute(sql: str, params: dict, using: str) -> int:
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _splice(sql: str, params: dict, using: str) -> bool:
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        spliced = cursor.fetchone()
+    if spliced is None:
+        return False
+    segments.splice(*spliced, using=using)
+    return True
+
+
+def rebuild(things: Iterable[int], using: str = DEFAULT_DB_ALIAS) -> int:
+    """Rebuild the trajectories of the given things from all their extents.
+
+    Also recomputes all their segments, see `segments`.
+    """
+    things = list(things)
+    rows = _execute(REBUILD, {"things": things}, using)
+    segments.refresh(things, using)
+    return rows
+
+
+def is_deferred() -> bool:
+    """Whether a `deferred()` block is running."""
+    return _dirty.get() is not None
+
+
+def collect(things: Iterable[int], using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Collect things for the rebuild at the end of a `deferred()` block.
+
+    Returns whether the things were collected, i.e. whether the caller
+    is running inside a `deferred()` block.
+    """
+    dirty = _dirty.get()
+    if dirty is None:
+        return False
+    dirty[using].update(things)
+    return True
+
+
+def changed(things: Iterable[int], using: str = DEFAULT_DB_ALIAS):
+    """Bring the trajectories of things with changed extents up to date.
+
+    Rebuilds the trajectories, unless the database triggers maintain them
+    or an enclosing `deferred()` block rebuilds them later, and refreshes
+    their levels in the same batch, see `levels`.
+    """
+    things = set(things)
+    if not things:
+        return
+    trajectories_changed.send(sender=None, things=things, using=using)
+    if backend() == "trigger":
+        levels.refresh(things, using)
+    elif not collect(things, using):
+        rebuild(things, using)
+        levels.refresh(things, using)
+
+
+@contextmanager
+def deferred(using: str = DEFAULT_DB_ALIAS):
+    """Defer trajectory maintenance to the end of an atomic block.
+
+    The trajectories and levels of all things whose extents were written
+    inside the block are rebuilt at once, before the block commits. Nested
+    blocks leave the rebuild to the outermost block.
+    """
+    if _dirty.get() is not None:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    dirty: dict[str, set[int]] = defaultdict(set)
+    token = _dirty.set(dirty)
+    try:
+        with transaction.atomic(using=using):
+            yield
+            _dirty.reset(token)
+            token = None
+            for alias, things in dirty.items():
+                rebuild(things, using=alias)
+                levels.refresh(things, using=alias)
+    finally:
+        if token is not None:
+            _dirty.reset(token)
+
+
+def insert_vertex(extent: int, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Splice the vertex of a newly stored extent into its trajectory and segments."""
+    return _splice(INSERT_VERTEX, {"extent": extent}, using)
+
+
+def set_vertex(extent: int, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Replace the vertex of a changed extent in its trajectory and segments."""
+    return _splice(SET_VERTEX, {"extent": extent}, using)
+
+
+def remove_vertex(thing: int, timestamp: int, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Remove the vertex of a deleted extent from its trajectory and segments."""
+    params = {"thing": thing, "timestamp": timestamp}
+    return _splice(REMOVE_VERTEX, params, using)
@@ -10,11 +10,15 @@ https://docs.djangoproject.com/en/4.0/topics/http/urls/
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
+from spatiotemporal.asynchronous import AsyncResource
 from spatiotemporal.views import (
     CoverageViewSet,
     ExtentViewSet,
+    MeasurementExportView,
     MeasurementViewSet,
+    ProximityJobViewSet,
     SpatialThingViewSet,
+    TileView,
     TimeUnitViewSet,
     UniverseViewSet,
 )
@@ -26,7 +30,32 @@ router.register(r"spatialthings", SpatialThingViewSet)
 router.register(r"extents", ExtentViewSet)
 router.register(r"coverages", CoverageViewSet)
 router.register(r"measurements", MeasurementViewSet)
+router.register(r"proximityjobs", ProximityJobViewSet)
+
+# Async counterparts of the read routes of the viewsets streaming their lists,
+# which have a `geometry_field`, see `asynchronous`.
+async_urlpatterns = []
+for prefix, viewset, basename in router.registry:
+    if not hasattr(viewset, "geometry_field"):
+        continue
+    resource = AsyncResource(viewset)
+    async_urlpatterns += [
+        path(f"{prefix}/", resource.list, name=f"async-{basename}-list"),
+        path(f"{prefix}/stream", resource.stream, name=f"async-{basename}-stream"),
+        path(f"{prefix}/<int:pk>/", resource.detail, name=f"async-{basename}-detail"),
+    ]
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("async/", include(async_urlpatterns)),
+    path(
+        "<int:universe>/tiles/<int:z>/<int:x>/<int:y>.mvt",
+        TileView.as_view(),
+        name="tile",
+    ),
+    path(
+        "coverages/<int:coverage>/measurements.<str:format>",
+        MeasurementExportView.as_view(),
+        name="measurement-export",
+    ),
 ]
@@ -0,0 +1,33 @@
+"""Cache versions.
+
+This module contains version counters kept in a Django cache. Cached
+values have the versions they depend on in their keys, so incrementing a
+version invalidates them without knowing their keys.
+
+https://docs.djangoproject.com/en/4.0/topics/cache/#cache-versioning
+"""
+
+import time
+from typing import Iterable
+
+
+def get(cache, keys: list[str]) -> dict[str, int]:
+    """The current versions, initializing missing ones.
+
+    Versions start at the current time, so that a version evicted from the
+    cache is not reused for values that are still cached.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def increment(cache, keys: Iterable[str]):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
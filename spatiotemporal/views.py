@@ -6,51 +6,494 @@ easily routing serializers as resources.
 https://www.django-rest-framework.org/api-guide/viewsets/
 """
 
-from rest_framework import viewsets
+from dataclasses import asdict
+from math import ceil, floor, isfinite
+from typing import Optional
 
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from spatiotemporal import arrow, caching, proximity, tiles
+from spatiotemporal.bulk import BulkLoader, ExtentLoader, MeasurementLoader
+from spatiotemporal.db.functions import StoredShape
+from spatiotemporal.filters import (
+    GeometryFilter,
+    ParentFilter,
+    TimestampFilter,
+    TrajectoryBoundingBoxFilter,
+    parse_bounds,
+)
 from spatiotemporal.models import (
     Coverage,
     Extent,
     Measurement,
+    ProximityJob,
     SpatialThing,
     TimeUnit,
+    TrajectoryLevel,
     Universe,
 )
+from spatiotemporal.parsers import GeoJSONParser, NDJSONParser, ORJSONParser
+from spatiotemporal.renderers import (
+    ArrowRenderer,
+    GeoJSONSeqRenderer,
+    MVTRenderer,
+    NDJSONRenderer,
+    ParquetRenderer,
+)
 from spatiotemporal.serializers import (
     CoverageSerializer,
     ExtentSerializer,
     MeasurementSerializer,
+    ProximityJobSerializer,
     SpatialThingSerializer,
     TimeUnitSerializer,
     UniverseSerializer,
+    sparse_fields,
 )
 
 
-class TimeUnitViewSet(viewsets.ModelViewSet):
+class CachedResponseMixin:
+    """Caches rendered list and detail responses, see `caching`.
+
+    Only the `cached_actions` are cached. Streamed responses and errors
+    are never cached.
+    """
+
+    cached_actions = ("list", "retrieve")
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, None, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached(request, pk, super().retrieve, *args, **kwargs)
+
+    def cached(self, request, pk: Optional[int], view, *args, **kwargs):
+        if self.action not in self.cached_actions:
+            return view(request, *args, **kwargs)
+
+        model = self.queryset.model
+        variant = f"{request.accepted_media_type} {request.get_full_path()}"
+        key = caching.key(model, pk, variant, self.related_models())
+        cached = caching.cache().get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            content = response.render().content
+            cached = (content, response["Content-Type"], caching.etag(content))
+            caching.cache().set(key, cached, caching.timeout())
+
+        content, content_type, etag = cached
+        header = request.headers.get("If-None-Match", "")
+        matches = {match.strip() for match in header.split(",")}
+        if etag in matches or "*" in matches:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response["ETag"] = etag
+        return response
+
+    def related_models(self) -> list:
+        """The models of the relations expanded in the response."""
+        if not hasattr(self, "selected_fields"):
+            return []
+        _, expand = self.selected_fields()
+        opts = self.queryset.model._meta
+        return [opts.get_field(name).related_model for name in expand]
+
+
+class SparseFieldsMixin:
+    """Reads only the columns of the fields selected by the request.
+
+    Fields are selected by `?fields=` or `?omit=`, see `sparse_fields`.
+    Other columns are deferred, so that e.g. trajectories are neither read
+    nor decoded when listing names. Relations expanded by `?expand=` are
+    joined with `select_related` rather than queried per object.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer = self.get_serializer_class()()
+        names = list(serializer.fields)
+        fields, expand = self.selected_fields()
+        if fields != names:
+            columns = {field.name for field in queryset.model._meta.concrete_fields}
+            sources = [
+                source
+                for name in fields
+                for source in getattr(
+                    serializer.fields[name], "columns", [serializer.fields[name].source]
+                )
+            ]
+            # The keys of keyset pagination are read from every object.
+            sources.extend(getattr(self, "keyset", ()))
+            queryset = queryset.only(
+                *(source for source in sources if source in columns)
+            )
+        if expand:
+            queryset = queryset.select_related(*expand)
+        return queryset
+
+    def selected_fields(self) -> tuple[list[str], list[str]]:
+        serializer_class = self.get_serializer_class()
+        serializer = serializer_class()
+        return sparse_fields(
+            getattr(self, "request", None),
+            list(serializer.fields),
+            list(serializer_class.expandable_fields),
+        )
+
+
+class StreamingListMixin:
+    """Streams list responses as NDJSON or GeoJSON text sequences.
+
+    Selected with `?format=ndjson` or `?format=geojsonseq`. Objects are read
+    from a server-side cursor and rendered one at a time, so memory use does
+    not depend on the number of objects listed.
+    """
+
+    renderer_classes = [
+        *api_settings.DEFAULT_RENDERER_CLASSES,
+        NDJSONRenderer,
+        GeoJSONSeqRenderer,
+    ]
+    geometry_field: Optional[str] = None
+    stream_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, NDJSONRenderer):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        as_features = isinstance(renderer, GeoJSONSeqRenderer)
+        if as_features and self.geometry_field:
+            queryset = queryset.annotate(geojson=AsGeoJSON(self.get_geometry()))
+        serializer = self.get_serializer()
+
+        def records():
+            for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+                geometry = None
+                if as_features and self.geometry_field:
+                    geometry = (obj.geojson or "null").encode()
+                row = serializer.to_representation(obj)
+                yield renderer.record(row, self.geometry_field, geometry)
+
+        return StreamingHttpResponse(records(), content_type=renderer.media_type)
+
+    def get_geometry(self):
+        """The expression of the geometry of the streamed features."""
+        return self.geometry_field
+
+
+class BulkMixin:
+    """Adds a `bulk` route for creating many objects at once."""
+
+    bulk_loader_class: type[BulkLoader]
+
+    @action(
+        detail=False,
+        methods=["post"],
+        parser_classes=[NDJSONParser, GeoJSONParser, ORJSONParser],
+    )
+    def bulk(self, request):
+        """Create objects from NDJSON, a feature collection or a JSON array.
+
+        Invalid rows are reported by their index and do not prevent
+        the other rows from being created.
+        """
+        result = self.bulk_loader_class().load(request.data)
+        if result.errors and not result.created:
+            return Response(asdict(result), status=status.HTTP_400_BAD_REQUEST)
+        return Response(asdict(result), status=status.HTTP_201_CREATED)
+
+
+class TimeUnitViewSet(
+    CachedResponseMixin, SparseFieldsMixin, StreamingListMixin, viewsets.ModelViewSet
+):
     queryset = TimeUnit.objects.all()
     serializer_class = TimeUnitSerializer
 
 
-class UniverseViewSet(viewsets.ModelViewSet):
+class UniverseViewSet(
+    CachedResponseMixin, SparseFieldsMixin, StreamingListMixin, viewsets.ModelViewSet
+):
     queryset = Universe.objects.all()
     serializer_class = UniverseSerializer
 
 
-class SpatialThingViewSet(viewsets.ModelViewSet):
+class SpatialThingViewSet(
+    CachedResponseMixin, SparseFieldsMixin, StreamingListMixin, viewsets.ModelViewSet
+):
     queryset = SpatialThing.objects.all()
     serializer_class = SpatialThingSerializer
+    cached_actions = ("retrieve",)
+    filter_backends = [ParentFilter, TrajectoryBoundingBoxFilter]
+    parent_field = "universe"
+    geometry_field = "trajectory"
+    max_timestamps = 1000
+    default_nearest = 10
+    max_nearest = 1000
+
+    def get_queryset(self):
+        """Load a simplified trajectory when asked for `?simplify=<level>`.
+
+        Level 0 is the full trajectory. Spatial things without the level,
+        e.g. as their trajectory is short enough, keep their trajectory.
+        """
+        queryset = super().get_queryset()
+        if not self.is_simplified():
+            return queryset
+        level = self.simplify_level()
+        simplified = TrajectoryLevel.objects.filter(thing=OuterRef("pk"), level=level)
+        return queryset.defer("trajectory").annotate(
+            simplified_trajectory=Coalesce(
+                Subquery(simplified.values("trajectory")), F("trajectory")
+            )
+        )
+
+    def get_geometry(self):
+        if self.is_simplified():
+            return "simplified_trajectory"
+        return super().get_geometry()
+
+    def is_simplified(self) -> bool:
+        """Whether a selected trajectory is loaded simplified."""
+        fields, _ = self.selected_fields()
+        return bool(self.simplify_level()) and "trajectory" in fields
+
+    def simplify_level(self) -> int:
+        value = self.request.query_params.get("simplify", "0")
+        try:
+            level = int(value)
+        except ValueError:
+            level = -1
+        if level < 0:
+            raise ValidationError({"simplify": ["Expected a level of at least 0."]})
+        return level
+
+    @action(detail=False)
+    def nearest(self, request):
+        """The spatial things nearest to a point at a time, nearest first.
+
+        Given as `?point=x,y,z&t=10`, with `?k=` things (10 by default) and an
+        optional `?window=start,end` they must exist during. Distances are in
+        space and time alike, see `SpatialThingQuerySet.nearest`. The other
+        filters, like `?universe=`, apply as well.
+        """
+        point = parse_bounds("point", request.query_params.get("point", ""), 3)
+        timestamp = parse_bounds("t", request.query_params.get("t", ""), 1)[0]
+        if None in point:
+            raise ValidationError({"point": ["Expected x, y and z."]})
+        if timestamp is None:
+            raise ValidationError({"t": ["Expected a time."]})
+        try:
+            k = int(request.query_params.get("k", self.default_nearest))
+        except ValueError:
+            k = 0
+        if not 0 < k <= self.max_nearest:
+            raise ValidationError(
+                {"k": [f"Expected between 1 and {self.max_nearest} things."]}
+            )
+        window = request.query_params.get("window")
+        if window is not None:
+            window = parse_bounds("window", window, 2)
 
+        queryset = self.filter_queryset(self.get_queryset())
+        things = list(queryset.nearest(point, timestamp, window)[:k])
+        data = self.get_serializer(things, many=True).data
+        return Response(
+            [{**row, "distance": thing.distance} for row, thing in zip(data, things)]
+        )
 
-class ExtentViewSet(viewsets.ModelViewSet):
+    @action(detail=False)
+    def at(self, request):
+        """The interpolated positions of the spatial things at some times.
+
+        Given as `?t=1,1.5,2`, e.g. for the frames of a video. Spatial things
+        that do not exist at a time are left out for that time.
+        """
+        value = request.query_params.get("t", "")
+        try:
+            timestamps = [float(timestamp) for timestamp in value.split(",")]
+        except ValueError:
+            raise ValidationError({"t": ["Expected comma separated numbers."]})
+        if not all(isfinite(timestamp) for timestamp in timestamps):
+            raise ValidationError({"t": ["Expected finite numbers."]})
+        if len(timestamps) > self.max_timestamps:
+            raise ValidationError(
+                {"t": [f"Expected at most {self.max_timestamps} timestamps."]}
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(queryset.positions(timestamps))
+
+
+class ExtentViewSet(
+    SparseFieldsMixin, StreamingListMixin, BulkMixin, viewsets.ModelViewSet
+):
     queryset = Extent.objects.all()
     serializer_class = ExtentSerializer
+    filter_backends = [ParentFilter, TimestampFilter, GeometryFilter]
+    keyset = ("timestamp", "id")
+    parent_field = "thing"
+    geometry_field = "geometry"
+    bulk_loader_class = ExtentLoader
+
+    def get_geometry(self):
+        # Objects stored as a box are streamed as its envelope.
+        return StoredShape(self.geometry_field)
 
 
-class CoverageViewSet(viewsets.ModelViewSet):
+class CoverageViewSet(
+    CachedResponseMixin, SparseFieldsMixin, StreamingListMixin, viewsets.ModelViewSet
+):
     queryset = Coverage.objects.all()
     serializer_class = CoverageSerializer
 
 
-class MeasurementViewSet(viewsets.ModelViewSet):
+class MeasurementViewSet(
+    SparseFieldsMixin, StreamingListMixin, BulkMixin, viewsets.ModelViewSet
+):
     queryset = Measurement.objects.all()
     serializer_class = MeasurementSerializer
+    filter_backends = [ParentFilter, TimestampFilter, GeometryFilter]
+    keyset = ("timestamp", "id")
+    parent_field = "coverage"
+    geometry_field = "geometry"
+    bulk_loader_class = MeasurementLoader
+
+    def get_geometry(self):
+        # Objects stored as a box are streamed as its envelope.
+        return StoredShape(self.geometry_field)
+
+
+class ProximityJobViewSet(
+    SparseFieldsMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Searches for spatial things near each other in the background.
+
+    Creating a job only queues it, see `proximity`. Once its `status` is
+    `done`, the pairs it found are streamed from `pairs/` as NDJSON.
+    """
+
+    queryset = ProximityJob.objects.all()
+    serializer_class = ProximityJobSerializer
+    filter_backends = [ParentFilter]
+    parent_field = "universe"
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def perform_destroy(self, instance):
+        proximity.delete_results(instance)
+        instance.delete()
+
+    @action(detail=True)
+    def pairs(self, request, pk=None):
+        """The pairs found by the job, one `{timestamp, things, distance}` a line."""
+        job = self.get_object()
+        if job.status != ProximityJob.Status.DONE:
+            return Response(
+                {"detail": f"The job is {job.status}.", "status": job.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            file = open(proximity.results(job), "rb")
+        except FileNotFoundError:
+            raise NotFound("The pairs of the job are gone.")
+        return FileResponse(file, content_type=NDJSONRenderer.media_type)
+
+
+class TileView(APIView):
+    """Mapbox Vector Tiles of the extents and measurements of a universe.
+
+    `?t=start,end` (or `?t=instant`) limits features to a time window,
+    `?properties=a,b` adds those keys of their metadata or properties as
+    attributes and `?layers=extents` renders only some layers.
+    """
+
+    renderer_classes = [MVTRenderer]
+
+    def get(self, request, universe: int, z: int, x: int, y: int):
+        if not tiles.is_valid(z, x, y):
+            raise NotFound("Tile out of range.")
+
+        options = {}
+        value = request.query_params.get("t")
+        if value is not None:
+            bounds = parse_bounds("t", value, 2 if "," in value else 1)
+            start, end = bounds[0], bounds[-1]
+            options["start"] = None if start is None else ceil(start)
+            options["end"] = None if end is None else floor(end)
+        value = request.query_params.get("properties")
+        if value:
+            options["properties"] = sorted(set(value.split(",")))
+        value = request.query_params.get("layers")
+        if value:
+            layers = sorted(set(value.split(",")))
+            if not set(layers) <= tiles.LAYERS.keys():
+                raise ValidationError({"layers": ["Expected extents or measurements."]})
+            options["layers"] = layers
+
+        return Response(tiles.tile(universe, z, x, y, **options))
+
+
+class MeasurementExportView(APIView):
+    """Measurements of a coverage as an Arrow IPC stream or a Parquet file.
+
+    Routed as `/coverages/{id}/measurements.arrow` or `.parquet`. Takes
+    `?timestamp=start,end` and `?properties=a,b.c` to select columns of
+    the flattened properties, see `arrow.MeasurementExport`.
+    """
+
+    renderer_classes = [ArrowRenderer, ParquetRenderer]
+
+    def get(self, request, coverage: int, format=None):
+        if not arrow.available():
+            return Response(
+                {"detail": "Exporting measurements requires pyarrow."},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        coverage = get_object_or_404(Coverage, pk=coverage)
+        queryset = TimestampFilter().filter_queryset(
+            request, Measurement.objects.filter(coverage=coverage), self
+        )
+        value = request.query_params.get("properties")
+        export = arrow.MeasurementExport(
+            queryset,
+            properties=value.split(",") if value else None,
+            schema=coverage.properties_schema,
+        )
+        renderer = request.accepted_renderer
+        return StreamingHttpResponse(
+            export.stream(renderer.format), content_type=renderer.media_type
+        )